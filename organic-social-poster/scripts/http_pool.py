@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+http_pool.py — Keep-alive connection pool for the organic poster's API calls (stdlib only).
+
+urllib.request.urlopen() opens a fresh TCP + TLS connection for every call.
+urlopen() here is a drop-in replacement for the way the scripts use it: it
+takes a urllib.request.Request, reuses an idle connection to the same host
+when one is available, returns an object with read() / status / headers that
+works as a context manager, and raises urllib.error.HTTPError for 4xx/5xx.
+
+Environment variables:
+    HTTP_POOL_MAXSIZE  Idle connections kept per host (default 10).
+    HTTP_TIMING        Set to 1 to log each request's status, latency and
+                       whether it opened a new connection to stderr.
+
+If an HTTP(S) proxy is configured in the environment, calls fall back to
+urllib.request.urlopen(), which knows how to use it.
+"""
+
+import http.client
+import io
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+TIMING_ENABLED = os.environ.get("HTTP_TIMING", "") not in ("", "0")
+DEFAULT_TIMEOUT = 60
+MAX_REDIRECTS = 5
+
+
+class PooledResponse:
+    """Fully-read response with the subset of the urlopen() API the scripts use."""
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = io.BytesIO(body)
+
+    def read(self, amt=None):
+        return self._body.read() if amt is None else self._body.read(amt)
+
+    def getcode(self):
+        return self.status
+
+    def close(self):
+        self._body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Idle keep-alive connections keyed by (scheme, host, port)."""
+
+    def __init__(self, maxsize=POOL_MAXSIZE):
+        self.maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout), False
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, method, url, body, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # A reused connection may have been closed by the server while idle;
+        # in that case nothing was processed, so retry once on a new one.
+        for attempt in range(2):
+            conn, reused = self._checkout(key, timeout)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._checkin(key, conn)
+            if TIMING_ENABLED:
+                elapsed = (time.perf_counter() - start) * 1000
+                print(
+                    f"[http] {method} {parts.scheme}://{parts.netloc}{parts.path} "
+                    f"{resp.status} {elapsed:.0f}ms ({'reused' if reused else 'new connection'})",
+                    file=sys.stderr,
+                )
+            return resp, data
+        raise RuntimeError("unreachable")
+
+    def urlopen(self, req, timeout=DEFAULT_TIMEOUT):
+        """Send *req* over a pooled connection; see the module docstring."""
+        if not isinstance(req, urllib.request.Request):
+            req = urllib.request.Request(req)
+        if _proxy_configured():
+            return urllib.request.urlopen(req, timeout=timeout)
+
+        method = req.get_method()
+        url = req.full_url
+        body = req.data
+        headers = dict(req.header_items())
+        if body is not None and "Content-type" not in headers:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        for _ in range(MAX_REDIRECTS + 1):
+            resp, data = self._send(method, url, body, headers, timeout)
+            location = resp.getheader("Location")
+            if resp.status in (307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if resp.status in (301, 302, 303) and location and method in ("GET", "HEAD"):
+                url = urllib.parse.urljoin(url, location)
+                continue
+            break
+
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(
+                url, resp.status, resp.reason, resp.msg, io.BytesIO(data)
+            )
+        return PooledResponse(url, resp.status, resp.reason, resp.msg, data)
+
+
+def _proxy_configured():
+    return any(
+        os.environ.get(name)
+        for name in ("https_proxy", "HTTPS_PROXY", "http_proxy", "HTTP_PROXY")
+    )
+
+
+_pool = ConnectionPool()
+
+
+def urlopen(req, timeout=DEFAULT_TIMEOUT):
+    """Module-level shortcut for the shared ConnectionPool."""
+    return _pool.urlopen(req, timeout)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+media_staging.py — Turn a local image into a public URL the posting APIs can fetch (stdlib only).
+
+Instagram, Threads and TikTok only accept images by URL. Instead of pushing the
+image to GitHub first, stage_image() uploads it to the brand's Facebook Page as
+an unpublished photo (the same trick social-media-poster's post_instagram.py
+uses) and returns the photo's CDN URL.
+
+URLs are cached by Page ID and the image's SHA-256 in
+/tmp/organic-poster/staged_media.json. The same image is therefore uploaded once
+per Page, even when it goes to four platforms or appears in several batch
+entries. Each brand gets its own copy, so a post never depends on another
+brand's Page. Cached URLs expire after
+STAGED_URL_TTL_SECONDS, because Facebook CDN links are signed and stop working
+after a few days.
+
+Environment variables:
+    STAGED_MEDIA_CACHE  Cache file path (default /tmp/organic-poster/staged_media.json).
+"""
+
+import fcntl
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+CACHE_PATH = os.environ.get("STAGED_MEDIA_CACHE", "/tmp/organic-poster/staged_media.json")
+STAGED_URL_TTL_SECONDS = 24 * 60 * 60
+GRAPH_BASE = "https://graph.facebook.com/v19.0"
+
+# One lock per (Page, image hash), so concurrent posts of the same image wait
+# for a single upload instead of each starting their own.
+_hash_locks = {}
+_hash_locks_guard = threading.Lock()
+
+
+def is_url(path: str) -> bool:
+    return path.startswith(("http://", "https://"))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _hash_locks_guard:
+        return _hash_locks.setdefault(key, threading.Lock())
+
+
+def _update_cache(update=None) -> dict:
+    """Load the cache under an flock, drop expired entries, apply *update*, save."""
+    os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+    with open(CACHE_PATH + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(CACHE_PATH) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        now = time.time()
+        fresh = {k: v for k, v in cache.items() if v.get("expires", 0) > now}
+        if update:
+            fresh.update(update)
+        if fresh != cache:
+            tmp_path = CACHE_PATH + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(fresh, f, indent=2)
+            os.replace(tmp_path, CACHE_PATH)
+        return fresh
+
+
+def _multipart(fields: dict, file_field: str, path: str) -> tuple:
+    """Encode *fields* plus the file at *path* as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    content_type = mimetypes.guess_type(path)[0] or "image/jpeg"
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    with open(path, "rb") as f:
+        data = f.read()
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+        f'filename="{os.path.basename(path)}"\r\nContent-Type: {content_type}\r\n\r\n'.encode()
+        + data + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def upload_unpublished_photo(path: str, page_id: str, token: str, opener) -> str:
+    """Upload *path* to the Page as an unpublished photo and return its CDN URL.
+
+    *opener* is called as ``opener("facebook", request)`` and must return a
+    urlopen()-style response (post_to_platforms.api_open).
+    """
+    # The token goes in the query string so the rate limiter can key on it.
+    body, content_type = _multipart({"published": "false"}, "source", path)
+    params = urllib.parse.urlencode({"access_token": token})
+    req = urllib.request.Request(f"{GRAPH_BASE}/{page_id}/photos?{params}", data=body, method="POST")
+    req.add_header("Content-Type", content_type)
+    with opener("facebook", req) as resp:
+        photo_id = json.loads(resp.read()).get("id")
+    if not photo_id:
+        raise RuntimeError("Photo upload returned no photo ID")
+
+    params = urllib.parse.urlencode({"fields": "images", "access_token": token})
+    req = urllib.request.Request(f"{GRAPH_BASE}/{photo_id}?{params}")
+    with opener("facebook", req) as resp:
+        images = json.loads(resp.read()).get("images", [])
+    if not images:
+        raise RuntimeError("Could not retrieve CDN URL for uploaded photo")
+    # The first entry is the largest / original.
+    return images[0]["source"]
+
+
+def stage_image(path: str, page_id: str, token: str, opener) -> str:
+    """Return a public URL for *path*, uploading it only if no fresh cached URL exists.
+
+    URLs are returned unchanged. Raises FileNotFoundError, RuntimeError or
+    urllib errors if the image cannot be staged.
+    """
+    if is_url(path):
+        return path
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Image not found: {path}")
+    if not token or not page_id:
+        raise RuntimeError("Staging a local image needs META_ACCESS_TOKEN and FB_PAGE_ID")
+
+    key = f"{page_id}:{file_sha256(path)}"
+    with _lock_for(key):
+        cached = _update_cache().get(key)
+        if cached:
+            return cached["url"]
+        print(f"Staging {os.path.basename(path)} on Facebook...")
+        url = upload_unpublished_photo(path, page_id, token, opener)
+        _update_cache({key: {"url": url, "expires": time.time() + STAGED_URL_TTL_SECONDS}})
+        return url
@@ -12,6 +12,10 @@ Usage:
         --threads-caption "Your Threads caption here" \
         --tiktok-caption "Your TikTok caption here"
 
+    # Batch mode: every entry of a manifest through one shared thread pool,
+    # with one consolidated results file.
+    python3 scripts/post_to_platforms.py --manifest /tmp/organic-poster/manifest.json
+
 Requires environment variables (see references/api-setup-guide.md):
     META_ACCESS_TOKEN, FB_PAGE_ID, IG_BUSINESS_ACCOUNT_ID, THREADS_USER_ID
     TIKTOK_ACCESS_TOKEN
@@ -20,13 +24,21 @@ Per-brand overrides supported (e.g., TABLECLAY_IG_BUSINESS_ACCOUNT_ID).
 """
 
 import argparse
+import functools
 import json
 import os
 import sys
-import time
+import threading
+import urllib.error
 import urllib.request
 import urllib.parse
 import base64
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import http_pool
+import media_staging
+import rate_limit
 
 
 def get_env(brand: str, key: str) -> str:
@@ -35,10 +47,47 @@ def get_env(brand: str, key: str) -> str:
     return os.environ.get(brand_key, os.environ.get(key, ""))
 
 
+CREDENTIAL_KEYS = (
+    "META_ACCESS_TOKEN",
+    "FB_PAGE_ID",
+    "IG_BUSINESS_ACCOUNT_ID",
+    "THREADS_USER_ID",
+    "TIKTOK_ACCESS_TOKEN",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def brand_credentials(brand: str) -> dict:
+    """Resolve every credential for *brand* once (see get_env for overrides)."""
+    return {key: get_env(brand, key) for key in CREDENTIAL_KEYS}
+
+
+PLATFORM_NAMES = {
+    "instagram": "Instagram",
+    "facebook": "Facebook",
+    "threads": "Threads",
+    "tiktok": "TikTok",
+}
+
+
+def api_open(platform: str, req: urllib.request.Request):
+    """Pooled urlopen() paced by the shared rate limiter (rate_limit.py)."""
+    account = rate_limit.account_for(req.full_url, {"headers": dict(req.header_items())})
+    rate_limit.acquire(platform, account)
+    try:
+        resp = http_pool.urlopen(req)
+    except urllib.error.HTTPError as e:
+        rate_limit.observe(platform, account, dict(e.headers or {}), e.code)
+        raise
+    rate_limit.observe(platform, account, dict(resp.headers), resp.status)
+    return resp
+
+
 def post_instagram(brand: str, image_url: str, caption: str, hashtags: str) -> dict:
     """Post to Instagram via Meta Graph API."""
-    token = get_env(brand, "META_ACCESS_TOKEN")
-    ig_id = get_env(brand, "IG_BUSINESS_ACCOUNT_ID")
+    creds = brand_credentials(brand)
+    token = creds["META_ACCESS_TOKEN"]
+    ig_id = creds["IG_BUSINESS_ACCOUNT_ID"]
 
     if not token or not ig_id:
         return {"success": False, "error": "Missing META_ACCESS_TOKEN or IG_BUSINESS_ACCOUNT_ID"}
@@ -53,7 +102,7 @@ def post_instagram(brand: str, image_url: str, caption: str, hashtags: str) -> d
 
     try:
         req = urllib.request.Request(url, method="POST")
-        with urllib.request.urlopen(req) as resp:
+        with api_open("instagram", req) as resp:
             data = json.loads(resp.read())
             container_id = data.get("id")
     except Exception as e:
@@ -68,7 +117,7 @@ def post_instagram(brand: str, image_url: str, caption: str, hashtags: str) -> d
 
     try:
         req = urllib.request.Request(url, method="POST")
-        with urllib.request.urlopen(req) as resp:
+        with api_open("instagram", req) as resp:
             data = json.loads(resp.read())
             media_id = data.get("id")
     except Exception as e:
@@ -83,7 +132,7 @@ def post_instagram(brand: str, image_url: str, caption: str, hashtags: str) -> d
         url = f"https://graph.facebook.com/v19.0/{media_id}/comments?{params}"
         try:
             req = urllib.request.Request(url, method="POST")
-            urllib.request.urlopen(req)
+            api_open("instagram", req)
         except Exception:
             pass  # Non-critical if comment fails
 
@@ -92,8 +141,9 @@ def post_instagram(brand: str, image_url: str, caption: str, hashtags: str) -> d
 
 def post_facebook(brand: str, image_url: str, caption: str) -> dict:
     """Post to Facebook Page via Meta Graph API."""
-    token = get_env(brand, "META_ACCESS_TOKEN")
-    page_id = get_env(brand, "FB_PAGE_ID")
+    creds = brand_credentials(brand)
+    token = creds["META_ACCESS_TOKEN"]
+    page_id = creds["FB_PAGE_ID"]
 
     if not token or not page_id:
         return {"success": False, "error": "Missing META_ACCESS_TOKEN or FB_PAGE_ID"}
@@ -107,7 +157,7 @@ def post_facebook(brand: str, image_url: str, caption: str) -> dict:
 
     try:
         req = urllib.request.Request(url, method="POST")
-        with urllib.request.urlopen(req) as resp:
+        with api_open("facebook", req) as resp:
             data = json.loads(resp.read())
             return {"success": True, "post_id": data.get("id")}
     except Exception as e:
@@ -116,8 +166,9 @@ def post_facebook(brand: str, image_url: str, caption: str) -> dict:
 
 def post_threads(brand: str, image_url: str, caption: str) -> dict:
     """Post to Threads via Meta Threads API."""
-    token = get_env(brand, "META_ACCESS_TOKEN")
-    threads_id = get_env(brand, "THREADS_USER_ID")
+    creds = brand_credentials(brand)
+    token = creds["META_ACCESS_TOKEN"]
+    threads_id = creds["THREADS_USER_ID"]
 
     if not token or not threads_id:
         return {"success": False, "error": "Missing META_ACCESS_TOKEN or THREADS_USER_ID"}
@@ -133,7 +184,7 @@ def post_threads(brand: str, image_url: str, caption: str) -> dict:
 
     try:
         req = urllib.request.Request(url, method="POST")
-        with urllib.request.urlopen(req) as resp:
+        with api_open("threads", req) as resp:
             data = json.loads(resp.read())
             container_id = data.get("id")
     except Exception as e:
@@ -148,7 +199,7 @@ def post_threads(brand: str, image_url: str, caption: str) -> dict:
 
     try:
         req = urllib.request.Request(url, method="POST")
-        with urllib.request.urlopen(req) as resp:
+        with api_open("threads", req) as resp:
             data = json.loads(resp.read())
             return {"success": True, "media_id": data.get("id")}
     except Exception as e:
@@ -157,7 +208,7 @@ def post_threads(brand: str, image_url: str, caption: str) -> dict:
 
 def post_tiktok(brand: str, image_url: str, caption: str) -> dict:
     """Post photo to TikTok via Content Posting API."""
-    token = get_env(brand, "TIKTOK_ACCESS_TOKEN")
+    token = brand_credentials(brand)["TIKTOK_ACCESS_TOKEN"]
 
     if not token:
         return {"success": False, "error": "Missing TIKTOK_ACCESS_TOKEN"}
@@ -184,7 +235,7 @@ def post_tiktok(brand: str, image_url: str, caption: str) -> dict:
         req = urllib.request.Request(url, data=body, method="POST")
         req.add_header("Authorization", f"Bearer {token}")
         req.add_header("Content-Type", "application/json")
-        with urllib.request.urlopen(req) as resp:
+        with api_open("tiktok", req) as resp:
             data = json.loads(resp.read())
             publish_id = data.get("data", {}).get("publish_id")
             return {"success": True, "publish_id": publish_id}
@@ -192,47 +243,158 @@ def post_tiktok(brand: str, image_url: str, caption: str) -> dict:
         return {"success": False, "error": f"TikTok post failed: {e}"}
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Post to social media platforms")
-    parser.add_argument("--brand", required=True)
-    parser.add_argument("--image", required=True, help="Local path or public URL")
-    parser.add_argument("--ig-caption", default="")
-    parser.add_argument("--ig-hashtags", default="")
-    parser.add_argument("--fb-caption", default="")
-    parser.add_argument("--threads-caption", default="")
-    parser.add_argument("--tiktok-caption", default="")
-    args = parser.parse_args()
-
-    # The image needs to be publicly accessible for Meta and TikTok APIs.
-    # If it's a local path, the calling script should upload it to a public URL first
-    # (e.g., GitHub raw URL or a temp hosting service).
-    image_url = args.image
-
+# Concurrent posts allowed per (brand, platform) pair in batch mode. Posts
+# for different brands or platforms run side by side; one account never
+# receives more than this many at once.
+BRAND_PLATFORM_CONCURRENCY = 1
+BATCH_WORKERS = 8
+BATCH_RESULTS_PATH = "/tmp/organic-poster/batch_result.json"
+
+
+class SlotGate:
+    """Hands tasks to a pool only once their (brand, platform) slot is free.
+
+    Tasks over the limit wait in a queue here rather than in a pool worker,
+    so one busy account never holds up posts to the others.
+    """
+
+    def __init__(self, pool: ThreadPoolExecutor, limit: int = BRAND_PLATFORM_CONCURRENCY):
+        self.pool = pool
+        self.limit = limit
+        self._running = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: tuple, fn) -> Future:
+        """Run ``fn()`` in the pool when *key* has a free slot; return its future."""
+        result = Future()
+        with self._lock:
+            start = self._running.get(key, 0) < self.limit
+            if start:
+                self._running[key] = self._running.get(key, 0) + 1
+            else:
+                self._waiting.setdefault(key, deque()).append((fn, result))
+        if start:
+            self._start(key, fn, result)
+        return result
+
+    def _start(self, key: tuple, fn, result: Future):
+        self.pool.submit(fn).add_done_callback(lambda task: self._finished(key, task, result))
+
+    def _finished(self, key: tuple, task: Future, result: Future):
+        with self._lock:
+            waiting = self._waiting.get(key)
+            queued = waiting.popleft() if waiting else None
+            if queued is None:
+                self._running[key] -= 1
+        # Hand the slot to the next task before reporting this one, so the
+        # pool is never shut down with a queued task still to submit.
+        if queued is not None:
+            self._start(key, *queued)
+        if task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+
+def submit_posts(gate: SlotGate, brand: str, image_url: str, captions: dict) -> dict:
+    """Submit one task per platform with a caption through *gate*; return their futures.
+
+    *captions* maps "instagram", "facebook", "threads" and "tiktok" to their
+    caption; "ig_hashtags" is posted as Instagram's first comment. Platforms
+    with an empty caption are skipped.
+    """
+    calls = {
+        "instagram": lambda: post_instagram(
+            brand, image_url, captions["instagram"], captions.get("ig_hashtags", "")
+        ),
+        "facebook": lambda: post_facebook(brand, image_url, captions["facebook"]),
+        "threads": lambda: post_threads(brand, image_url, captions["threads"]),
+        "tiktok": lambda: post_tiktok(brand, image_url, captions["tiktok"]),
+    }
+
+    futures = {}
+    for platform in calls:
+        if captions.get(platform):
+            print(f"Posting to {PLATFORM_NAMES[platform]} ({brand})...")
+            futures[platform] = gate.submit((brand, platform), calls[platform])
+    return futures
+
+
+def stage_image(brand: str, image: str) -> str:
+    """Public URL for *image*: URLs pass through, local files are staged once (media_staging.py)."""
+    creds = brand_credentials(brand)
+    return media_staging.stage_image(
+        image, creds["FB_PAGE_ID"], creds["META_ACCESS_TOKEN"], api_open
+    )
+
+
+def staging_failure(captions: dict, error: Exception) -> dict:
+    """Completed futures carrying an image staging error for each platform that would have posted."""
+    futures = {}
+    for platform in PLATFORM_NAMES:
+        if captions.get(platform):
+            futures[platform] = Future()
+            futures[platform].set_result({"success": False, "error": f"Image staging failed: {error}"})
+    return futures
+
+
+def collect_results(futures: dict) -> dict:
+    """Wait for futures from submit_posts(); failures become error results."""
     results = {}
+    for platform, future in futures.items():
+        try:
+            results[platform] = future.result()
+        except Exception as e:
+            results[platform] = {"success": False, "error": f"{PLATFORM_NAMES[platform]} post failed: {e}"}
+    return results
 
-    # Post to each platform
-    if args.ig_caption:
-        print("Posting to Instagram...")
-        results["instagram"] = post_instagram(args.brand, image_url, args.ig_caption, args.ig_hashtags)
-        time.sleep(2)  # Brief pause between API calls
-
-    if args.fb_caption:
-        print("Posting to Facebook...")
-        results["facebook"] = post_facebook(args.brand, image_url, args.fb_caption)
-        time.sleep(2)
-
-    if args.threads_caption:
-        print("Posting to Threads...")
-        results["threads"] = post_threads(args.brand, image_url, args.threads_caption)
-        time.sleep(2)
 
-    if args.tiktok_caption:
-        print("Posting to TikTok...")
-        results["tiktok"] = post_tiktok(args.brand, image_url, args.tiktok_caption)
+def post_all(brand: str, image: str, captions: dict) -> dict:
+    """Post to every platform with a caption in *captions*, concurrently.
 
-    # Summary
+    *image* may be a public URL or a local file, which is staged first.
+    Results are keyed by platform in the order Instagram, Facebook,
+    Threads, TikTok, whichever finishes first.
+    """
+    with ThreadPoolExecutor(max_workers=len(PLATFORM_NAMES)) as pool:
+        try:
+            futures = submit_posts(SlotGate(pool), brand, stage_image(brand, image), captions)
+        except Exception as e:
+            futures = staging_failure(captions, e)
+        return collect_results(futures)
+
+
+def load_manifest(path: str) -> list:
+    """Read a batch manifest: a JSON list of post entries (or {"posts": [...]}).
+
+    Each entry needs "brand" and "image", plus any of "ig_caption",
+    "ig_hashtags", "fb_caption", "threads_caption" and "tiktok_caption".
+    """
+    with open(path) as f:
+        data = json.load(f)
+    entries = data.get("posts", []) if isinstance(data, dict) else data
+    for i, entry in enumerate(entries):
+        missing = [key for key in ("brand", "image") if not entry.get(key)]
+        if missing:
+            raise ValueError(f"Manifest entry {i} is missing {', '.join(missing)}")
+    return entries
+
+
+def entry_captions(entry: dict) -> dict:
+    """Map manifest / CLI caption fields to the keys submit_posts() expects."""
+    return {
+        "instagram": entry.get("ig_caption", ""),
+        "ig_hashtags": entry.get("ig_hashtags", ""),
+        "facebook": entry.get("fb_caption", ""),
+        "threads": entry.get("threads_caption", ""),
+        "tiktok": entry.get("tiktok_caption", ""),
+    }
+
+
+def print_summary(title: str, results: dict):
     print("\n" + "=" * 40)
-    print(f"POSTING RESULTS — {args.brand}")
+    print(f"POSTING RESULTS — {title}")
     print("=" * 40)
 
     for platform, result in results.items():
@@ -240,6 +402,77 @@ def main():
         detail = result.get("error", result.get("media_id", result.get("post_id", result.get("publish_id", ""))))
         print(f"  {status} {platform}: {detail}")
 
+
+def run_batch(manifest_path: str, results_path: str, workers: int) -> bool:
+    """Post every manifest entry through one shared pool; return True if all succeeded."""
+    entries = load_manifest(manifest_path)
+    # Resolve each brand's credentials up front rather than per call.
+    for brand in {entry["brand"] for entry in entries}:
+        brand_credentials(brand)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Stage local images first; an image shared by several entries is
+        # uploaded once.
+        staged = [pool.submit(stage_image, entry["brand"], entry["image"]) for entry in entries]
+        gate = SlotGate(pool)
+        submitted = []
+        for entry, staging in zip(entries, staged):
+            captions = entry_captions(entry)
+            try:
+                futures = submit_posts(gate, entry["brand"], staging.result(), captions)
+            except Exception as e:
+                futures = staging_failure(captions, e)
+            submitted.append((entry, futures))
+        batch = [
+            {"brand": entry["brand"], "image": entry["image"], "results": collect_results(futures)}
+            for entry, futures in submitted
+        ]
+
+    for item in batch:
+        print_summary(f"{item['brand']} — {os.path.basename(item['image'])}", item["results"])
+
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    with open(results_path, "w") as f:
+        json.dump(batch, f, indent=2)
+    print(f"\nResults saved to {results_path}")
+
+    return all(r.get("success") for item in batch for r in item["results"].values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post to social media platforms")
+    parser.add_argument("--brand")
+    parser.add_argument("--image", help="Local path or public URL")
+    parser.add_argument("--ig-caption", default="")
+    parser.add_argument("--ig-hashtags", default="")
+    parser.add_argument("--fb-caption", default="")
+    parser.add_argument("--threads-caption", default="")
+    parser.add_argument("--tiktok-caption", default="")
+    parser.add_argument("--manifest", help="JSON list of posts to make in one run (batch mode)")
+    parser.add_argument("--results", default=BATCH_RESULTS_PATH,
+                        help=f"Batch mode results file (default: {BATCH_RESULTS_PATH})")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                        help=f"Batch mode concurrent API calls (default: {BATCH_WORKERS})")
+    args = parser.parse_args()
+
+    if args.manifest:
+        if args.brand or args.image:
+            parser.error("--manifest cannot be combined with --brand/--image")
+        try:
+            ok = run_batch(args.manifest, args.results, max(1, args.workers))
+        except (OSError, ValueError) as e:
+            print(f"Could not read manifest: {e}", file=sys.stderr)
+            sys.exit(2)
+        sys.exit(0 if ok else 1)
+    if not args.brand or not args.image:
+        parser.error("--brand and --image are required (or use --manifest)")
+
+    # Meta and TikTok fetch the image by URL; a local path is staged as an
+    # unpublished Facebook photo first (see media_staging.py).
+    # All platforms are posted to at once; see post_all().
+    results = post_all(args.brand, args.image, entry_captions(vars(args)))
+    print_summary(args.brand, results)
+
     # Write results to JSON
     output_path = f"/tmp/organic-poster/{args.brand}/post_result.json"
     with open(output_path, "w") as f:
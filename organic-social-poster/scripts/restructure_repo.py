@@ -14,6 +14,20 @@ Usage:
 
     # Dry run (show what would happen without making changes):
     python3 scripts/restructure_repo.py --dry-run
+
+    # Apply everything as one atomic commit via the Git Data API
+    # (blobs -> one tree -> one commit -> one ref update):
+    python3 scripts/restructure_repo.py --single-commit
+
+Set GITHUB_API_URL to point at another API host (GitHub Enterprise, or a
+local mock server for testing).
+
+The repository layout is discovered with one recursive tree request, and file
+contents are fetched as blobs on a bounded thread pool. GET responses are
+cached with their ETags in /tmp/organic-poster/github_cache.json (override
+with GITHUB_CACHE_FILE). A rerun therefore sends conditional requests, and
+unchanged resources come back as 304s, which don't count against the rate
+limit.
 """
 
 import argparse
@@ -21,33 +35,107 @@ import base64
 import json
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import urllib.error
 import urllib.request
 import urllib.parse
 
+import http_pool
+
 
 REPO = os.environ.get("GITHUB_REPO", "Nsf34/claude-skills")
 TOKEN = os.environ.get("GITHUB_TOKEN", "")
 BRANCH = "main"
-BASE_URL = "https://api.github.com"
+BASE_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
 
 BRANDS = ["Aniwove", "LeafLofts", "PrepPack", "ScrollMerch", "TableClay"]
-
-
-def api_request(method: str, path: str, data: dict = None) -> dict:
-    """Make a GitHub API request."""
-    url = f"{BASE_URL}/repos/{REPO}/contents/{urllib.parse.quote(path, safe='/')}"
-
-    body = json.dumps(data).encode() if data else None
+SUBFOLDERS = ["research", "organic-images", "already-posted"]
+# Mode for new .gitkeep files, and for moved files whose mode is unknown
+# (listed through the Contents API fallback). Moves otherwise keep their mode.
+FILE_MODE = "100644"
+
+CACHE_FILE = os.environ.get("GITHUB_CACHE_FILE", "/tmp/organic-poster/github_cache.json")
+CACHE_MAX_ENTRIES = 500
+BLOB_FETCH_WORKERS = 8
+
+
+_etag_cache = None
+_etag_lock = threading.Lock()
+
+
+def _load_etag_cache() -> dict:
+    global _etag_cache
+    with _etag_lock:
+        if _etag_cache is None:
+            try:
+                with open(CACHE_FILE) as f:
+                    _etag_cache = json.load(f)
+            except (OSError, ValueError):
+                _etag_cache = {}
+        return _etag_cache
+
+
+def save_etag_cache():
+    """Write cached GET responses back to CACHE_FILE (newest CACHE_MAX_ENTRIES kept)."""
+    if _etag_cache is None:
+        return
+    with _etag_lock:
+        entries = list(_etag_cache.items())[-CACHE_MAX_ENTRIES:]
+        try:
+            os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+            tmp_path = CACHE_FILE + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(dict(entries), f)
+            os.replace(tmp_path, CACHE_FILE)
+        except OSError as e:
+            print(f"  Could not save GitHub response cache: {e}")
+
+
+def github_request(method: str, url: str, data: dict = None):
+    """Send a GitHub API request and return the decoded JSON body.
+
+    GETs are conditional: a cached ETag is sent as If-None-Match and a 304
+    returns the cached body. Raises urllib.error.HTTPError on errors.
+    """
+    body = json.dumps(data).encode() if data is not None else None
     req = urllib.request.Request(url, data=body, method=method)
     req.add_header("Authorization", f"token {TOKEN}")
     req.add_header("Accept", "application/vnd.github.v3+json")
     if body:
         req.add_header("Content-Type", "application/json")
 
+    cached = None
+    if method == "GET":
+        cached = _load_etag_cache().get(url)
+        if cached:
+            req.add_header("If-None-Match", cached["etag"])
+
+    try:
+        with http_pool.urlopen(req) as resp:
+            status, etag, raw = resp.status, resp.headers.get("ETag"), resp.read()
+    except urllib.error.HTTPError as e:
+        # urllib's own opener (used behind a proxy) reports 304 as an error.
+        if e.code == 304 and cached:
+            return cached["body"]
+        raise
+    if status == 304 and cached:
+        return cached["body"]
+    payload = json.loads(raw) if raw else None
+    if method == "GET" and etag:
+        with _etag_lock:
+            _etag_cache.pop(url, None)
+            _etag_cache[url] = {"etag": etag, "body": payload}
+    return payload
+
+
+def api_request(method: str, path: str, data: dict = None) -> dict:
+    """Make a GitHub API request."""
+    url = f"{BASE_URL}/repos/{REPO}/contents/{urllib.parse.quote(path, safe='/')}"
+
     try:
-        with urllib.request.urlopen(req) as resp:
-            return json.loads(resp.read())
+        return github_request(method, url, data)
     except urllib.error.HTTPError as e:
         error_body = e.read().decode()
         if e.code == 404:
@@ -56,14 +144,71 @@ def api_request(method: str, path: str, data: dict = None) -> dict:
         return None
 
 
+def git_request(method: str, path: str, data: dict = None) -> dict:
+    """Call a Git Data API endpoint (e.g. "git/refs/heads/main"); raises on HTTP errors."""
+    try:
+        return github_request(method, f"{BASE_URL}/repos/{REPO}/{path}", data)
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"{method} {path} failed ({e.code}): {e.read().decode()[:200]}")
+
+
+_tree = None
+
+
+def repo_tree():
+    """Every entry on BRANCH from one recursive tree request, or None if truncated/unavailable."""
+    global _tree
+    if _tree is None:
+        try:
+            result = git_request(
+                "GET", f"git/trees/{urllib.parse.quote(BRANCH, safe='')}?recursive=1"
+            )
+        except (RuntimeError, urllib.error.URLError) as e:
+            print(f"  Tree listing failed, listing directories one by one: {e}")
+            result = {"truncated": True}
+        # Very large repos get a truncated tree; fall back to per-directory listing.
+        _tree = [] if result.get("truncated") else result.get("tree", [])
+    return _tree or None
+
+
 def list_contents(path: str) -> list:
     """List files/dirs at a GitHub path."""
+    tree = repo_tree()
+    if tree is not None:
+        prefix = path.rstrip("/") + "/"
+        return [
+            {
+                "name": entry["path"][len(prefix):],
+                "path": entry["path"],
+                "sha": entry["sha"],
+                "mode": entry.get("mode"),
+                "type": "file" if entry["type"] == "blob" else "dir",
+            }
+            for entry in tree
+            if entry["path"].startswith(prefix) and "/" not in entry["path"][len(prefix):]
+        ]
     result = api_request("GET", path)
     if result and isinstance(result, list):
         return result
     return []
 
 
+def fetch_blobs(shas: list) -> dict:
+    """Fetch blob contents concurrently; returns {sha: base64 content} for those that succeeded."""
+    def fetch(sha):
+        try:
+            return sha, git_request("GET", f"git/blobs/{sha}")["content"].replace("\n", "")
+        except (RuntimeError, KeyError, urllib.error.URLError) as e:
+            print(f"  Could not fetch blob {sha[:7]}: {e}")
+            return sha, None
+
+    unique = list(dict.fromkeys(shas))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(BLOB_FETCH_WORKERS, len(unique))) as pool:
+        return {sha: content for sha, content in pool.map(fetch, unique) if content is not None}
+
+
 def create_file(path: str, content_b64: str, message: str, dry_run: bool):
     """Create a file in the repo."""
     if dry_run:
@@ -98,7 +243,7 @@ def delete_file(path: str, sha: str, message: str, dry_run: bool):
     req.add_header("Content-Type", "application/json")
 
     try:
-        with urllib.request.urlopen(req) as resp:
+        with http_pool.urlopen(req) as resp:
             time.sleep(0.5)
             return True
     except Exception as e:
@@ -106,21 +251,85 @@ def delete_file(path: str, sha: str, message: str, dry_run: bool):
         return False
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Restructure repo: Business Research → Brands")
-    parser.add_argument("--dry-run", action="store_true", help="Show what would happen without making changes")
-    args = parser.parse_args()
+def plan_restructure() -> tuple:
+    """Work out the target layout: (.gitkeep paths to create, moves to make).
 
-    if not TOKEN:
-        print("ERROR: Set GITHUB_TOKEN environment variable first.")
-        print("  export GITHUB_TOKEN='your_github_personal_access_token'")
-        sys.exit(1)
+    Each move is (brand, old_path, new_path, blob_sha, mode); moving a file
+    in a tree only re-points its existing blob, so no file content is
+    downloaded, and the file keeps its mode (e.g. 100755 for scripts).
+    """
+    gitkeeps = []
+    moves = []
+    for brand in BRANDS:
+        gitkeeps += [f"Brands/{brand}/{subfolder}/.gitkeep" for subfolder in SUBFOLDERS]
+        for file_info in list_contents(f"Business Research/{brand}"):
+            if file_info["type"] != "file":
+                continue
+            new_path = f"Brands/{brand}/research/{file_info['name']}"
+            mode = file_info.get("mode") or FILE_MODE
+            moves.append((brand, file_info["path"], new_path, file_info["sha"], mode))
+    return gitkeeps, moves
 
-    print("=" * 60)
-    print("REPO RESTRUCTURE: Business Research → Brands")
-    print(f"Repo: {REPO}")
-    print(f"Mode: {'DRY RUN' if args.dry_run else 'LIVE'}")
-    print("=" * 60)
+
+def run_single_commit(dry_run: bool) -> bool:
+    """Apply the whole restructure as one commit through the Git Data API."""
+    gitkeeps, moves = plan_restructure()
+
+    for path in gitkeeps:
+        print(f"  Create {path}")
+    for _, old_path, new_path, _, _ in moves:
+        print(f"  Move   {old_path} -> {new_path}")
+    if dry_run:
+        print(f"\n  [DRY RUN] Would commit {len(gitkeeps)} new and {len(moves)} moved file(s) in one commit")
+        return True
+
+    try:
+        head = git_request("GET", f"git/ref/heads/{BRANCH}")["object"]["sha"]
+        base_tree = git_request("GET", f"git/commits/{head}")["tree"]["sha"]
+
+        # Every .gitkeep shares one empty blob.
+        empty_blob = git_request("POST", "git/blobs", {"content": "", "encoding": "utf-8"})["sha"]
+        entries = [
+            {"path": path, "mode": FILE_MODE, "type": "blob", "sha": empty_blob}
+            for path in gitkeeps
+        ]
+        for _, old_path, new_path, blob_sha, mode in moves:
+            entries.append({"path": new_path, "mode": mode, "type": "blob", "sha": blob_sha})
+            # A null sha removes the path from the base tree.
+            entries.append({"path": old_path, "mode": mode, "type": "blob", "sha": None})
+
+        tree = git_request("POST", "git/trees", {"base_tree": base_tree, "tree": entries})["sha"]
+        if tree == base_tree:
+            print("\n  Nothing to change: the repository is already restructured")
+            return True
+        commit = git_request("POST", "git/commits", {
+            "message": f"Restructure Business Research/ into Brands/ ({len(moves)} files moved)",
+            "tree": tree,
+            "parents": [head],
+        })["sha"]
+        # Not forced: if the branch moved since we read it, fail rather than overwrite.
+        git_request("PATCH", f"git/refs/heads/{BRANCH}", {"sha": commit, "force": False})
+    except (RuntimeError, KeyError, urllib.error.URLError) as e:
+        print(f"\n  ❌ Restructure failed, repository unchanged: {e}")
+        return False
+
+    print(f"\n  ✅ Committed {commit[:7]} on {BRANCH}")
+    return True
+
+
+def run_per_file(dry_run: bool) -> bool:
+    """Restructure with one Contents API commit per created or moved file."""
+    # Download every dossier up front, concurrently, instead of one
+    # blocking GET per file inside the move loop.
+    contents = {}
+    if not dry_run:
+        shas = [
+            file_info["sha"]
+            for brand in BRANDS
+            for file_info in list_contents(f"Business Research/{brand}")
+            if file_info["type"] == "file"
+        ]
+        contents = fetch_blobs(shas)
 
     # Step 1: Create Brands/{Brand}/research/, organic-images/, already-posted/ for each brand
     gitkeep_content = base64.b64encode(b"").decode()  # empty .gitkeep file
@@ -129,14 +338,14 @@ def main():
         print(f"\n--- {brand} ---")
 
         # Create folder structure with .gitkeep files
-        for subfolder in ["research", "organic-images", "already-posted"]:
+        for subfolder in SUBFOLDERS:
             path = f"Brands/{brand}/{subfolder}/.gitkeep"
             print(f"  Creating {path}...")
             create_file(
                 path,
                 gitkeep_content,
                 f"Create Brands/{brand}/{subfolder}/ folder",
-                args.dry_run,
+                dry_run,
             )
 
         # Step 2: Move research dossiers from Business Research/{Brand}/ to Brands/{Brand}/research/
@@ -159,16 +368,14 @@ def main():
             print(f"    From: {old_file_path}")
             print(f"    To:   {new_file_path}")
 
-            # Get file content
-            if not args.dry_run:
-                file_data = api_request("GET", old_file_path)
-                if not file_data:
+            # Get file content (prefetched above)
+            if not dry_run:
+                file_sha = file_info["sha"]
+                file_content = contents.get(file_sha)
+                if file_content is None:
                     print(f"    ERROR: Could not read {old_file_path}")
                     continue
 
-                file_content = file_data.get("content", "").replace("\n", "")
-                file_sha = file_data["sha"]
-
                 # Create at new location
                 success = create_file(
                     new_file_path,
@@ -192,16 +399,46 @@ def main():
                 print(f"    [DRY RUN] Would move")
 
     print("\n" + "=" * 60)
-    if args.dry_run:
+    if dry_run:
         print("DRY RUN COMPLETE. Run without --dry-run to make changes.")
     else:
         print("RESTRUCTURE COMPLETE!")
         print("Your repo now has:")
         for brand in BRANDS:
-            print(f"  Brands/{brand}/research/")
-            print(f"  Brands/{brand}/organic-images/")
-            print(f"  Brands/{brand}/already-posted/")
+            for subfolder in SUBFOLDERS:
+                print(f"  Brands/{brand}/{subfolder}/")
     print("=" * 60)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Restructure repo: Business Research → Brands")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would happen without making changes")
+    parser.add_argument("--single-commit", action="store_true",
+                        help="Apply everything as one commit via the Git Data API instead of one commit per file")
+    args = parser.parse_args()
+
+    if not TOKEN:
+        print("ERROR: Set GITHUB_TOKEN environment variable first.")
+        print("  export GITHUB_TOKEN='your_github_personal_access_token'")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("REPO RESTRUCTURE: Business Research → Brands")
+    print(f"Repo: {REPO}")
+    print(f"Mode: {'DRY RUN' if args.dry_run else 'LIVE'}")
+    print("=" * 60)
+
+    try:
+        if args.single_commit:
+            ok = run_single_commit(args.dry_run)
+            print("=" * 60)
+        else:
+            ok = run_per_file(args.dry_run)
+    finally:
+        save_etag_cache()
+    if not ok:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -53,13 +53,11 @@ Content Manifest Format (JSON):
 import argparse
 import json
 import random
-import subprocess
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
-SCRIPT_DIR = Path(__file__).resolve().parent
-SCHEDULE_SCRIPT = SCRIPT_DIR / "schedule_post.py"
+from schedule_post import schedule_many
 
 DEFAULT_POSTS_PER_DAY = 5
 DEFAULT_START_HOUR = 8    # 8:00 AM
@@ -194,28 +192,16 @@ def load_manifest(manifest_path):
     return manifest
 
 
-def schedule_one_post(media_files, caption, platforms, date_str, hour, minute, tz_name):
-    """Call schedule_post.py to queue a single post."""
-    time_str = f"{date_str} {hour:02d}:{minute:02d}"
-    cmd = [
-        sys.executable,
-        str(SCHEDULE_SCRIPT),
-        "--media", *media_files,
-        "--caption", caption,
-        "--platforms", *platforms,
-        "--schedule", time_str,
-        "--timezone", tz_name,
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        error = result.stderr.strip() or result.stdout.strip()
-        return {"success": False, "time": time_str, "error": error}
-
-    try:
-        output = json.loads(result.stdout.strip())
-        return {"success": True, "time": time_str, **output}
-    except (json.JSONDecodeError, ValueError):
-        return {"success": True, "time": time_str, "raw_output": result.stdout.strip()}
+def build_job(media_files, caption, platforms, date_str, hour, minute, tz_name, normalize=False):
+    """Build a schedule_post.schedule_many() job for a single post."""
+    return {
+        "media": media_files,
+        "caption": caption,
+        "platforms": platforms,
+        "schedule": f"{date_str} {hour:02d}:{minute:02d}",
+        "timezone": tz_name,
+        "normalize": normalize,
+    }
 
 
 def parse_args(argv=None):
@@ -270,6 +256,14 @@ def parse_args(argv=None):
         action="store_true",
         help="Preview the generated schedule without actually queuing posts.",
     )
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help=(
+            "Replace media that fails validation with platform-compliant "
+            "derivatives (see normalize_media.py), processed in parallel."
+        ),
+    )
     return parser.parse_args(argv)
 
 
@@ -334,8 +328,10 @@ def main(argv=None):
         print(json.dumps(summary, indent=2))
         sys.exit(0)
 
-    # Queue the posts
-    results = []
+    # Queue the posts in one batch: each unique media file is validated and
+    # stored once, and all entries go into the queue in a single write.
+    jobs = []
+    job_platforms = []
     content_idx = 0
 
     for slot_idx in range(args.posts_per_day):
@@ -343,9 +339,7 @@ def main(argv=None):
             hour, minute = schedules[platform][slot_idx]
             entry = manifest[content_idx]
             content_idx += 1
-
-            print(f"Scheduling: {platform} at {hour:02d}:{minute:02d} ...", end=" ")
-            result = schedule_one_post(
+            jobs.append(build_job(
                 media_files=entry["media"],
                 caption=entry["caption"],
                 platforms=[platform],
@@ -353,13 +347,20 @@ def main(argv=None):
                 hour=hour,
                 minute=minute,
                 tz_name=args.timezone,
-            )
-            results.append({**result, "platform": platform})
+                normalize=args.normalize,
+            ))
+            job_platforms.append(platform)
 
-            if result["success"]:
-                print(f"OK (id={result.get('post_id', '?')})")
-            else:
-                print(f"FAILED: {result.get('error', 'unknown')}")
+    results = []
+    for job, platform, result in zip(jobs, job_platforms, schedule_many(jobs)):
+        result = {"time": job["schedule"], **result, "platform": platform}
+        results.append(result)
+
+        print(f"Scheduling: {platform} at {job['schedule'].split()[1]} ...", end=" ")
+        if result["success"]:
+            print(f"OK (id={result.get('post_id', '?')})")
+        else:
+            print(f"FAILED: {result.get('error', 'unknown')}")
 
     # Summary
     successes = sum(1 for r in results if r["success"])
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Shared, pooled HTTP session for the posting scripts.
+
+``requests.request()`` builds a throwaway Session per call, so every Graph
+API or TikTok request paid for a new TCP + TLS handshake. get_session()
+returns one process-wide Session whose adapter keeps connections alive and
+reuses them across calls and threads (the scheduler's in-process workers
+all share it).
+
+Environment variables:
+    HTTP_POOL_CONNECTIONS  Number of per-host pools to keep (default 10).
+    HTTP_POOL_MAXSIZE      Connections kept alive per host (default 10).
+    HTTP_CONNECT_RETRIES   Retries for failed connection attempts (default 2).
+    HTTP_TIMING            Set to 1 to log every request's status, latency and
+                           whether it opened a new connection to stderr, plus
+                           a summary at exit.
+
+Only connection failures are retried at this layer. A request that reached
+the server is never re-sent here; the scripts' own retry helpers decide
+that, so a POST that publishes a post is not silently duplicated.
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+CONNECT_RETRIES = int(os.environ.get("HTTP_CONNECT_RETRIES", "2"))
+TIMING_ENABLED = os.environ.get("HTTP_TIMING", "") not in ("", "0")
+
+
+class TimedAdapter(HTTPAdapter):
+    """HTTPAdapter that records latency and new-vs-reused connections."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "new_connections": 0, "seconds": 0.0}
+
+    def send(self, request, *args, **kwargs):
+        pool = self.poolmanager.connection_from_url(request.url)
+        before = getattr(pool, "num_connections", 0)
+        start = time.perf_counter()
+        try:
+            return super().send(request, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            opened = getattr(pool, "num_connections", 0) - before
+            with self.stats_lock:
+                self.stats["requests"] += 1
+                self.stats["new_connections"] += max(0, opened)
+                self.stats["seconds"] += elapsed
+            if TIMING_ENABLED:
+                url = request.url.split("?", 1)[0]
+                print(
+                    f"[http] {request.method} {url} {elapsed * 1000:.0f}ms "
+                    f"({'new connection' if opened > 0 else 'reused'})",
+                    file=sys.stderr,
+                )
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide pooled Session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = TimedAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=Retry(
+                    total=CONNECT_RETRIES,
+                    connect=CONNECT_RETRIES,
+                    read=0,
+                    status=0,
+                    other=0,
+                    backoff_factor=0.5,
+                    raise_on_status=False,
+                ),
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+            if TIMING_ENABLED:
+                atexit.register(_print_summary, adapter)
+        return _session
+
+
+def _print_summary(adapter):
+    stats = adapter.stats
+    if not stats["requests"]:
+        return
+    print(
+        f"[http] {stats['requests']} request(s) over {stats['new_connections']} "
+        f"new connection(s); {stats['seconds']:.2f}s total",
+        file=sys.stderr,
+    )
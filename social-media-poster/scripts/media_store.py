@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store for scheduled media.
+
+schedule_post.py used to make a full copy of every media file for every
+scheduled post, so a video queued for five time slots was stored five
+times. Files are now stored once under assets/media_store/blobs/, keyed by
+their SHA-256, and each post's assets/scheduled_media/<post_id>/<name> is a
+hardlink to the blob (a reflink or plain copy where hardlinks are not
+available). Posting scripts keep reading ordinary file paths.
+
+Blobs are written from the source with a reflink (FICLONE) when the
+filesystem supports copy-on-write clones, and a regular copy otherwise.
+The source itself is never linked into the store, so editing the original
+after scheduling does not change what gets posted.
+
+index.json records, for every blob, its size and the post IDs that
+reference it (once per linked file). release_post() drops a post's
+references and deletes blobs nobody references any more. The index also caches the hash of recently
+stored source files by (path, size, mtime, inode) so re-scheduling the same
+file does not re-read it. All index updates happen under an flock.
+
+Usage:
+    python media_store.py --report    # blob count, bytes stored and saved
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+ASSETS_DIR = PROJECT_ROOT / "assets"
+SCHEDULED_MEDIA_DIR = ASSETS_DIR / "scheduled_media"
+MEDIA_STORE_DIR = ASSETS_DIR / "media_store"
+BLOBS_DIR = MEDIA_STORE_DIR / "blobs"
+INDEX_FILE = MEDIA_STORE_DIR / "index.json"
+INDEX_LOCK = MEDIA_STORE_DIR / "index.lock"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Source-file hashes remembered in the index (oldest dropped first).
+HASH_CACHE_ENTRIES = 1000
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+
+def _locked():
+    MEDIA_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    fh = open(INDEX_LOCK, "w")
+    fcntl.flock(fh, fcntl.LOCK_EX)
+    return fh
+
+
+def _unlock(fh):
+    fcntl.flock(fh, fcntl.LOCK_UN)
+    fh.close()
+
+
+def _load_index():
+    try:
+        index = json.loads(INDEX_FILE.read_text())
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault("blobs", {})
+    index.setdefault("hashes", {})
+    return index
+
+
+def _save_index(index):
+    hashes = index["hashes"]
+    while len(hashes) > HASH_CACHE_ENTRIES:
+        hashes.pop(next(iter(hashes)))
+    tmp_path = INDEX_FILE.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(index, indent=2) + "\n")
+    os.replace(tmp_path, INDEX_FILE)
+
+
+# ---------------------------------------------------------------------------
+# Files
+# ---------------------------------------------------------------------------
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cached_sha256(index, src):
+    st = src.stat()
+    fingerprint = [st.st_size, st.st_mtime_ns, st.st_ino]
+    cached = index["hashes"].get(str(src))
+    if cached and cached.get("stat") == fingerprint:
+        return cached["sha256"], st.st_size
+    sha = file_sha256(src)
+    index["hashes"].pop(str(src), None)
+    index["hashes"][str(src)] = {"stat": fingerprint, "sha256": sha}
+    return sha, st.st_size
+
+
+def blob_path(sha, suffix=""):
+    """Return where the blob for *sha* lives in the store."""
+    return BLOBS_DIR / sha[:2] / f"{sha}{suffix.lower()}"
+
+
+def _clone_or_copy(src, dest):
+    """Reflink *src* to *dest* if the filesystem allows it, else copy it."""
+    try:
+        with open(src, "rb") as src_fh, open(dest, "wb") as dest_fh:
+            fcntl.ioctl(dest_fh.fileno(), FICLONE, src_fh.fileno())
+        method = "reflink"
+    except OSError:
+        shutil.copyfile(src, dest)
+        method = "copy"
+    shutil.copystat(src, dest)
+    return method
+
+
+def _place(blob, dest):
+    """Make *dest* refer to *blob*: hardlink, else reflink/copy."""
+    try:
+        os.link(blob, dest)
+        return "hardlink"
+    except OSError:
+        return _clone_or_copy(blob, dest)
+
+
+def _unique_dest(dest_dir, name):
+    dest = dest_dir / name
+    counter = 1
+    while dest.exists():
+        dest = dest_dir / f"{Path(name).stem}_{counter}{Path(name).suffix}"
+        counter += 1
+    return dest
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+
+def _add_locked(index, media_files, post_id):
+    dest_dir = SCHEDULED_MEDIA_DIR / post_id
+    dest_dir.mkdir(parents=True, exist_ok=True)
+
+    entries = []
+    bytes_saved = 0
+    for filepath in media_files:
+        src = Path(filepath).resolve()
+        if not src.exists():
+            raise FileNotFoundError(f"Media file not found: {src}")
+        sha, size = _cached_sha256(index, src)
+        record = index["blobs"].get(sha) or {
+            "size": size, "suffix": src.suffix.lower(), "refs": [],
+        }
+        blob = blob_path(sha, record["suffix"])
+
+        if blob.exists():
+            bytes_saved += size
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp_blob = blob.with_name(blob.name + ".tmp")
+            _clone_or_copy(src, tmp_blob)
+            os.replace(tmp_blob, blob)
+
+        dest = _unique_dest(dest_dir, src.name)
+        _place(blob, dest)
+        record["refs"].append(post_id)
+        index["blobs"][sha] = record
+        entries.append({
+            "path": str(dest),
+            "original_path": str(src),
+            "sha256": sha,
+            "size": size,
+        })
+    return entries, bytes_saved
+
+
+def add_files(media_files, post_id):
+    """Store *media_files* for *post_id* and link them into its media directory.
+
+    Returns ``(entries, bytes_saved)``. Each entry has ``path`` (the file
+    under scheduled_media/<post_id>/), ``original_path``, ``sha256`` and
+    ``size``; *bytes_saved* counts the bytes that did not have to be
+    written because an identical blob was already stored.
+    """
+    lock_fh = _locked()
+    index = _load_index()
+    try:
+        return _add_locked(index, media_files, post_id)
+    finally:
+        # Saved even on failure so links already made stay referenced and
+        # release_post() can clean them up.
+        _save_index(index)
+        _unlock(lock_fh)
+
+
+def add_many(batch):
+    """Store media for several posts under one lock and one index write.
+
+    *batch* is a list of ``(post_id, media_files)``. Returns one item per
+    post, in order: ``(entries, bytes_saved)`` as from add_files(), or the
+    OSError that stopped that post (its partial links are still recorded,
+    so release_post() cleans them up).
+    """
+    results = []
+    lock_fh = _locked()
+    index = _load_index()
+    try:
+        for post_id, media_files in batch:
+            try:
+                results.append(_add_locked(index, media_files, post_id))
+            except OSError as exc:
+                results.append(exc)
+    finally:
+        _save_index(index)
+        _unlock(lock_fh)
+    return results
+
+
+def release_post(post_id):
+    """Drop *post_id*'s references, delete orphaned blobs and its media directory.
+
+    Returns the number of bytes actually freed from the store. Posts
+    scheduled before the store existed simply have their directory removed.
+    """
+    freed = 0
+    lock_fh = _locked()
+    try:
+        index = _load_index()
+        for sha, record in list(index["blobs"].items()):
+            if post_id not in record["refs"]:
+                continue
+            record["refs"] = [ref for ref in record["refs"] if ref != post_id]
+            if not record["refs"]:
+                blob = blob_path(sha, record.get("suffix", ""))
+                blob.unlink(missing_ok=True)
+                try:
+                    blob.parent.rmdir()
+                except OSError:
+                    pass
+                del index["blobs"][sha]
+                freed += record["size"]
+        _save_index(index)
+    finally:
+        _unlock(lock_fh)
+
+    media_dir = SCHEDULED_MEDIA_DIR / post_id
+    if media_dir.exists():
+        shutil.rmtree(str(media_dir))
+    return freed
+
+
+def report():
+    """Summarise the store: blobs, references and bytes saved by deduplication."""
+    lock_fh = _locked()
+    try:
+        index = _load_index()
+    finally:
+        _unlock(lock_fh)
+    stored = sum(r["size"] for r in index["blobs"].values())
+    referenced = sum(r["size"] * len(r["refs"]) for r in index["blobs"].values())
+    return {
+        "blobs": len(index["blobs"]),
+        "references": sum(len(r["refs"]) for r in index["blobs"].values()),
+        "bytes_stored": stored,
+        "bytes_referenced": referenced,
+        "bytes_saved": referenced - stored,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the scheduled media store.")
+    parser.add_argument(
+        "--report", action="store_true",
+        help="Print blob count, bytes stored and bytes saved by deduplication.",
+    )
+    args = parser.parse_args(argv)
+    if not args.report:
+        parser.print_help()
+        sys.exit(1)
+    print(json.dumps(report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Produce platform-compliant derivatives of media that fails validation.
+
+For each file that validate_media.py rejects for the target platforms, a
+derivative is made that satisfies all of them at once:
+
+    images  Re-encoded as JPEG (EXIF rotation applied), scaled to fit the
+            platforms' dimension limits and recompressed until it is under
+            the smallest size cap.
+    videos  Re-encoded with ffmpeg to H.264/AAC MP4 (yuv420p, faststart),
+            scaled to fit, frame rate clamped to the allowed range and
+            bitrate capped.
+
+Derivatives are cached in assets/normalized/ by source SHA-256 and target
+profile, so a file is only transcoded once per combination of platforms.
+Files that already pass validation, or whose problems cannot be fixed by
+re-encoding (e.g. a video that is too long), are returned unchanged and
+left for validation to report. Files are processed on a worker pool.
+
+The cache directory can be deleted at any time; scheduled posts keep their
+own copy in the media store.
+
+Usage:
+    python normalize_media.py --files a.png b.webm --platforms facebook instagram
+    python normalize_media.py --files "Brands/*/ad-outputs/" --platforms tiktok --jobs 4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import validate_media
+from media_store import file_sha256
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+ASSETS_DIR = PROJECT_ROOT / "assets"
+NORMALIZED_DIR = ASSETS_DIR / "normalized"
+
+# Bump when the encoding settings below change, so cached derivatives made
+# with the old settings are not reused.
+PROFILE_VERSION = 1
+
+# Long-side pixel limits for normalized images (the platforms' recommended
+# upload sizes; larger images are downscaled by the platforms anyway).
+IMAGE_MAX_DIMENSION = {
+    "facebook": 2048,
+    "instagram": 1440,
+    "tiktok": 1920,
+}
+JPEG_QUALITY_STEPS = (90, 85, 80, 75, 70, 60, 50)
+
+# Bitrate cap for platforms without their own max_bitrate rule.
+DEFAULT_VIDEO_MAX_BITRATE = 16 * 1000 * 1000  # 16 Mbps
+AUDIO_BITRATE = "128k"
+FFMPEG_TIMEOUT_SECONDS = 3600
+DEFAULT_JOBS = min(4, os.cpu_count() or 1)
+
+
+class NormalizeError(Exception):
+    """Raised when a derivative cannot be produced."""
+
+
+# ---------------------------------------------------------------------------
+# Profiles
+# ---------------------------------------------------------------------------
+
+
+def build_profile(media_type, platforms):
+    """Merge the platforms' requirements into the strictest common target."""
+    platforms = sorted(set(platforms))
+    name = f"{media_type}-{'+'.join(platforms)}-v{PROFILE_VERSION}"
+    if media_type == "image":
+        reqs = [validate_media.PLATFORM_IMAGE_REQUIREMENTS[p] for p in platforms]
+        return {
+            "name": name,
+            "type": "image",
+            "suffix": ".jpg",
+            "max_size_bytes": min(r["max_size_bytes"] for r in reqs),
+            "min_side": max(max(r["min_width"], r["min_height"]) for r in reqs),
+            "max_dimension": min(IMAGE_MAX_DIMENSION[p] for p in platforms),
+        }
+
+    reqs = [validate_media.PLATFORM_VIDEO_REQUIREMENTS[p] for p in platforms]
+    fps_ranges = [r["fps_range"] for r in reqs if r.get("fps_range")]
+    max_dims = [r["max_dimension"] for r in reqs if r.get("max_dimension")]
+    bitrates = [r["max_bitrate"] for r in reqs if r.get("max_bitrate")]
+    return {
+        "name": name,
+        "type": "video",
+        "suffix": ".mp4",
+        "max_size_bytes": min(r["max_size_bytes"] for r in reqs),
+        "fps_range": (
+            max(low for low, _ in fps_ranges), min(high for _, high in fps_ranges)
+        ) if fps_ranges else None,
+        "max_dimension": min(max_dims) if max_dims else None,
+        "max_bitrate": min(bitrates + [DEFAULT_VIDEO_MAX_BITRATE]),
+    }
+
+
+def derivative_path(sha, profile):
+    """Return where the derivative of the source with *sha* is cached."""
+    return NORMALIZED_DIR / sha[:2] / f"{sha}-{profile['name']}{profile['suffix']}"
+
+
+# ---------------------------------------------------------------------------
+# Encoders
+# ---------------------------------------------------------------------------
+
+
+def _fit(width, height, max_dimension, min_side):
+    """Scale (width, height) so the long side fits and the short side is large enough."""
+    scale = 1.0
+    if max_dimension and max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+    if min_side and min(width, height) * scale < min_side:
+        scale = min_side / min(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def normalize_image(src, dest, profile):
+    """Re-encode an image as a JPEG that satisfies *profile*."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise NormalizeError("Pillow is required to normalize images")
+
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+        size = _fit(img.width, img.height, profile["max_dimension"], profile["min_side"])
+        if size != img.size:
+            img = img.resize(size, Image.LANCZOS)
+
+        # Lower the quality first, then the resolution, until it fits.
+        for _ in range(5):
+            for quality in JPEG_QUALITY_STEPS:
+                img.save(dest, "JPEG", quality=quality, optimize=True, progressive=True)
+                if os.path.getsize(dest) <= profile["max_size_bytes"]:
+                    return
+            smaller = (round(img.width * 0.85), round(img.height * 0.85))
+            if min(smaller) < profile["min_side"]:
+                break
+            img = img.resize(smaller, Image.LANCZOS)
+    raise NormalizeError(
+        f"Could not compress image under {validate_media.fmt_bytes(profile['max_size_bytes'])}"
+    )
+
+
+def normalize_video(src, dest, profile, probe=None):
+    """Transcode a video to H.264/AAC MP4 that satisfies *profile*."""
+    if not shutil.which("ffmpeg"):
+        raise NormalizeError("ffmpeg is required to normalize videos")
+
+    filters = []
+    max_dim = profile["max_dimension"]
+    if max_dim:
+        filters.append(
+            f"scale=w='if(gte(iw,ih),min(iw,{max_dim}),-2)':"
+            f"h='if(gte(iw,ih),-2,min(ih,{max_dim}))'"
+        )
+    fps = (probe or {}).get("fps")
+    if profile["fps_range"] and fps:
+        low, high = profile["fps_range"]
+        if fps > high + 0.01:
+            filters.append(f"fps={high}")
+        elif fps < low - 0.01:
+            filters.append("fps=30")
+    filters.append("format=yuv420p")
+
+    max_bitrate = profile["max_bitrate"]
+    # Audio shares the container bitrate, so leave it some headroom.
+    video_bitrate = max(500 * 1000, max_bitrate - 256 * 1000)
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-i", str(src),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", ",".join(filters),
+        "-c:v", "libx264", "-preset", "medium", "-crf", "23",
+        "-maxrate", str(video_bitrate), "-bufsize", str(video_bitrate * 2),
+        "-c:a", "aac", "-b:a", AUDIO_BITRATE, "-ar", "48000",
+        "-movflags", "+faststart",
+        "-f", "mp4",
+        str(dest),
+    ]
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT_SECONDS
+        )
+    except subprocess.TimeoutExpired:
+        raise NormalizeError("ffmpeg timed out")
+    if result.returncode != 0:
+        raise NormalizeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+
+def normalize_file(filepath, platforms, force=False):
+    """Return a dict describing the file to upload for *platforms*.
+
+    Keys: ``source``, ``path`` (the derivative, or the source itself when
+    nothing was done), ``profile``, ``cached`` and ``error``.
+    """
+    outcome = {
+        "source": filepath,
+        "path": filepath,
+        "profile": None,
+        "cached": False,
+        "error": None,
+    }
+    media_type = validate_media.classify_media(filepath)
+    if media_type is None or not os.path.isfile(filepath):
+        return outcome
+    if not force and not validate_media.validate_file(filepath, platforms)["issues"]:
+        return outcome
+
+    profile = build_profile(media_type, platforms)
+    outcome["profile"] = profile["name"]
+    dest = derivative_path(file_sha256(filepath), profile)
+    if dest.exists():
+        outcome.update(path=str(dest), cached=True)
+        return outcome
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per process and thread: identical files at different paths map
+    # to the same derivative and may be normalized concurrently by --jobs.
+    tmp_dest = dest.with_name(
+        f"{dest.stem}.{os.getpid()}.{threading.get_ident()}.tmp{dest.suffix}"
+    )
+    try:
+        if media_type == "image":
+            normalize_image(filepath, tmp_dest, profile)
+        else:
+            probe = validate_media.probe_media(filepath, "video")
+            normalize_video(filepath, tmp_dest, profile, probe)
+        os.replace(tmp_dest, dest)
+    except (NormalizeError, OSError) as exc:
+        tmp_dest.unlink(missing_ok=True)
+        outcome["error"] = str(exc)
+        return outcome
+    outcome["path"] = str(dest)
+    return outcome
+
+
+def normalize_many(items, jobs=DEFAULT_JOBS, force=False):
+    """Normalize ``(filepath, platforms)`` pairs on a worker pool, in order."""
+    if jobs <= 1 or len(items) <= 1:
+        return [normalize_file(path, platforms, force) for path, platforms in items]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lambda item: normalize_file(item[0], item[1], force), items))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create platform-compliant derivatives of media that fails validation."
+    )
+    parser.add_argument("--files", nargs="+", required=True,
+                        help="Media files, directories or glob patterns.")
+    parser.add_argument("--platforms", nargs="+", required=True,
+                        choices=validate_media.PLATFORM_CHOICES,
+                        help="Platforms the derivatives must satisfy.")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"Files to normalize in parallel (default: {DEFAULT_JOBS}).")
+    parser.add_argument("--force", action="store_true",
+                        help="Normalize files even if they already pass validation.")
+    args = parser.parse_args(argv)
+
+    files = validate_media.expand_inputs(args.files)
+    results = normalize_many([(f, args.platforms) for f in files], args.jobs, args.force)
+    failed = [r for r in results if r["error"]]
+    print(json.dumps({"success": not failed, "files": results}, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
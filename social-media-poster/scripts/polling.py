@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Adaptive status polling shared by the posting scripts.
+
+Instagram containers and TikTok publishes used to be polled every 5 s until
+a hard timeout: too slow for a photo that is ready in one second, and a
+waste of API quota on a long video. poll() instead:
+
+- checks quickly at first (FIRST_DELAY_SECONDS), then backs off
+  exponentially with jitter up to MAX_DELAY_SECONDS;
+- when earlier runs give an estimate of how long this kind of media takes
+  to process, sleeps through most of the expected time in one go and then
+  checks quickly again around the estimate;
+- appends every observed processing time, with the platform, kind of
+  media and its size, to assets/processing_times.jsonl.
+
+Each record keeps both bounds on the processing time: ``after``, the last
+check that still saw processing under way, and ``seconds``, the check that
+saw it done. Estimates use the midpoint, so an overlong estimate-driven
+sleep does not teach the next run to sleep just as long.
+
+Estimates come from the most recent successful runs of the same platform
+and kind, scaled linearly by file size when sizes are known. Sizes outside
+the range of the samples are clamped to it, and no estimate exceeds
+ESTIMATE_MAX_TIMEOUT_FRACTION of the poll's timeout.
+
+Usage:
+    import polling
+    result = polling.poll(check, "tiktok", "video", media_bytes=size, timeout=600)
+
+    python polling.py --stats    # per-platform processing time summary
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+ASSETS_DIR = PROJECT_ROOT / "assets"
+PROCESSING_LOG = Path(
+    os.environ.get("PROCESSING_LOG_FILE", ASSETS_DIR / "processing_times.jsonl")
+)
+
+FIRST_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 30.0
+BACKOFF_FACTOR = 1.6
+JITTER_FRACTION = 0.2
+# Sleep straight through this fraction of the estimated processing time.
+ESTIMATE_LEAD_FRACTION = 0.8
+# Never let an estimate use up more than this fraction of the timeout.
+ESTIMATE_MAX_TIMEOUT_FRACTION = 0.5
+
+# Runs considered when estimating, and the log size that triggers trimming
+# to the most recent half.
+ESTIMATE_SAMPLES = 20
+LOG_MAX_BYTES = 512 * 1024
+
+
+class PollTimeout(RuntimeError):
+    """Raised when *timeout* passes before check() reports completion."""
+
+
+# ---------------------------------------------------------------------------
+# Processing-time log
+# ---------------------------------------------------------------------------
+
+
+def _read_log():
+    try:
+        lines = PROCESSING_LOG.read_text().splitlines()
+    except OSError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def record_processing(platform, kind, media_bytes, seconds, outcome, polls, after=None):
+    """Append one observed processing time to the log (best effort).
+
+    *seconds* is when the final check ran and *after* when the last check
+    that saw processing still under way ran, if any.
+    """
+    record = {
+        "platform": platform,
+        "kind": kind,
+        "bytes": media_bytes,
+        "seconds": round(seconds, 3),
+        "after": round(after, 3) if after is not None else None,
+        "outcome": outcome,
+        "polls": polls,
+        "at": time.time(),
+    }
+    try:
+        PROCESSING_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(PROCESSING_LOG.with_suffix(".lock"), "w") as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            with open(PROCESSING_LOG, "a") as fh:
+                fh.write(json.dumps(record) + "\n")
+            if PROCESSING_LOG.stat().st_size > LOG_MAX_BYTES:
+                lines = PROCESSING_LOG.read_text().splitlines()
+                tmp_path = PROCESSING_LOG.with_suffix(".tmp")
+                tmp_path.write_text("\n".join(lines[len(lines) // 2:]) + "\n")
+                os.replace(tmp_path, PROCESSING_LOG)
+    except OSError as exc:
+        print(f"[poll] Could not record processing time: {exc}", file=sys.stderr)
+
+
+def _observed_seconds(record):
+    """Midpoint between the last pending check and the one that saw completion."""
+    after = record.get("after") or 0.0
+    return (after + record["seconds"]) / 2
+
+
+def estimate_seconds(platform, kind, media_bytes=None, timeout=None):
+    """Estimate processing time from recent successful runs, or None.
+
+    *media_bytes* is clamped to the sizes seen in the samples, and the
+    result to ESTIMATE_MAX_TIMEOUT_FRACTION of *timeout* when given.
+    """
+    samples = [
+        r for r in _read_log()
+        if r.get("platform") == platform and r.get("kind") == kind
+        and r.get("outcome") == "ok"
+    ][-ESTIMATE_SAMPLES:]
+    if not samples:
+        return None
+    estimate = statistics.median(_observed_seconds(r) for r in samples)
+    sized = [r for r in samples if r.get("bytes")]
+    if media_bytes and sized:
+        sizes = [r["bytes"] for r in sized]
+        media_bytes = min(max(media_bytes, min(sizes)), max(sizes))
+        estimate = statistics.median(
+            _observed_seconds(r) * media_bytes / r["bytes"] for r in sized
+        )
+    if timeout is not None:
+        estimate = min(estimate, timeout * ESTIMATE_MAX_TIMEOUT_FRACTION)
+    return estimate
+
+
+# ---------------------------------------------------------------------------
+# Polling
+# ---------------------------------------------------------------------------
+
+
+def _jittered(delay):
+    return delay * random.uniform(1 - JITTER_FRACTION, 1 + JITTER_FRACTION)
+
+
+def poll(check, platform, kind, media_bytes=None, timeout=300, label=""):
+    """Call ``check()`` until it returns something other than None.
+
+    *check* returns None while processing is still under way, returns the
+    final value once it is done, and raises to abort (e.g. on an ERROR
+    status). The elapsed time is logged either way. Raises PollTimeout
+    after *timeout* seconds.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    estimate = estimate_seconds(platform, kind, media_bytes, timeout)
+    if estimate is not None:
+        print(
+            f"[poll] {label or kind}: expecting about {estimate:.0f}s of processing",
+            file=sys.stderr,
+        )
+
+    delay = FIRST_DELAY_SECONDS
+    polls = 0
+    outcome = "error"
+    checked_at = pending_at = None
+    try:
+        while True:
+            polls += 1
+            checked_at = time.monotonic() - start
+            result = check()
+            if result is not None:
+                outcome = "ok"
+                return result
+
+            pending_at = checked_at
+            now = time.monotonic()
+            if now >= deadline:
+                outcome = "timeout"
+                raise PollTimeout(
+                    f"Timed out after {timeout:g}s waiting for {label or kind}."
+                )
+            elapsed = now - start
+            sleep_for = _jittered(delay)
+            if estimate is not None and elapsed < estimate * ESTIMATE_LEAD_FRACTION:
+                # Nothing to gain from checking before the expected finish.
+                sleep_for = max(sleep_for, estimate * ESTIMATE_LEAD_FRACTION - elapsed)
+                delay = FIRST_DELAY_SECONDS
+            else:
+                delay = min(delay * BACKOFF_FACTOR, MAX_DELAY_SECONDS)
+            time.sleep(max(0.0, min(sleep_for, deadline - now)))
+    finally:
+        seconds = checked_at if checked_at is not None else time.monotonic() - start
+        record_processing(
+            platform, kind, media_bytes, seconds, outcome, polls, after=pending_at
+        )
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def summarize():
+    """Group the log by platform and kind: runs, median seconds and s/MB."""
+    groups = {}
+    for record in _read_log():
+        key = f"{record.get('platform')}:{record.get('kind')}"
+        groups.setdefault(key, []).append(record)
+    summary = {}
+    for key, records in sorted(groups.items()):
+        ok = [r for r in records if r.get("outcome") == "ok"]
+        per_mb = [
+            _observed_seconds(r) / (r["bytes"] / (1024 * 1024)) for r in ok if r.get("bytes")
+        ]
+        summary[key] = {
+            "runs": len(records),
+            "failed": len(records) - len(ok),
+            "median_seconds": round(statistics.median(_observed_seconds(r) for r in ok), 1) if ok else None,
+            "median_seconds_per_mb": round(statistics.median(per_mb), 2) if per_mb else None,
+            "median_polls": statistics.median(r.get("polls", 0) for r in records),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect observed processing times.")
+    parser.add_argument("--stats", action="store_true", help="Print a per-platform summary.")
+    args = parser.parse_args(argv)
+    if not args.stats:
+        parser.print_help()
+        sys.exit(1)
+    print(json.dumps(summarize(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
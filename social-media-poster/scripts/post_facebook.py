@@ -21,6 +21,10 @@ Usage examples:
 
     # Mixed media (images + videos)
     python post_facebook.py --media photo.jpg clip.mp4 --caption "Mixed content"
+
+Library usage (returns the same result dict the CLI prints):
+    import post_facebook
+    result = post_facebook.publish(["photo.jpg"], "Hello world")
 """
 
 import argparse
@@ -28,11 +32,16 @@ import json
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import requests
 from dotenv import load_dotenv
 
+import rate_limit
+from http_session import get_session
+from upload_state import UploadState, open_state
+
 GRAPH_API_VERSION = "v21.0"
 GRAPH_API_BASE = f"https://graph.facebook.com/{GRAPH_API_VERSION}"
 
@@ -62,44 +71,64 @@ def classify_media(file_path: str) -> str:
     )
 
 
-def output_success(post_id: str, post_type: str) -> None:
-    """Print success JSON and exit 0."""
-    print(json.dumps({
+class FacebookPostError(Exception):
+    """Raised when a post cannot be published; carries an error code."""
+
+    def __init__(self, error: str, error_code: str = "") -> None:
+        super().__init__(error)
+        self.error = error
+        self.error_code = str(error_code)
+
+
+def success_result(post_id: str, post_type: str) -> dict:
+    """Build the success payload printed by the CLI."""
+    return {
         "success": True,
         "platform": "facebook",
         "post_id": post_id,
         "post_type": post_type,
-    }))
-    sys.exit(0)
+    }
 
 
-def output_error(error: str, error_code: str = "") -> None:
-    """Print failure JSON and exit 1."""
-    print(json.dumps({
+def error_result(error: str, error_code: str = "") -> dict:
+    """Build the failure payload printed by the CLI."""
+    return {
         "success": False,
         "platform": "facebook",
         "error": error,
         "error_code": str(error_code),
-    }))
-    sys.exit(1)
+    }
 
 
-def request_with_retry(method: str, url: str, **kwargs) -> requests.Response:
+def request_with_retry(
+    method: str, url: str, limit_kind: str = "api", **kwargs
+) -> requests.Response:
     """Execute an HTTP request with exponential-backoff retry on rate limits.
 
     Retries up to MAX_RETRIES times when the Graph API returns HTTP 429 or an
     error body containing code 4 / code 32 (rate-limit / too-many-calls).
+    Every attempt is first paced by the shared rate limiter (see
+    rate_limit.py), which also learns from the usage headers on the response.
+    *limit_kind* selects the limiter's fallback budget, e.g. ``"transfer"``
+    for upload chunks.
     """
     last_exc: Exception | None = None
+    account = rate_limit.account_for(url, kwargs)
 
     for attempt in range(MAX_RETRIES + 1):
         try:
-            response = requests.request(method, url, timeout=300, **kwargs)
+            rate_limit.acquire("facebook", account, limit_kind)
+            response = get_session().request(method, url, timeout=300, **kwargs)
+            rate_limit.observe(
+                "facebook", account, response.headers, response.status_code,
+                kind=limit_kind,
+            )
 
-            # Detect rate-limit responses
+            # Detect rate-limit responses; the limiter holds off the retry.
             if _is_rate_limited(response) and attempt < MAX_RETRIES:
-                delay = BACKOFF_DELAYS[attempt]
-                time.sleep(delay)
+                rate_limit.penalize(
+                    "facebook", account, BACKOFF_DELAYS[attempt], limit_kind
+                )
                 continue
 
             return response
@@ -132,14 +161,14 @@ def _is_rate_limited(response: requests.Response) -> bool:
 
 
 def _raise_for_api_error(response: requests.Response, context: str = "") -> dict:
-    """Parse the JSON body; if it contains an API error, call output_error.
+    """Parse the JSON body; raise FacebookPostError if it contains an API error.
 
     Returns the parsed JSON dict on success.
     """
     try:
         data = response.json()
     except ValueError:
-        output_error(
+        raise FacebookPostError(
             f"Non-JSON response from API{f' ({context})' if context else ''}: "
             f"{response.text[:500]}",
             error_code=str(response.status_code),
@@ -149,7 +178,7 @@ def _raise_for_api_error(response: requests.Response, context: str = "") -> dict
         err = data["error"]
         msg = err.get("message", "Unknown API error")
         code = err.get("code", response.status_code)
-        output_error(
+        raise FacebookPostError(
             f"{context + ': ' if context else ''}{msg}",
             error_code=str(code),
         )
@@ -162,9 +191,17 @@ def _raise_for_api_error(response: requests.Response, context: str = "") -> dict
 # ---------------------------------------------------------------------------
 
 def upload_image_unpublished(
-    page_id: str, access_token: str, file_path: str
+    page_id: str, access_token: str, file_path: str, state: UploadState | None = None
 ) -> str:
-    """Upload an image as unpublished and return its media fbid."""
+    """Upload an image as unpublished and return its media fbid.
+
+    Skips the upload if *state* already records an fbid for this file.
+    """
+    state = state or UploadState(None)
+    saved = state.section("media_ids").get(file_path)
+    if saved:
+        return saved
+
     url = f"{GRAPH_API_BASE}/{page_id}/photos"
     with open(file_path, "rb") as f:
         response = request_with_retry(
@@ -179,23 +216,43 @@ def upload_image_unpublished(
     data = _raise_for_api_error(response, context=f"Uploading image '{file_path}'")
     photo_id = data.get("id")
     if not photo_id:
-        output_error(f"No photo id returned for '{file_path}'", error_code="upload_error")
+        raise FacebookPostError(f"No photo id returned for '{file_path}'", error_code="upload_error")
+    state.set_in("media_ids", file_path, photo_id)
     return photo_id
 
 
 def upload_video(
-    page_id: str, access_token: str, file_path: str, published: bool = True, description: str = ""
+    page_id: str,
+    access_token: str,
+    file_path: str,
+    published: bool = True,
+    description: str = "",
+    state: UploadState | None = None,
 ) -> str:
     """Upload a video to the Page.
 
     Uses resumable upload protocol for files larger than 100 MB.
-    Returns the video id.
+    Returns the video id. If *state* already records a video id for this
+    file the upload is skipped; an interrupted resumable upload continues
+    from its last acknowledged offset.
     """
+    state = state or UploadState(None)
+    saved = state.section("media_ids").get(file_path)
+    if saved:
+        return saved
+
     file_size = os.path.getsize(file_path)
 
     if file_size > RESUMABLE_UPLOAD_THRESHOLD:
-        return _upload_video_resumable(page_id, access_token, file_path, published, description)
-    return _upload_video_simple(page_id, access_token, file_path, published, description)
+        video_id = _upload_video_resumable(
+            page_id, access_token, file_path, published, description, state
+        )
+    else:
+        video_id = _upload_video_simple(
+            page_id, access_token, file_path, published, description
+        )
+    state.set_in("media_ids", file_path, video_id)
+    return video_id
 
 
 def _upload_video_simple(
@@ -219,21 +276,46 @@ def _upload_video_simple(
     result = _raise_for_api_error(response, context=f"Uploading video '{file_path}'")
     video_id = result.get("id")
     if not video_id:
-        output_error(f"No video id returned for '{file_path}'", error_code="upload_error")
+        raise FacebookPostError(f"No video id returned for '{file_path}'", error_code="upload_error")
     return video_id
 
 
 def _upload_video_resumable(
-    page_id: str, access_token: str, file_path: str, published: bool, description: str
+    page_id: str,
+    access_token: str,
+    file_path: str,
+    published: bool,
+    description: str,
+    state: UploadState,
 ) -> str:
     """Upload a video using the resumable upload protocol (for >100 MB files).
 
-    Three phases: start, transfer, finish.
+    Three phases: start, transfer, finish. The upload session id and the
+    offsets acknowledged by each transfer are checkpointed in *state*, so a
+    retry resumes the transfer instead of starting again from byte zero.
     """
     file_size = os.path.getsize(file_path)
-    file_name = Path(file_path).name
     url = f"{GRAPH_API_BASE}/{page_id}/videos"
 
+    session = state.section("sessions").get(file_path)
+    if session and session.get("file_size") == file_size:
+        print(
+            f"[resume] Resuming upload of '{file_path}' at byte "
+            f"{session['start_offset']}/{file_size}",
+            file=sys.stderr,
+        )
+        try:
+            return _transfer_and_finish(
+                url, access_token, file_path, session, published, description, state
+            )
+        except FacebookPostError as exc:
+            # Sessions expire; fall back to a fresh upload once.
+            print(
+                f"[resume] Saved session rejected ({exc.error}); restarting upload.",
+                file=sys.stderr,
+            )
+            state.discard("sessions", file_path)
+
     # --- Phase 1: Start --------------------------------------------------
     start_response = request_with_retry(
         "POST",
@@ -246,19 +328,81 @@ def _upload_video_resumable(
     )
     start_data = _raise_for_api_error(start_response, context="Resumable upload start")
     upload_session_id = start_data.get("upload_session_id")
-    start_offset = int(start_data.get("start_offset", 0))
-    end_offset = int(start_data.get("end_offset", file_size))
 
     if not upload_session_id:
-        output_error("No upload_session_id returned", error_code="upload_error")
+        raise FacebookPostError("No upload_session_id returned", error_code="upload_error")
+
+    session = {
+        "upload_session_id": upload_session_id,
+        "file_size": file_size,
+        "start_offset": int(start_data.get("start_offset", 0)),
+        "end_offset": int(start_data.get("end_offset", file_size)),
+    }
+    state.set_in("sessions", file_path, session)
+    return _transfer_and_finish(
+        url, access_token, file_path, session, published, description, state
+    )
+
+
+def _emit_progress(
+    file_path: str,
+    offset: int,
+    file_size: int,
+    chunk_bytes: int,
+    chunk_seconds: float,
+    total_bytes: int,
+    total_seconds: float,
+) -> None:
+    """Print one JSON progress line for a resumable upload to stderr."""
+    print(json.dumps({
+        "event": "upload_progress",
+        "platform": "facebook",
+        "file": Path(file_path).name,
+        "bytes_uploaded": offset,
+        "file_size": file_size,
+        "percent": round(100 * offset / file_size, 1) if file_size else 100.0,
+        "chunk_bytes": chunk_bytes,
+        "chunk_seconds": round(chunk_seconds, 3),
+        "chunk_mbps": round(chunk_bytes * 8 / 1e6 / chunk_seconds, 2) if chunk_seconds else None,
+        "average_mbps": round(total_bytes * 8 / 1e6 / total_seconds, 2) if total_seconds else None,
+    }), file=sys.stderr)
+
+
+def _transfer_and_finish(
+    url: str,
+    access_token: str,
+    file_path: str,
+    session: dict,
+    published: bool,
+    description: str,
+    state: UploadState,
+) -> str:
+    """Run the transfer and finish phases of a resumable upload session."""
+    file_size = session["file_size"]
+    file_name = Path(file_path).name
+    upload_session_id = session["upload_session_id"]
+    start_offset = session["start_offset"]
+    end_offset = session["end_offset"]
 
     # --- Phase 2: Transfer -----------------------------------------------
-    with open(file_path, "rb") as f:
+    # The server names the next byte range only in its reply to the current
+    # transfer, so exactly one chunk can be in flight. To keep the link busy
+    # the following chunk (predicted to be the same size, directly after
+    # this one) is read from disk while the current one uploads.
+    bytes_at_start = start_offset
+    transfer_started = time.monotonic()
+    with open(file_path, "rb") as f, ThreadPoolExecutor(max_workers=1) as reader:
+        def read_range(offset: int, length: int) -> bytes:
+            return os.pread(f.fileno(), length, offset)
+
+        chunk = read_range(start_offset, end_offset - start_offset)
         while start_offset < file_size:
-            chunk_size = end_offset - start_offset
-            f.seek(start_offset)
-            chunk = f.read(chunk_size)
+            predicted = (end_offset, end_offset - start_offset)
+            prefetch = None
+            if predicted[0] < file_size:
+                prefetch = reader.submit(read_range, *predicted)
 
+            chunk_started = time.monotonic()
             transfer_response = request_with_retry(
                 "POST",
                 url,
@@ -269,12 +413,31 @@ def _upload_video_resumable(
                     "start_offset": str(start_offset),
                 },
                 files={"video_file_chunk": (file_name, chunk)},
+                limit_kind="transfer",
             )
             transfer_data = _raise_for_api_error(
                 transfer_response, context="Resumable upload transfer"
             )
+            sent = len(chunk)
             start_offset = int(transfer_data.get("start_offset", file_size))
             end_offset = int(transfer_data.get("end_offset", file_size))
+            state.set_in("sessions", file_path, {
+                **session, "start_offset": start_offset, "end_offset": end_offset,
+            })
+            _emit_progress(
+                file_path, start_offset, file_size, sent,
+                time.monotonic() - chunk_started,
+                start_offset - bytes_at_start,
+                time.monotonic() - transfer_started,
+            )
+
+            if start_offset >= file_size:
+                break
+            length = end_offset - start_offset
+            if prefetch is not None and predicted[0] == start_offset and length <= predicted[1]:
+                chunk = prefetch.result()[:length]
+            else:
+                chunk = read_range(start_offset, length)
 
     # --- Phase 3: Finish -------------------------------------------------
     finish_fields: dict = {
@@ -291,7 +454,8 @@ def _upload_video_resumable(
 
     video_id = finish_data.get("id")
     if not video_id:
-        output_error("No video id returned after resumable upload", error_code="upload_error")
+        raise FacebookPostError("No video id returned after resumable upload", error_code="upload_error")
+    state.discard("sessions", file_path)
     return video_id
 
 
@@ -301,7 +465,7 @@ def _upload_video_resumable(
 
 def post_single_image(
     page_id: str, access_token: str, file_path: str, caption: str
-) -> None:
+) -> dict:
     """Publish a single-image post."""
     url = f"{GRAPH_API_BASE}/{page_id}/photos"
     with open(file_path, "rb") as f:
@@ -316,16 +480,20 @@ def post_single_image(
         )
     data = _raise_for_api_error(response, context="Publishing single image")
     post_id = data.get("post_id") or data.get("id", "")
-    output_success(post_id, "single_image")
+    return success_result(post_id, "single_image")
 
 
 def post_carousel(
-    page_id: str, access_token: str, file_paths: list[str], caption: str
-) -> None:
+    page_id: str,
+    access_token: str,
+    file_paths: list[str],
+    caption: str,
+    state: UploadState | None = None,
+) -> dict:
     """Publish a multi-image carousel post."""
     media_ids = []
     for path in file_paths:
-        fbid = upload_image_unpublished(page_id, access_token, path)
+        fbid = upload_image_unpublished(page_id, access_token, path, state)
         media_ids.append(fbid)
 
     url = f"{GRAPH_API_BASE}/{page_id}/feed"
@@ -339,17 +507,22 @@ def post_carousel(
     response = request_with_retry("POST", url, data=data)
     result = _raise_for_api_error(response, context="Publishing carousel")
     post_id = result.get("id", "")
-    output_success(post_id, "carousel")
+    return success_result(post_id, "carousel")
 
 
 def post_single_video(
-    page_id: str, access_token: str, file_path: str, caption: str
-) -> None:
+    page_id: str,
+    access_token: str,
+    file_path: str,
+    caption: str,
+    state: UploadState | None = None,
+) -> dict:
     """Publish a single-video post."""
     video_id = upload_video(
-        page_id, access_token, file_path, published=True, description=caption
+        page_id, access_token, file_path, published=True, description=caption,
+        state=state,
     )
-    output_success(video_id, "video")
+    return success_result(video_id, "video")
 
 
 def post_mixed_media(
@@ -357,7 +530,8 @@ def post_mixed_media(
     access_token: str,
     media_files: list[dict],
     caption: str,
-) -> None:
+    state: UploadState | None = None,
+) -> dict:
     """Publish a mixed-media post (images + videos) attached to a feed post.
 
     Each entry in *media_files* is ``{"path": str, "type": "image"|"video"}``.
@@ -365,11 +539,11 @@ def post_mixed_media(
     media_ids = []
     for item in media_files:
         if item["type"] == "image":
-            fbid = upload_image_unpublished(page_id, access_token, item["path"])
+            fbid = upload_image_unpublished(page_id, access_token, item["path"], state)
             media_ids.append(fbid)
         else:
             vid = upload_video(
-                page_id, access_token, item["path"], published=False
+                page_id, access_token, item["path"], published=False, state=state
             )
             media_ids.append(vid)
 
@@ -384,58 +558,65 @@ def post_mixed_media(
     response = request_with_retry("POST", url, data=data)
     result = _raise_for_api_error(response, context="Publishing mixed media")
     post_id = result.get("id", "")
-    output_success(post_id, "mixed")
+    return success_result(post_id, "mixed")
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Library API
 # ---------------------------------------------------------------------------
 
-def main() -> None:
-    parser = argparse.ArgumentParser(
-        description="Post content to a Facebook Page via the Meta Graph API."
-    )
-    parser.add_argument(
-        "--media",
-        nargs="+",
-        required=False,
-        help="Path(s) to media files (.jpg, .jpeg, .png, .mp4, .mov).",
-    )
-    parser.add_argument(
-        "--caption",
-        required=True,
-        help="Text caption / message for the post.",
-    )
-    args = parser.parse_args()
-
-    # --- Load environment -------------------------------------------------
+def load_config() -> dict:
+    """Load credentials from .env / the environment."""
     load_dotenv()
+    return {
+        "access_token": os.getenv("META_ACCESS_TOKEN"),
+        "page_id": os.getenv("FACEBOOK_PAGE_ID"),
+    }
+
 
-    access_token = os.getenv("META_ACCESS_TOKEN")
-    page_id = os.getenv("FACEBOOK_PAGE_ID")
+def publish(
+    media_paths: list[str],
+    caption: str,
+    config: dict | None = None,
+    state: UploadState | None = None,
+) -> dict:
+    """Publish a post and return the result dict the CLI would print.
+
+    *config* is the dict returned by ``load_config()``; pass it in to reuse
+    already-loaded credentials across calls. *state* is an optional upload
+    checkpoint (see upload_state.py): a retry with the same state resumes
+    interrupted uploads and returns the saved result if the post was already
+    published. Never raises for API or validation failures -- they are
+    reported via ``success: False``.
+    """
+    if config is None:
+        config = load_config()
+    state = state or UploadState(None)
+    if state.get("result"):
+        return state.get("result")
+    access_token = config.get("access_token")
+    page_id = config.get("page_id")
 
     if not access_token:
-        output_error(
+        return error_result(
             "META_ACCESS_TOKEN is not set. Add it to your .env file.",
             error_code="missing_env",
         )
     if not page_id:
-        output_error(
+        return error_result(
             "FACEBOOK_PAGE_ID is not set. Add it to your .env file.",
             error_code="missing_env",
         )
 
-    media_paths: list[str] = args.media or []
-
     # --- Validate files ---------------------------------------------------
     media_items: list[dict] = []
     for path in media_paths:
         if not os.path.isfile(path):
-            output_error(f"File not found: {path}", error_code="file_not_found")
+            return error_result(f"File not found: {path}", error_code="file_not_found")
         try:
             media_type = classify_media(path)
         except ValueError as exc:
-            output_error(str(exc), error_code="unsupported_media")
+            return error_result(str(exc), error_code="unsupported_media")
         media_items.append({"path": path, "type": media_type})
 
     images = [m for m in media_items if m["type"] == "image"]
@@ -449,40 +630,82 @@ def main() -> None:
             response = request_with_retry(
                 "POST",
                 url,
-                data={"message": args.caption, "access_token": access_token},
+                data={"message": caption, "access_token": access_token},
             )
             data = _raise_for_api_error(response, context="Publishing text post")
-            output_success(data.get("id", ""), "text")
+            result = success_result(data.get("id", ""), "text")
 
         elif len(images) == 1 and len(videos) == 0:
-            post_single_image(page_id, access_token, images[0]["path"], args.caption)
+            result = post_single_image(page_id, access_token, images[0]["path"], caption)
 
         elif len(images) >= 2 and len(videos) == 0:
-            post_carousel(
-                page_id, access_token, [m["path"] for m in images], args.caption
+            result = post_carousel(
+                page_id, access_token, [m["path"] for m in images], caption, state
             )
 
         elif len(videos) == 1 and len(images) == 0:
-            post_single_video(page_id, access_token, videos[0]["path"], args.caption)
+            result = post_single_video(
+                page_id, access_token, videos[0]["path"], caption, state
+            )
 
         elif images and videos:
-            post_mixed_media(page_id, access_token, media_items, args.caption)
+            result = post_mixed_media(page_id, access_token, media_items, caption, state)
 
         elif len(videos) >= 2 and len(images) == 0:
             # Multiple videos, no images -- treat as mixed media
-            post_mixed_media(page_id, access_token, media_items, args.caption)
+            result = post_mixed_media(page_id, access_token, media_items, caption, state)
 
         else:
-            output_error("Unable to determine post type from provided media.", error_code="invalid_media")
+            return error_result("Unable to determine post type from provided media.", error_code="invalid_media")
 
+        state.set(result=result)
+        return result
+
+    except FacebookPostError as exc:
+        return error_result(exc.error, error_code=exc.error_code)
     except requests.exceptions.ConnectionError as exc:
-        output_error(f"Connection error: {exc}", error_code="connection_error")
+        return error_result(f"Connection error: {exc}", error_code="connection_error")
     except requests.exceptions.Timeout as exc:
-        output_error(f"Request timed out: {exc}", error_code="timeout")
+        return error_result(f"Request timed out: {exc}", error_code="timeout")
     except requests.exceptions.RequestException as exc:
-        output_error(f"HTTP error: {exc}", error_code="request_error")
+        return error_result(f"HTTP error: {exc}", error_code="request_error")
     except Exception as exc:
-        output_error(f"Unexpected error: {exc}", error_code="unknown_error")
+        return error_result(f"Unexpected error: {exc}", error_code="unknown_error")
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Post content to a Facebook Page via the Meta Graph API."
+    )
+    parser.add_argument(
+        "--media",
+        nargs="+",
+        required=False,
+        help="Path(s) to media files (.jpg, .jpeg, .png, .mp4, .mov).",
+    )
+    parser.add_argument(
+        "--caption",
+        required=True,
+        help="Text caption / message for the post.",
+    )
+    parser.add_argument(
+        "--state-key",
+        default=None,
+        help=(
+            "Checkpoint key (normally the scheduler's post id). Retries with "
+            "the same key resume interrupted uploads instead of restarting."
+        ),
+    )
+    args = parser.parse_args()
+
+    state = open_state(args.state_key, "facebook")
+    result = publish(args.media or [], args.caption, load_config(), state)
+    print(json.dumps(result))
+    sys.exit(0 if result["success"] else 1)
 
 
 if __name__ == "__main__":
@@ -10,6 +10,10 @@ Environment variables (loaded from .env):
     META_ACCESS_TOKEN              - Long-lived access token for the Meta API.
     INSTAGRAM_BUSINESS_ACCOUNT_ID  - The Instagram Business or Creator account ID.
     FACEBOOK_PAGE_ID               - The Facebook Page ID linked to the Instagram account.
+
+Library usage (returns the same result dict the CLI prints):
+    import post_instagram
+    result = post_instagram.publish(["photo.jpg"], "Caption")
 """
 
 import argparse
@@ -18,11 +22,17 @@ import mimetypes
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import requests
 from dotenv import load_dotenv
 
+import polling
+import rate_limit
+from http_session import get_session
+from upload_state import UploadState, open_state
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
@@ -32,29 +42,41 @@ GRAPH_API_BASE = f"https://graph.facebook.com/{GRAPH_API_VERSION}"
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
 VIDEO_EXTENSIONS = {".mp4", ".mov"}
 
-POLL_INTERVAL_SECONDS = 5
-POLL_TIMEOUT_SECONDS = 300  # 5 minutes
+POLL_TIMEOUT_SECONDS = 300  # 5 minutes (check intervals: see polling.py)
 
 MAX_RETRIES = 3
 BACKOFF_BASE_SECONDS = 2
 
 CAROUSEL_MIN_ITEMS = 2
 CAROUSEL_MAX_ITEMS = 10
+# Carousel child containers created at the same time.
+CAROUSEL_CREATE_WORKERS = 5
 
 
 # ---------------------------------------------------------------------------
 # Helpers – HTTP with retry logic
 # ---------------------------------------------------------------------------
 
-def _request_with_retry(method: str, url: str, **kwargs) -> requests.Response:
+def _request_with_retry(
+    method: str, url: str, limit_kind: str = "api", **kwargs
+) -> requests.Response:
     """Execute an HTTP request with exponential-backoff retry on rate limits.
 
     Retries up to MAX_RETRIES times when the server responds with 429
     (Too Many Requests) or a transient 5xx error.  The back-off doubles
-    with each attempt.
+    with each attempt.  Every attempt is first paced by the shared rate
+    limiter (see rate_limit.py), which also learns from the usage headers
+    on the response.  *limit_kind* selects the limiter's fallback budget,
+    e.g. ``"poll"`` for status and detail reads.
     """
+    account = rate_limit.account_for(url, kwargs)
     for attempt in range(1, MAX_RETRIES + 1):
-        response = requests.request(method, url, timeout=300, **kwargs)
+        rate_limit.acquire("instagram", account, limit_kind)
+        response = get_session().request(method, url, timeout=300, **kwargs)
+        rate_limit.observe(
+            "instagram", account, response.headers, response.status_code,
+            kind=limit_kind,
+        )
 
         if response.status_code == 429 or response.status_code >= 500:
             if attempt == MAX_RETRIES:
@@ -65,7 +87,11 @@ def _request_with_retry(method: str, url: str, **kwargs) -> requests.Response:
                 f"{response.status_code}. Retrying in {wait}s …",
                 file=sys.stderr,
             )
-            time.sleep(wait)
+            if response.status_code == 429:
+                # The limiter holds off this and every other caller.
+                rate_limit.penalize("instagram", account, wait, limit_kind)
+            else:
+                time.sleep(wait)
             continue
 
         return response
@@ -149,6 +175,7 @@ def _upload_image_to_facebook(
         "GET",
         detail_url,
         params={"fields": "images", "access_token": access_token},
+        limit_kind="poll",
     )
     _raise_for_graph_error(detail_resp, "Facebook image detail fetch")
     images = detail_resp.json().get("images", [])
@@ -193,6 +220,7 @@ def _upload_video_to_facebook(
         "GET",
         detail_url,
         params={"fields": "source", "access_token": access_token},
+        limit_kind="poll",
     )
     _raise_for_graph_error(detail_resp, "Facebook video detail fetch")
     source = detail_resp.json().get("source")
@@ -207,11 +235,13 @@ def resolve_media_url(
     media_type: str,
     page_id: str,
     access_token: str,
+    state: UploadState | None = None,
 ) -> str:
     """Return a publicly accessible URL for the given media.
 
     If *path* is already an HTTP(S) URL it is returned as-is.  Otherwise the
-    local file is uploaded to Facebook and the resulting CDN URL is returned.
+    local file is uploaded to Facebook and the resulting CDN URL is returned
+    (and recorded in *state* so a retry does not upload it again).
     """
     if _is_url(path):
         return path
@@ -219,12 +249,19 @@ def resolve_media_url(
     if not os.path.isfile(path):
         raise FileNotFoundError(f"Local media file not found: {path}")
 
+    state = state or UploadState(None)
+    saved = state.section("media_urls").get(path)
+    if saved:
+        return saved
+
     if media_type == "image":
         print(f"[upload] Uploading local image to Facebook: {path}", file=sys.stderr)
-        return _upload_image_to_facebook(path, page_id, access_token)
-
-    print(f"[upload] Uploading local video to Facebook: {path}", file=sys.stderr)
-    return _upload_video_to_facebook(path, page_id, access_token)
+        url = _upload_image_to_facebook(path, page_id, access_token)
+    else:
+        print(f"[upload] Uploading local video to Facebook: {path}", file=sys.stderr)
+        url = _upload_video_to_facebook(path, page_id, access_token)
+    state.set_in("media_urls", path, url)
+    return url
 
 
 # ---------------------------------------------------------------------------
@@ -284,35 +321,66 @@ def _create_video_container(
     return container_id
 
 
-def _poll_container_status(container_id: str, access_token: str) -> None:
-    """Poll an Instagram media container until its status is FINISHED.
+def _poll_containers(
+    container_ids: list[str], access_token: str, media_bytes: int | None = None
+) -> None:
+    """Poll several media containers together until all are FINISHED.
 
-    Raises ``RuntimeError`` on timeout or if the container enters an ERROR
+    Each round is a single Graph API request (``?ids=a,b,c``) covering every
+    container still processing, so waiting on N videos costs no more
+    requests than waiting on one and ends when the slowest finishes. Check
+    intervals adapt to the expected processing time for *media_bytes* (the
+    largest video's size, when known); see polling.py. Raises
+    ``RuntimeError`` on timeout or as soon as any container enters an ERROR
     state.
     """
-    url = f"{GRAPH_API_BASE}/{container_id}"
-    params = {"fields": "status_code", "access_token": access_token}
-    deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+    pending = list(dict.fromkeys(container_ids))
 
-    while time.monotonic() < deadline:
-        resp = _request_with_retry("GET", url, params=params)
+    def check() -> bool | None:
+        params = {
+            "ids": ",".join(pending),
+            "fields": "status_code",
+            "access_token": access_token,
+        }
+        resp = _request_with_retry(
+            "GET", f"{GRAPH_API_BASE}/", params=params, limit_kind="poll"
+        )
         _raise_for_graph_error(resp, "Poll container status")
-        status = resp.json().get("status_code", "UNKNOWN")
-        print(f"[poll] Container {container_id} status: {status}", file=sys.stderr)
-
-        if status == "FINISHED":
-            return
-        if status == "ERROR":
-            raise RuntimeError(
-                f"Container {container_id} entered ERROR state: {resp.json()}"
-            )
+        statuses = resp.json()
+
+        for container_id in list(pending):
+            info = statuses.get(container_id) or {}
+            status = info.get("status_code", "UNKNOWN")
+            print(f"[poll] Container {container_id} status: {status}", file=sys.stderr)
+            if status == "ERROR":
+                raise RuntimeError(
+                    f"Container {container_id} entered ERROR state: {info}"
+                )
+            if status == "FINISHED":
+                pending.remove(container_id)
+        return True if not pending else None
 
-        time.sleep(POLL_INTERVAL_SECONDS)
+    try:
+        polling.poll(
+            check, "instagram", "video", media_bytes=media_bytes,
+            timeout=POLL_TIMEOUT_SECONDS, label="container processing",
+        )
+    except polling.PollTimeout:
+        raise RuntimeError(
+            f"Timed out after {POLL_TIMEOUT_SECONDS}s waiting for container(s) "
+            f"{', '.join(pending)} to finish processing."
+        )
 
-    raise RuntimeError(
-        f"Timed out after {POLL_TIMEOUT_SECONDS}s waiting for container "
-        f"{container_id} to finish processing."
-    )
+
+def _poll_container_status(
+    container_id: str, access_token: str, media_bytes: int | None = None
+) -> None:
+    """Poll an Instagram media container until its status is FINISHED.
+
+    Raises ``RuntimeError`` on timeout or if the container enters an ERROR
+    state.
+    """
+    _poll_containers([container_id], access_token, media_bytes)
 
 
 def _publish_container(
@@ -338,12 +406,17 @@ def post_single_image(
     image_url: str,
     caption: str,
     access_token: str,
+    state: UploadState | None = None,
 ) -> dict:
     """Post a single image to Instagram."""
-    container_id = _create_image_container(
-        ig_user_id, image_url, caption, access_token
-    )
-    print(f"[info] Image container created: {container_id}", file=sys.stderr)
+    state = state or UploadState(None)
+    container_id = state.section("containers").get("main")
+    if not container_id:
+        container_id = _create_image_container(
+            ig_user_id, image_url, caption, access_token
+        )
+        state.set_in("containers", "main", container_id)
+        print(f"[info] Image container created: {container_id}", file=sys.stderr)
 
     post_id = _publish_container(ig_user_id, container_id, access_token)
     return {
@@ -360,14 +433,23 @@ def post_reel(
     video_url: str,
     caption: str,
     access_token: str,
+    state: UploadState | None = None,
+    media_bytes: int | None = None,
 ) -> dict:
-    """Post a single video as an Instagram Reel."""
-    container_id = _create_video_container(
-        ig_user_id, video_url, caption, access_token
-    )
-    print(f"[info] Reel container created: {container_id}", file=sys.stderr)
+    """Post a single video as an Instagram Reel.
 
-    _poll_container_status(container_id, access_token)
+    *media_bytes* is the video's size, used to estimate processing time.
+    """
+    state = state or UploadState(None)
+    container_id = state.section("containers").get("main")
+    if not container_id:
+        container_id = _create_video_container(
+            ig_user_id, video_url, caption, access_token
+        )
+        state.set_in("containers", "main", container_id)
+        print(f"[info] Reel container created: {container_id}", file=sys.stderr)
+
+    _poll_container_status(container_id, access_token, media_bytes)
 
     post_id = _publish_container(ig_user_id, container_id, access_token)
     return {
@@ -384,15 +466,23 @@ def post_carousel(
     media_items: list[tuple[str, str]],
     caption: str,
     access_token: str,
+    state: UploadState | None = None,
+    media_bytes: int | None = None,
 ) -> dict:
     """Post a carousel of images and/or videos to Instagram.
 
     *media_items* is a list of ``(public_url, media_type)`` tuples where
-    *media_type* is ``'image'`` or ``'video'``.
+    *media_type* is ``'image'`` or ``'video'``. Child and carousel container
+    IDs are recorded in *state* and reused on retry. *media_bytes* is the
+    size of the largest video, used to estimate processing time.
     """
-    child_ids: list[str] = []
+    state = state or UploadState(None)
+    saved = state.section("containers")
 
-    for public_url, media_type in media_items:
+    def create_child(index: int, public_url: str, media_type: str) -> str:
+        key = f"child_{index}"
+        if saved.get(key):
+            return saved[key]
         if media_type == "image":
             cid = _create_image_container(
                 ig_user_id, public_url, None, access_token, is_carousel_item=True
@@ -401,32 +491,52 @@ def post_carousel(
             cid = _create_video_container(
                 ig_user_id, public_url, None, access_token, is_carousel_item=True
             )
+        state.set_in("containers", key, cid)
         print(
             f"[info] Carousel child container created: {cid} ({media_type})",
             file=sys.stderr,
         )
-
-        # Videos need to finish processing before the carousel is assembled.
-        if media_type == "video":
-            _poll_container_status(cid, access_token)
-
-        child_ids.append(cid)
+        return cid
+
+    # Create every child at once. Each one is checkpointed as soon as it
+    # exists, so if one fails the others are reused on retry.
+    workers = min(CAROUSEL_CREATE_WORKERS, len(media_items))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(create_child, index, public_url, media_type)
+            for index, (public_url, media_type) in enumerate(media_items)
+        ]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        raise errors[0]
+    child_ids = [f.result() for f in futures]
+
+    # Videos need to finish processing before the carousel is assembled;
+    # they process in parallel on Instagram's side, so wait on all at once.
+    video_ids = [
+        cid for cid, (_, media_type) in zip(child_ids, media_items)
+        if media_type == "video"
+    ]
+    if video_ids:
+        _poll_containers(video_ids, access_token, media_bytes)
 
     # Create the carousel container.
-    url = f"{GRAPH_API_BASE}/{ig_user_id}/media"
-    payload = {
-        "media_type": "CAROUSEL",
-        "caption": caption,
-        "children": ",".join(child_ids),
-        "access_token": access_token,
-    }
-    resp = _request_with_retry("POST", url, data=payload)
-    _raise_for_graph_error(resp, "Create carousel container")
-    carousel_id = resp.json().get("id")
+    carousel_id = saved.get("carousel")
     if not carousel_id:
-        raise RuntimeError(f"No carousel container ID returned: {resp.json()}")
-
-    print(f"[info] Carousel container created: {carousel_id}", file=sys.stderr)
+        url = f"{GRAPH_API_BASE}/{ig_user_id}/media"
+        payload = {
+            "media_type": "CAROUSEL",
+            "caption": caption,
+            "children": ",".join(child_ids),
+            "access_token": access_token,
+        }
+        resp = _request_with_retry("POST", url, data=payload)
+        _raise_for_graph_error(resp, "Create carousel container")
+        carousel_id = resp.json().get("id")
+        if not carousel_id:
+            raise RuntimeError(f"No carousel container ID returned: {resp.json()}")
+        state.set_in("containers", "carousel", carousel_id)
+        print(f"[info] Carousel container created: {carousel_id}", file=sys.stderr)
 
     post_id = _publish_container(ig_user_id, carousel_id, access_token)
     return {
@@ -440,40 +550,52 @@ def post_carousel(
 
 
 # ---------------------------------------------------------------------------
-# CLI
+# Library API
 # ---------------------------------------------------------------------------
 
-def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
-    parser = argparse.ArgumentParser(
-        description="Post content to Instagram via the Meta Graph API."
-    )
-    parser.add_argument(
-        "--media",
-        nargs="+",
-        required=True,
-        help=(
-            "One or more media file paths or public URLs. "
-            "Supported extensions: .jpg, .jpeg, .png (image), .mp4, .mov (video). "
-            "Provide 2-10 items for a carousel."
-        ),
-    )
-    parser.add_argument(
-        "--caption",
-        required=True,
-        help="Caption / text for the Instagram post.",
-    )
-    return parser.parse_args(argv)
+def load_config() -> dict:
+    """Load credentials from .env / the environment."""
+    load_dotenv()
+    return {
+        "access_token": os.getenv("META_ACCESS_TOKEN"),
+        "ig_user_id": os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID"),
+        "page_id": os.getenv("FACEBOOK_PAGE_ID"),
+    }
 
 
-def main(argv: list[str] | None = None) -> None:
-    load_dotenv()
+def _failure(error: str) -> dict:
+    return {
+        "success": False,
+        "platform": "instagram",
+        "error": error,
+    }
 
-    args = parse_args(argv)
+
+def publish(
+    media_paths: list[str],
+    caption: str,
+    config: dict | None = None,
+    state: UploadState | None = None,
+) -> dict:
+    """Publish a post and return the result dict the CLI would print.
+
+    *config* is the dict returned by ``load_config()``; pass it in to reuse
+    already-loaded credentials across calls. *state* is an optional upload
+    checkpoint (see upload_state.py): a retry with the same state reuses
+    uploaded media and created containers, and returns the saved result if
+    the post was already published. Failures are reported via
+    ``success: False`` rather than raised.
+    """
+    if config is None:
+        config = load_config()
+    state = state or UploadState(None)
+    if state.get("result"):
+        return state.get("result")
 
     # ---- Validate environment variables --------------------------------
-    access_token = os.getenv("META_ACCESS_TOKEN")
-    ig_user_id = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID")
-    page_id = os.getenv("FACEBOOK_PAGE_ID")
+    access_token = config.get("access_token")
+    ig_user_id = config.get("ig_user_id")
+    page_id = config.get("page_id")
 
     missing: list[str] = []
     if not access_token:
@@ -483,86 +605,109 @@ def main(argv: list[str] | None = None) -> None:
     if not page_id:
         missing.append("FACEBOOK_PAGE_ID")
     if missing:
-        result = {
-            "success": False,
-            "platform": "instagram",
-            "error": f"Missing environment variables: {', '.join(missing)}",
-        }
-        print(json.dumps(result, indent=2))
-        sys.exit(1)
+        return _failure(f"Missing environment variables: {', '.join(missing)}")
 
     # Type narrowing after validation.
     assert access_token is not None
     assert ig_user_id is not None
     assert page_id is not None
 
-    media_paths: list[str] = args.media
-    caption: str = args.caption
-
     # ---- Classify & validate media -------------------------------------
     try:
         media_types = [classify_media(m) for m in media_paths]
     except ValueError as exc:
-        result = {
-            "success": False,
-            "platform": "instagram",
-            "error": str(exc),
-        }
-        print(json.dumps(result, indent=2))
-        sys.exit(1)
+        return _failure(str(exc))
+
+    if not media_paths:
+        return _failure("At least one media file or URL is required.")
 
     if len(media_paths) > 1 and (
         len(media_paths) < CAROUSEL_MIN_ITEMS
         or len(media_paths) > CAROUSEL_MAX_ITEMS
     ):
-        result = {
-            "success": False,
-            "platform": "instagram",
-            "error": (
-                f"Carousel requires {CAROUSEL_MIN_ITEMS}-{CAROUSEL_MAX_ITEMS} "
-                f"items, got {len(media_paths)}."
-            ),
-        }
-        print(json.dumps(result, indent=2))
-        sys.exit(1)
+        return _failure(
+            f"Carousel requires {CAROUSEL_MIN_ITEMS}-{CAROUSEL_MAX_ITEMS} "
+            f"items, got {len(media_paths)}."
+        )
 
     # ---- Resolve publicly accessible URLs ------------------------------
     try:
         public_urls = [
-            resolve_media_url(path, mtype, page_id, access_token)
+            resolve_media_url(path, mtype, page_id, access_token, state)
             for path, mtype in zip(media_paths, media_types)
         ]
-    except (FileNotFoundError, RuntimeError) as exc:
-        result = {
-            "success": False,
-            "platform": "instagram",
-            "error": f"Media upload failed: {exc}",
-        }
-        print(json.dumps(result, indent=2))
-        sys.exit(1)
+    except (FileNotFoundError, RuntimeError, requests.exceptions.RequestException) as exc:
+        return _failure(f"Media upload failed: {exc}")
 
     # ---- Dispatch to the appropriate workflow --------------------------
+    # Sizes of local videos let the status polling estimate processing time.
+    video_sizes = [
+        os.path.getsize(path) for path, mtype in zip(media_paths, media_types)
+        if mtype == "video" and os.path.isfile(path)
+    ]
+    media_bytes = max(video_sizes) if video_sizes else None
     try:
         if len(public_urls) == 1 and media_types[0] == "image":
             result = post_single_image(
-                ig_user_id, public_urls[0], caption, access_token
+                ig_user_id, public_urls[0], caption, access_token, state
             )
         elif len(public_urls) == 1 and media_types[0] == "video":
-            result = post_reel(ig_user_id, public_urls[0], caption, access_token)
+            result = post_reel(
+                ig_user_id, public_urls[0], caption, access_token, state, media_bytes
+            )
         else:
             items = list(zip(public_urls, media_types))
-            result = post_carousel(ig_user_id, items, caption, access_token)
-    except RuntimeError as exc:
-        result = {
-            "success": False,
-            "platform": "instagram",
-            "error": str(exc),
-        }
-        print(json.dumps(result, indent=2))
-        sys.exit(1)
+            result = post_carousel(
+                ig_user_id, items, caption, access_token, state, media_bytes
+            )
+    except (RuntimeError, requests.exceptions.RequestException) as exc:
+        return _failure(str(exc))
+
+    state.set(result=result)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Post content to Instagram via the Meta Graph API."
+    )
+    parser.add_argument(
+        "--media",
+        nargs="+",
+        required=True,
+        help=(
+            "One or more media file paths or public URLs. "
+            "Supported extensions: .jpg, .jpeg, .png (image), .mp4, .mov (video). "
+            "Provide 2-10 items for a carousel."
+        ),
+    )
+    parser.add_argument(
+        "--caption",
+        required=True,
+        help="Caption / text for the Instagram post.",
+    )
+    parser.add_argument(
+        "--state-key",
+        default=None,
+        help=(
+            "Checkpoint key (normally the scheduler's post id). Retries with "
+            "the same key resume interrupted uploads instead of restarting."
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
 
+    state = open_state(args.state_key, "instagram")
+    result = publish(args.media, args.caption, load_config(), state)
     print(json.dumps(result, indent=2))
-    sys.exit(0)
+    sys.exit(0 if result["success"] else 1)
 
 
 if __name__ == "__main__":
@@ -3,11 +3,16 @@
 
 Supports single video uploads (FILE_UPLOAD) and multi-image photo posts (PULL).
 Mixed media (images + videos) in a single post is not supported by TikTok.
+
+Library usage (returns the same result dict the CLI prints):
+    import post_tiktok
+    result = post_tiktok.publish(["clip.mp4"], "Caption", privacy="SELF_ONLY")
 """
 
 import argparse
+import fcntl
 import json
-import math
+import mmap
 import os
 import sys
 import time
@@ -16,6 +21,11 @@ from pathlib import Path
 import requests
 from dotenv import load_dotenv
 
+import polling
+import rate_limit
+from http_session import get_session
+from upload_state import UploadState, open_state
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
@@ -29,9 +39,21 @@ STATUS_URL = f"{TIKTOK_API_BASE}/post/publish/status/fetch/"
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 VIDEO_EXTENSIONS = {".mp4", ".mov", ".webm"}
 
-CHUNK_SIZE = 10 * 1024 * 1024  # 10 MB
-POLL_INTERVAL_SECONDS = 5
-POLL_TIMEOUT_SECONDS = 10 * 60  # 10 minutes
+SCRIPT_DIR = Path(__file__).resolve().parent
+UPLOAD_STATS_FILE = SCRIPT_DIR.parent / "assets" / "upload_stats.json"
+
+# FILE_UPLOAD chunking rules: chunks are 5-64 MB, the last chunk absorbs the
+# remainder (up to 128 MB), at most 1000 chunks, and files under 5 MB go up
+# as a single chunk. Within that range the chunk size is chosen so one chunk
+# takes about TARGET_CHUNK_SECONDS at the throughput measured on previous
+# uploads; DEFAULT_CHUNK_SIZE is used until there is a measurement.
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_CHUNK_COUNT = 1000
+DEFAULT_CHUNK_SIZE = 10 * 1024 * 1024  # 10 MB
+TARGET_CHUNK_SECONDS = 10
+THROUGHPUT_SMOOTHING = 0.3  # weight of the newest upload in the running average
+POLL_TIMEOUT_SECONDS = 10 * 60  # 10 minutes (check intervals: see polling.py)
 
 MAX_RETRIES = 3
 BACKOFF_BASE_SECONDS = 2
@@ -63,24 +85,32 @@ def classify_media(paths: list[str]) -> tuple[list[str], list[str]]:
     return images, videos
 
 
+class TikTokPostError(Exception):
+    """Raised when a post cannot be published; ``extra`` is merged into the payload."""
+
+    def __init__(self, message: str, **extra) -> None:
+        super().__init__(message)
+        self.message = message
+        self.extra = extra
+
+    def payload(self) -> dict:
+        return {"success": False, "platform": "tiktok", "error": self.message, **self.extra}
+
+
 def fail(message: str, **extra) -> None:
-    """Print a JSON error payload and exit with code 1."""
-    payload = {"success": False, "platform": "tiktok", "error": message, **extra}
-    print(json.dumps(payload, indent=2))
-    sys.exit(1)
+    """Abort the current post with a JSON-serialisable error payload."""
+    raise TikTokPostError(message, **extra)
 
 
-def success(publish_id: str, post_type: str, **extra) -> None:
-    """Print a JSON success payload and exit with code 0."""
-    payload = {
+def success(publish_id: str, post_type: str, **extra) -> dict:
+    """Build the JSON success payload."""
+    return {
         "success": True,
         "platform": "tiktok",
         "publish_id": publish_id,
         "post_type": post_type,
         **extra,
     }
-    print(json.dumps(payload, indent=2))
-    sys.exit(0)
 
 
 def auth_headers(access_token: str) -> dict:
@@ -91,11 +121,30 @@ def auth_headers(access_token: str) -> dict:
 
 
 def request_with_retry(method: str, url: str, retries: int = MAX_RETRIES, **kwargs):
-    """Execute an HTTP request with exponential-backoff retry on transient errors."""
+    """Execute an HTTP request with exponential-backoff retry on transient errors.
+
+    Calls to the TikTok API take a token from the shared rate limiter (see
+    rate_limit.py) first; status fetches use their own "status" budget so
+    polling never delays a publish. Chunk uploads to the returned upload_url
+    are not rate limited.
+    A streaming ``data`` body (FileRange) is rewound before each attempt.
+    """
     last_exc = None
+    limited = url.startswith(TIKTOK_API_BASE)
+    limit_kind = "status" if url == STATUS_URL else "api"
+    account = rate_limit.account_for(url, kwargs)
+    body = kwargs.get("data")
     for attempt in range(retries):
         try:
-            resp = requests.request(method, url, timeout=60, **kwargs)
+            if isinstance(body, FileRange):
+                body.rewind()
+            if limited:
+                rate_limit.acquire("tiktok", account, limit_kind)
+            resp = get_session().request(method, url, timeout=60, **kwargs)
+            if limited:
+                rate_limit.observe(
+                    "tiktok", account, resp.headers, resp.status_code, kind=limit_kind
+                )
             if resp.status_code in (429, 500, 502, 503, 504):
                 raise requests.exceptions.HTTPError(
                     f"Transient HTTP {resp.status_code}", response=resp
@@ -114,23 +163,168 @@ def request_with_retry(method: str, url: str, retries: int = MAX_RETRIES, **kwar
                     f"Retrying in {wait}s ...",
                     file=sys.stderr,
                 )
-                time.sleep(wait)
+                response = getattr(exc, "response", None)
+                if limited and response is not None and response.status_code == 429:
+                    rate_limit.penalize("tiktok", account, wait, limit_kind)
+                else:
+                    time.sleep(wait)
     raise last_exc  # type: ignore[misc]
 
 
+# ---------------------------------------------------------------------------
+# Chunk planning and streaming
+# ---------------------------------------------------------------------------
+
+
+class FileRange:
+    """Read-only, file-like view of ``[offset, offset + length)`` of an mmap.
+
+    ``read()`` returns memoryview slices of the mapping, so chunk bytes go
+    from the page cache to the socket without an intermediate copy and only
+    the block being sent is materialised. ``__len__`` lets requests send a
+    Content-Length instead of chunked encoding.
+    """
+
+    def __init__(self, view: memoryview, offset: int, length: int) -> None:
+        self._view = view
+        self._start = offset
+        self._end = offset + length
+        self._pos = offset
+
+    def __len__(self) -> int:
+        return self._end - self._pos
+
+    def read(self, size: int = -1) -> memoryview:
+        if size is None or size < 0:
+            size = self._end - self._pos
+        end = min(self._end, self._pos + size)
+        block = self._view[self._pos:end]
+        self._pos = end
+        return block
+
+    def rewind(self) -> None:
+        self._pos = self._start
+
+
+def plan_chunks(video_size: int, bytes_per_second: float | None = None) -> tuple[int, int]:
+    """Return ``(chunk_size, total_chunk_count)`` within TikTok's limits."""
+    if video_size < MIN_CHUNK_SIZE:
+        return video_size, 1
+
+    if bytes_per_second:
+        chunk_size = int(bytes_per_second * TARGET_CHUNK_SECONDS)
+    else:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    # Stay under the chunk-count cap, then clamp to the allowed range.
+    chunk_size = max(chunk_size, -(-video_size // MAX_CHUNK_COUNT))
+    chunk_size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, chunk_size, video_size))
+    # The remainder rides on the last chunk, so the count rounds down.
+    return chunk_size, max(1, video_size // chunk_size)
+
+
+def chunk_bounds(
+    chunk_idx: int, chunk_size: int, total_chunks: int, video_size: int
+) -> tuple[int, int]:
+    """Return the ``[start, end)`` byte range of one chunk."""
+    start = chunk_idx * chunk_size
+    end = video_size if chunk_idx == total_chunks - 1 else start + chunk_size
+    return start, end
+
+
+def load_throughput() -> float | None:
+    """Return the smoothed upload throughput (bytes/s) from earlier uploads."""
+    try:
+        return json.loads(UPLOAD_STATS_FILE.read_text())["tiktok"]["bytes_per_second"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def record_throughput(bytes_sent: int, seconds: float) -> None:
+    """Fold one upload's measured throughput into the stats file."""
+    if bytes_sent <= 0 or seconds <= 0:
+        return
+    sample = bytes_sent / seconds
+    try:
+        UPLOAD_STATS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(UPLOAD_STATS_FILE.with_suffix(".lock"), "w") as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            try:
+                stats = json.loads(UPLOAD_STATS_FILE.read_text())
+            except (OSError, ValueError):
+                stats = {}
+            entry = stats.get("tiktok") or {}
+            previous = entry.get("bytes_per_second")
+            smoothed = sample if not previous else (
+                THROUGHPUT_SMOOTHING * sample + (1 - THROUGHPUT_SMOOTHING) * previous
+            )
+            stats["tiktok"] = {
+                "bytes_per_second": smoothed,
+                "samples": entry.get("samples", 0) + 1,
+            }
+            tmp_path = UPLOAD_STATS_FILE.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(stats, indent=2) + "\n")
+            os.replace(tmp_path, UPLOAD_STATS_FILE)
+    except OSError as exc:
+        print(f"[upload] Could not record throughput: {exc}", file=sys.stderr)
+
+
 # ---------------------------------------------------------------------------
 # Video upload (FILE_UPLOAD)
 # ---------------------------------------------------------------------------
 
 
-def post_video(video_path: str, caption: str, privacy: str, access_token: str) -> None:
-    """Upload a single video via FILE_UPLOAD and poll until published."""
+def post_video(
+    video_path: str,
+    caption: str,
+    privacy: str,
+    access_token: str,
+    state: UploadState | None = None,
+) -> dict:
+    """Upload a single video via FILE_UPLOAD and poll until published.
+
+    The publish id, upload URL and next chunk index are checkpointed in
+    *state*; a retry skips the chunks TikTok already acknowledged, or goes
+    straight to polling if the upload had finished.
+    """
+    state = state or UploadState(None)
     path = Path(video_path)
     if not path.is_file():
         fail(f"Video file not found: {video_path}")
 
     video_size = path.stat().st_size
-    total_chunks = math.ceil(video_size / CHUNK_SIZE)
+    if video_size == 0:
+        fail(f"Video file is empty: {video_path}")
+
+    saved = state.get("video") or {}
+    if saved.get("video_size") == video_size and saved.get("publish_id"):
+        if saved.get("uploaded"):
+            return poll_publish_status(
+                saved["publish_id"], "video", access_token, video_size
+            )
+        print(
+            f"[resume] Resuming upload at chunk {saved['next_chunk'] + 1}/"
+            f"{saved['total_chunks']}.",
+            file=sys.stderr,
+        )
+        try:
+            _upload_chunks(path, saved, video_size, state)
+        except TikTokPostError as exc:
+            # Upload URLs expire after about an hour; start over once.
+            print(
+                f"[resume] Saved upload rejected ({exc.message}); restarting.",
+                file=sys.stderr,
+            )
+            state.discard("video")
+        else:
+            return poll_publish_status(
+                saved["publish_id"], "video", access_token, video_size
+            )
+
+    chunk_size, total_chunks = plan_chunks(video_size, load_throughput())
+    print(
+        f"[upload] {video_size} bytes in {total_chunks} chunk(s) of {chunk_size} bytes.",
+        file=sys.stderr,
+    )
 
     # Step 1 -- Initialise the upload
     init_body = {
@@ -141,7 +335,7 @@ def post_video(video_path: str, caption: str, privacy: str, access_token: str) -
         "source_info": {
             "source": "FILE_UPLOAD",
             "video_size": video_size,
-            "chunk_size": CHUNK_SIZE,
+            "chunk_size": chunk_size,
             "total_chunk_count": total_chunks,
         },
     }
@@ -167,39 +361,80 @@ def post_video(video_path: str, caption: str, privacy: str, access_token: str) -
     if not upload_url:
         fail("Video init response did not include an upload_url.", api_response=data)
 
+    upload = {
+        "publish_id": publish_id,
+        "upload_url": upload_url,
+        "video_size": video_size,
+        "chunk_size": chunk_size,
+        "total_chunks": total_chunks,
+        "next_chunk": 0,
+    }
+    state.set(video=upload)
+
     # Step 2 -- Upload video in chunks
-    with open(path, "rb") as fh:
-        for chunk_idx in range(total_chunks):
-            chunk_data = fh.read(CHUNK_SIZE)
-            chunk_start = chunk_idx * CHUNK_SIZE
-            chunk_end = chunk_start + len(chunk_data) - 1
-            content_range = f"bytes {chunk_start}-{chunk_end}/{video_size}"
-
-            upload_headers = {
-                "Content-Type": "video/mp4",
-                "Content-Range": content_range,
-            }
+    _upload_chunks(path, upload, video_size, state)
 
-            upload_resp = request_with_retry(
-                "PUT",
-                upload_url,
-                headers=upload_headers,
-                data=chunk_data,
-            )
+    # Step 3 -- Poll for publish status
+    return poll_publish_status(publish_id, "video", access_token, video_size)
 
-            if upload_resp.status_code not in (200, 201, 206):
-                fail(
-                    f"Chunk {chunk_idx + 1}/{total_chunks} upload failed "
-                    f"(HTTP {upload_resp.status_code}): {upload_resp.text}",
+
+def _upload_chunks(path: Path, upload: dict, video_size: int, state: UploadState) -> None:
+    """PUT the remaining chunks of *upload*, checkpointing after each one.
+
+    Chunks are streamed from a read-only mmap of the file, so memory use
+    stays at a socket buffer or so per upload regardless of chunk size.
+    """
+    chunk_size = upload["chunk_size"]
+    total_chunks = upload["total_chunks"]
+    upload_url = upload["upload_url"]
+    bytes_sent = 0
+    started = time.monotonic()
+
+    with open(path, "rb") as fh:
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        try:
+            for chunk_idx in range(upload["next_chunk"], total_chunks):
+                chunk_start, chunk_end = chunk_bounds(
+                    chunk_idx, chunk_size, total_chunks, video_size
+                )
+                content_range = f"bytes {chunk_start}-{chunk_end - 1}/{video_size}"
+
+                upload_headers = {
+                    "Content-Type": "video/mp4",
+                    "Content-Range": content_range,
+                }
+
+                upload_resp = request_with_retry(
+                    "PUT",
+                    upload_url,
+                    headers=upload_headers,
+                    data=FileRange(view, chunk_start, chunk_end - chunk_start),
                 )
 
-            print(
-                f"[upload] Chunk {chunk_idx + 1}/{total_chunks} uploaded.",
-                file=sys.stderr,
-            )
+                if upload_resp.status_code not in (200, 201, 206):
+                    fail(
+                        f"Chunk {chunk_idx + 1}/{total_chunks} upload failed "
+                        f"(HTTP {upload_resp.status_code}): {upload_resp.text}",
+                    )
 
-    # Step 3 -- Poll for publish status
-    poll_publish_status(publish_id, "video", access_token)
+                bytes_sent += chunk_end - chunk_start
+                state.set(video={**upload, "next_chunk": chunk_idx + 1})
+                print(
+                    f"[upload] Chunk {chunk_idx + 1}/{total_chunks} uploaded.",
+                    file=sys.stderr,
+                )
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a block is still referenced; the mapping closes when it is freed
+
+    record_throughput(bytes_sent, time.monotonic() - started)
+    state.set(video={**upload, "next_chunk": total_chunks, "uploaded": True})
 
 
 # ---------------------------------------------------------------------------
@@ -207,8 +442,18 @@ def post_video(video_path: str, caption: str, privacy: str, access_token: str) -
 # ---------------------------------------------------------------------------
 
 
-def post_photos(image_urls: list[str], caption: str, privacy: str, access_token: str) -> None:
+def post_photos(
+    image_urls: list[str],
+    caption: str,
+    privacy: str,
+    access_token: str,
+    state: UploadState | None = None,
+) -> dict:
     """Create a photo post using public image URLs (PULL source)."""
+    state = state or UploadState(None)
+    if state.get("photo_publish_id"):
+        return poll_publish_status(state.get("photo_publish_id"), "photo", access_token)
+
     # Validate that all paths look like URLs
     for url in image_urls:
         if not url.startswith(("http://", "https://")):
@@ -248,9 +493,11 @@ def post_photos(image_urls: list[str], caption: str, privacy: str, access_token:
         )
 
     publish_id = data.get("data", {}).get("publish_id", "")
+    if publish_id:
+        state.set(photo_publish_id=publish_id)
 
     # Poll for publish status
-    poll_publish_status(publish_id, "photo", access_token)
+    return poll_publish_status(publish_id, "photo", access_token)
 
 
 # ---------------------------------------------------------------------------
@@ -258,15 +505,22 @@ def post_photos(image_urls: list[str], caption: str, privacy: str, access_token:
 # ---------------------------------------------------------------------------
 
 
-def poll_publish_status(publish_id: str, post_type: str, access_token: str) -> None:
-    """Poll the TikTok publish status endpoint until complete or timeout."""
+def poll_publish_status(
+    publish_id: str, post_type: str, access_token: str, media_bytes: int | None = None
+) -> dict:
+    """Poll the TikTok publish status endpoint until complete or timeout.
+
+    Check intervals adapt to the processing time expected for *media_bytes*
+    (see polling.py).
+    """
     if not publish_id:
         fail("No publish_id returned from the API -- cannot poll status.")
 
-    deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+    status = "UNKNOWN"
     print(f"[poll] Waiting for publish to complete (id={publish_id}) ...", file=sys.stderr)
 
-    while time.monotonic() < deadline:
+    def check() -> dict | None:
+        nonlocal status
         resp = request_with_retry(
             "POST",
             STATUS_URL,
@@ -282,7 +536,7 @@ def poll_publish_status(publish_id: str, post_type: str, access_token: str) -> N
         print(f"[poll] Status: {status}", file=sys.stderr)
 
         if status == "PUBLISH_COMPLETE":
-            success(publish_id, post_type)
+            return success(publish_id, post_type)
 
         if status.startswith("FAILED") or status == "PUBLISH_FAILED":
             fail(
@@ -290,13 +544,94 @@ def poll_publish_status(publish_id: str, post_type: str, access_token: str) -> N
                 publish_id=publish_id,
                 api_response=data,
             )
+        return None
 
-        time.sleep(POLL_INTERVAL_SECONDS)
+    try:
+        return polling.poll(
+            check, "tiktok", post_type, media_bytes=media_bytes,
+            timeout=POLL_TIMEOUT_SECONDS, label="publish",
+        )
+    except polling.PollTimeout:
+        fail(
+            f"Publish timed out after {POLL_TIMEOUT_SECONDS}s (last status: {status}).",
+            publish_id=publish_id,
+        )
 
-    fail(
-        f"Publish timed out after {POLL_TIMEOUT_SECONDS}s (last status: {status}).",
-        publish_id=publish_id,
-    )
+
+# ---------------------------------------------------------------------------
+# Library API
+# ---------------------------------------------------------------------------
+
+
+def load_config() -> dict:
+    """Load credentials from .env / the environment."""
+    load_dotenv()
+    return {
+        "access_token": os.getenv("TIKTOK_ACCESS_TOKEN"),
+        "client_key": os.getenv("TIKTOK_CLIENT_KEY"),
+    }
+
+
+def publish(
+    media_paths: list[str],
+    caption: str,
+    privacy: str = "SELF_ONLY",
+    config: dict | None = None,
+    state: UploadState | None = None,
+) -> dict:
+    """Publish a post and return the result dict the CLI would print.
+
+    *config* is the dict returned by ``load_config()``; pass it in to reuse
+    already-loaded credentials across calls. *state* is an optional upload
+    checkpoint (see upload_state.py) that lets a retry resume an interrupted
+    upload. Failures are reported via ``success: False`` rather than raised.
+    """
+    if config is None:
+        config = load_config()
+    state = state or UploadState(None)
+    if state.get("result"):
+        return state.get("result")
+
+    try:
+        access_token = config.get("access_token")
+        client_key = config.get("client_key")
+
+        if not access_token:
+            fail("TIKTOK_ACCESS_TOKEN is not set. Add it to your .env file.")
+        if not client_key:
+            fail("TIKTOK_CLIENT_KEY is not set. Add it to your .env file.")
+
+        images, videos = classify_media(media_paths)
+
+        # --- Mixed media: not supported ------------------------------------
+        if images and videos:
+            fail(
+                "TikTok does not support mixing images and videos in a single post. "
+                "Please split them into separate posts (one video post and one photo post)."
+            )
+
+        # --- Single video post ---------------------------------------------
+        if videos:
+            if len(videos) > 1:
+                fail(
+                    "TikTok only supports uploading one video per post. "
+                    "Please provide a single video file."
+                )
+            result = post_video(videos[0], caption, privacy, access_token, state)
+
+        # --- Photo post ----------------------------------------------------
+        elif images:
+            result = post_photos(images, caption, privacy, access_token, state)
+
+        else:
+            fail("No media provided.")
+    except TikTokPostError as exc:
+        return exc.payload()
+    except requests.exceptions.RequestException as exc:
+        return TikTokPostError(f"HTTP error: {exc}").payload()
+
+    state.set(result=result)
+    return result
 
 
 # ---------------------------------------------------------------------------
@@ -325,43 +660,24 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         choices=PRIVACY_CHOICES,
         help="Privacy level (default: SELF_ONLY).",
     )
+    parser.add_argument(
+        "--state-key",
+        default=None,
+        help=(
+            "Checkpoint key (normally the scheduler's post id). Retries with "
+            "the same key resume interrupted uploads instead of restarting."
+        ),
+    )
     return parser.parse_args(argv)
 
 
 def main(argv: list[str] | None = None) -> None:
-    load_dotenv()
-
     args = parse_args(argv)
 
-    access_token = os.getenv("TIKTOK_ACCESS_TOKEN")
-    client_key = os.getenv("TIKTOK_CLIENT_KEY")
-
-    if not access_token:
-        fail("TIKTOK_ACCESS_TOKEN is not set. Add it to your .env file.")
-    if not client_key:
-        fail("TIKTOK_CLIENT_KEY is not set. Add it to your .env file.")
-
-    images, videos = classify_media(args.media)
-
-    # --- Mixed media: not supported ----------------------------------------
-    if images and videos:
-        fail(
-            "TikTok does not support mixing images and videos in a single post. "
-            "Please split them into separate posts (one video post and one photo post)."
-        )
-
-    # --- Single video post --------------------------------------------------
-    if videos:
-        if len(videos) > 1:
-            fail(
-                "TikTok only supports uploading one video per post. "
-                "Please provide a single video file."
-            )
-        post_video(videos[0], args.caption, args.privacy, access_token)
-
-    # --- Photo post ---------------------------------------------------------
-    if images:
-        post_photos(images, args.caption, args.privacy, access_token)
+    state = open_state(args.state_key, "tiktok")
+    result = publish(args.media, args.caption, args.privacy, load_config(), state)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["success"] else 1)
 
 
 if __name__ == "__main__":
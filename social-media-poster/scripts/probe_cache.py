@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of media probe results for validate_media.py.
+
+Probing a video means an ffprobe subprocess and probing an image means
+opening it, and the same files are revalidated by schedule_post.py, manual
+runs and every day of generate_daily_schedule.py. Results (dimensions,
+duration, codec, bitrate, fps) are stored in a small SQLite database keyed
+by the file's (device, inode, size, mtime), so an unchanged file is never
+probed twice, a renamed file keeps its entry, and the hardlinked copies in
+assets/scheduled_media/ share one entry. Any change to the file's size or
+mtime makes the old entry miss.
+
+The cache is bounded: once it holds more than PROBE_CACHE_MAX_ENTRIES rows,
+the least recently used tenth is evicted.
+
+Environment variables:
+    PROBE_CACHE_DB           Database path (default assets/probe_cache.db).
+    PROBE_CACHE_MAX_ENTRIES  Maximum number of cached files (default 5000).
+
+Usage:
+    python probe_cache.py --stats
+    python probe_cache.py --clear
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+ASSETS_DIR = PROJECT_ROOT / "assets"
+CACHE_DB = Path(os.environ.get("PROBE_CACHE_DB", ASSETS_DIR / "probe_cache.db"))
+MAX_ENTRIES = int(os.environ.get("PROBE_CACHE_MAX_ENTRIES", "5000"))
+
+# Bump when the shape of cached probe results changes.
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    data TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used);
+"""
+
+
+class ProbeCache:
+    """SQLite-backed probe results, safe to share between threads."""
+
+    def __init__(self, path=CACHE_DB, max_entries=MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(filepath):
+        st = os.stat(filepath)
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def get(self, filepath):
+        """Return the cached probe dict for *filepath*, or None on a miss."""
+        try:
+            dev, ino, size, mtime_ns = self._key(filepath)
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, version, data FROM probes "
+                "WHERE dev = ? AND ino = ?",
+                (dev, ino),
+            ).fetchone()
+            if row is None or tuple(row[:3]) != (size, mtime_ns, SCHEMA_VERSION):
+                return None
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE probes SET last_used = ? WHERE dev = ? AND ino = ?",
+                    (time.time(), dev, ino),
+                )
+            return json.loads(row[3])
+        except (OSError, sqlite3.Error, ValueError):
+            return None
+
+    def put(self, filepath, probe):
+        """Store *probe* for *filepath*; failures are ignored."""
+        try:
+            dev, ino, size, mtime_ns = self._key(filepath)
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO probes "
+                    "(dev, ino, size, mtime_ns, version, path, data, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (dev, ino, size, mtime_ns, SCHEMA_VERSION,
+                     os.path.abspath(filepath), json.dumps(probe), time.time()),
+                )
+                self._evict()
+        except (OSError, sqlite3.Error):
+            pass
+
+    def _evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - self.max_entries + self.max_entries // 10
+        self.conn.execute(
+            "DELETE FROM probes WHERE rowid IN "
+            "(SELECT rowid FROM probes ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+
+    def stats(self):
+        count, oldest = self.conn.execute(
+            "SELECT COUNT(*), MIN(last_used) FROM probes"
+        ).fetchone()
+        return {
+            "path": str(self.path),
+            "entries": count,
+            "max_entries": self.max_entries,
+            "oldest_use": oldest,
+        }
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM probes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the media probe cache.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stats", action="store_true", help="Print cache size.")
+    group.add_argument("--clear", action="store_true", help="Delete every cached probe.")
+    args = parser.parse_args(argv)
+
+    cache = ProbeCache()
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+Storage backends for the social-media-poster scheduling queue.
+
+Two interchangeable backends are provided:
+
+    json    A JSON snapshot (assets/schedule_queue.json) plus an append-only
+            journal (assets/schedule_queue.journal). Each change is one
+            fsync'd journal line; the journal is periodically compacted
+            into the snapshot via temp-file + rename. Fine for small installs.
+    sqlite  An indexed SQLite database (assets/schedule_queue.db) in WAL mode.
+            Due posts are selected via an index on (status, scheduled_at) and
+            every change is a single-row statement.
+
+The backend is chosen with the SCHEDULE_QUEUE_BACKEND environment variable.
+When it is unset, SQLite is used if the database already exists and JSON
+otherwise. Run ``python queue_store.py --migrate`` (or
+``run_scheduler.py --migrate-queue``) to move an existing JSON queue into
+SQLite once.
+"""
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# ---------------------------------------------------------------------------
+# Paths
+# ---------------------------------------------------------------------------
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+ASSETS_DIR = PROJECT_ROOT / "assets"
+QUEUE_FILE = ASSETS_DIR / "schedule_queue.json"
+QUEUE_DB = ASSETS_DIR / "schedule_queue.db"
+NOTIFY_SOCKET = ASSETS_DIR / ".scheduler.sock"
+
+BACKEND_ENV_VAR = "SCHEDULE_QUEUE_BACKEND"
+BACKENDS = ("json", "sqlite")
+
+ACTIVE_STATUSES = ("pending", "posting")
+FINISHED_STATUSES = ("completed", "partial", "failed", "cancelled")
+UTC_KEY_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# The JSON backend folds its journal into the snapshot past this size.
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+def parse_scheduled_at(post):
+    """Parse a post's scheduled_at field into a UTC-aware datetime."""
+    raw = post.get("scheduled_at", "")
+    try:
+        dt = datetime.fromisoformat(raw)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc)
+    except (ValueError, TypeError):
+        return None
+
+
+def _utc_key(post):
+    """Return the post's scheduled time as a fixed-width UTC string, or None.
+
+    The fixed width keeps lexical order identical to chronological order so
+    the value can be compared inside SQLite.
+    """
+    dt = parse_scheduled_at(post)
+    return dt.strftime(UTC_KEY_FORMAT) if dt is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Backend interface
+# ---------------------------------------------------------------------------
+
+
+class QueueStore:
+    """Common interface implemented by every queue backend.
+
+    Posts are plain dicts with the schema documented in
+    references/scheduling.md. Methods that return posts return copies; call
+    ``update`` to persist changes.
+    """
+
+    name = "base"
+
+    def exists(self):
+        """Return True if the queue has been created on disk."""
+        raise NotImplementedError
+
+    def all_posts(self):
+        """Return every post in insertion order."""
+        raise NotImplementedError
+
+    def get(self, post_id):
+        """Return the post with *post_id*, or None."""
+        raise NotImplementedError
+
+    def due_posts(self, now):
+        """Return pending posts scheduled at or before *now* (UTC datetime)."""
+        raise NotImplementedError
+
+    def active_posts(self):
+        """Return posts whose status is pending or posting."""
+        raise NotImplementedError
+
+    def finished_posts(self):
+        """Return completed/partial/failed/cancelled posts."""
+        raise NotImplementedError
+
+    def add(self, post):
+        """Append a new post to the queue.
+
+        A post whose ID is already queued replaces the existing entry in
+        place, on every backend.
+        """
+        raise NotImplementedError
+
+    def add_many(self, posts):
+        """Append several new posts in a single write/transaction (see add)."""
+        raise NotImplementedError
+
+    def update(self, posts):
+        """Persist changes to one or more existing posts."""
+        raise NotImplementedError
+
+    def remove(self, post_ids):
+        """Delete the posts with the given IDs."""
+        raise NotImplementedError
+
+    def change_token(self):
+        """Return a value that changes whenever another process writes."""
+        raise NotImplementedError
+
+    def recover(self):
+        """Bring the on-disk state up to date after a possible crash."""
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+# ---------------------------------------------------------------------------
+# JSON backend
+# ---------------------------------------------------------------------------
+
+
+class JsonQueueStore(QueueStore):
+    """JSON snapshot plus an append-only, fsync'd journal of changes.
+
+    Reads load the snapshot and replay the journal on top of it. Writes
+    append one JSON line per change under an exclusive flock, so a status
+    transition costs one small fsync instead of a full rewrite. Once the
+    journal grows past JOURNAL_COMPACT_BYTES it is folded into a new
+    snapshot written to a temp file and renamed into place, so a crash at
+    any point leaves either the old or the new snapshot intact. Journal
+    operations are idempotent, so replaying a journal that was already
+    compacted is harmless.
+    """
+
+    name = "json"
+
+    def __init__(self, path=QUEUE_FILE):
+        self.path = Path(path)
+        self.lock_path = self.path.with_suffix(".lock")
+        self.journal_path = self.path.with_suffix(".journal")
+
+    # -- Snapshot + journal ------------------------------------------------
+
+    def _read(self):
+        if self.path.exists():
+            with open(self.path, "r") as fh:
+                queue_data = json.load(fh)
+        else:
+            queue_data = {"version": 1, "posts": []}
+        self._replay(queue_data)
+        return queue_data
+
+    def _replay(self, queue_data):
+        """Apply every complete journal record to *queue_data* in place."""
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, "r") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write from a crash; later records are intact.
+                    continue
+                _apply_record(queue_data, record)
+
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_fh = open(self.lock_path, "w")
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        return lock_fh
+
+    def _append(self, record):
+        """Durably append *record* to the journal, compacting when large."""
+        lock_fh = self._locked()
+        try:
+            with open(self.journal_path, "ab") as fh:
+                if fh.tell() > 0 and not _ends_with_newline(self.journal_path):
+                    fh.write(b"\n")
+                fh.write(json.dumps(record).encode() + b"\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+                size = fh.tell()
+            if size >= JOURNAL_COMPACT_BYTES:
+                self._compact_locked()
+        finally:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+            lock_fh.close()
+
+    def _compact_locked(self):
+        """Write the replayed state as a new snapshot and empty the journal."""
+        queue_data = self._read()
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as fh:
+            fh.write(json.dumps(queue_data, indent=2) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+        _fsync_dir(self.path.parent)
+        if self.journal_path.exists():
+            with open(self.journal_path, "w") as fh:
+                os.fsync(fh.fileno())
+
+    def compact(self):
+        """Fold the journal into the snapshot now."""
+        lock_fh = self._locked()
+        try:
+            self._compact_locked()
+        finally:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+            lock_fh.close()
+
+    # -- QueueStore interface ----------------------------------------------
+
+    def exists(self):
+        return self.path.exists() or self.journal_path.exists()
+
+    def all_posts(self):
+        return self._read()["posts"]
+
+    def get(self, post_id):
+        for post in self.all_posts():
+            if post["id"] == post_id:
+                return post
+        return None
+
+    def due_posts(self, now):
+        due = []
+        for post in self.all_posts():
+            if post["status"] != "pending":
+                continue
+            scheduled_utc = parse_scheduled_at(post)
+            if scheduled_utc is None:
+                logging.warning(
+                    "Post %s has invalid scheduled_at; skipping.", post["id"]
+                )
+                continue
+            if scheduled_utc <= now:
+                due.append(post)
+        return due
+
+    def active_posts(self):
+        return [p for p in self.all_posts() if p["status"] in ACTIVE_STATUSES]
+
+    def finished_posts(self):
+        return [p for p in self.all_posts() if p["status"] in FINISHED_STATUSES]
+
+    def add(self, post):
+        self._append({"op": "add", "post": post})
+
+    def add_many(self, posts):
+        self._append({"op": "add_many", "posts": list(posts)})
+
+    def update(self, posts):
+        self._append({"op": "update", "posts": list(posts)})
+
+    def remove(self, post_ids):
+        self._append({"op": "remove", "ids": list(post_ids)})
+
+    def recover(self):
+        if self.exists():
+            self.compact()
+
+    def change_token(self):
+        token = []
+        for path in (self.path, self.journal_path):
+            try:
+                st = path.stat()
+                token.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                token.append(None)
+        return tuple(token)
+
+
+def _apply_record(queue_data, record):
+    """Apply one journal record. Every operation is idempotent."""
+    posts = queue_data["posts"]
+    op = record.get("op")
+    if op in ("add", "add_many"):
+        added = record["posts"] if op == "add_many" else [record["post"]]
+        index_by_id = {p["id"]: idx for idx, p in enumerate(posts)}
+        for post in added:
+            if post["id"] in index_by_id:
+                posts[index_by_id[post["id"]]] = post
+            else:
+                index_by_id[post["id"]] = len(posts)
+                posts.append(post)
+    elif op == "update":
+        by_id = {p["id"]: p for p in record["posts"]}
+        queue_data["posts"] = [by_id.get(p["id"], p) for p in posts]
+    elif op == "remove":
+        doomed = set(record["ids"])
+        queue_data["posts"] = [p for p in posts if p["id"] not in doomed]
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as fh:
+        fh.seek(-1, os.SEEK_END)
+        return fh.read(1) == b"\n"
+
+
+def _fsync_dir(path):
+    """fsync a directory so a rename inside it is durable."""
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ---------------------------------------------------------------------------
+# SQLite backend
+# ---------------------------------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    seq           INTEGER PRIMARY KEY AUTOINCREMENT,
+    id            TEXT NOT NULL UNIQUE,
+    status        TEXT NOT NULL,
+    scheduled_utc TEXT,
+    data          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_status_scheduled
+    ON posts (status, scheduled_utc);
+"""
+
+# Adding an ID that is already queued replaces the post but keeps its seq,
+# matching the JSON backend, which replaces the entry in place.
+_UPSERT_SQL = (
+    "INSERT INTO posts (id, status, scheduled_utc, data) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET status = excluded.status, "
+    "scheduled_utc = excluded.scheduled_utc, data = excluded.data"
+)
+
+
+class SqliteQueueStore(QueueStore):
+    """SQLite queue in WAL mode, indexed on (status, scheduled_utc) and id.
+
+    The full post dict is stored as JSON in ``data``; ``status`` and
+    ``scheduled_utc`` are denormalized columns used for indexed lookups.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=QUEUE_DB):
+        self.path = Path(path)
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL makes every committed status transition durable.
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _select(self, where="", params=()):
+        rows = self.conn.execute(
+            f"SELECT data FROM posts {where} ORDER BY seq", params
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @staticmethod
+    def _row(post):
+        return (
+            post["status"],
+            _utc_key(post),
+            json.dumps(post),
+            post["id"],
+        )
+
+    def exists(self):
+        return self.path.exists()
+
+    def all_posts(self):
+        return self._select()
+
+    def get(self, post_id):
+        posts = self._select("WHERE id = ?", (post_id,))
+        return posts[0] if posts else None
+
+    def due_posts(self, now):
+        for row in self.conn.execute(
+            "SELECT id FROM posts "
+            "WHERE status = 'pending' AND scheduled_utc IS NULL"
+        ):
+            logging.warning("Post %s has invalid scheduled_at; skipping.", row[0])
+        return self._select(
+            "WHERE status = 'pending' AND scheduled_utc <= ?",
+            (now.astimezone(timezone.utc).strftime(UTC_KEY_FORMAT),),
+        )
+
+    def active_posts(self):
+        return self._select("WHERE status IN ('pending', 'posting')")
+
+    def finished_posts(self):
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        return self._select(
+            f"WHERE status IN ({placeholders})", FINISHED_STATUSES
+        )
+
+    def add(self, post):
+        status, scheduled_utc, data, post_id = self._row(post)
+        with self.conn:
+            self.conn.execute(
+                _UPSERT_SQL,
+                (post_id, status, scheduled_utc, data),
+            )
+
+    def add_many(self, posts):
+        with self.conn:
+            self.conn.executemany(
+                _UPSERT_SQL,
+                [(post_id, status, scheduled_utc, data)
+                 for status, scheduled_utc, data, post_id in map(self._row, posts)],
+            )
+
+    def update(self, posts):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE posts SET status = ?, scheduled_utc = ?, data = ? "
+                "WHERE id = ?",
+                [self._row(p) for p in posts],
+            )
+
+    def remove(self, post_ids):
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM posts WHERE id = ?", [(pid,) for pid in post_ids]
+            )
+
+    def change_token(self):
+        # data_version changes when any *other* connection commits.
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ---------------------------------------------------------------------------
+# Factory, change notification and migration
+# ---------------------------------------------------------------------------
+
+
+def notify_change(post_id=""):
+    """Wake a running ``run_scheduler.py --daemon`` (best effort).
+
+    Sends *post_id* as a datagram to the daemon's socket so it can reload
+    just that post. Does nothing when no daemon is listening.
+    """
+    if not NOTIFY_SOCKET.exists():
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(post_id.encode(), str(NOTIFY_SOCKET))
+    except OSError:
+        pass
+
+
+def open_store(backend=None):
+    """Return the configured queue backend.
+
+    *backend* overrides the SCHEDULE_QUEUE_BACKEND environment variable.
+    """
+    backend = backend or os.environ.get(BACKEND_ENV_VAR, "").strip().lower()
+    if not backend:
+        backend = "sqlite" if QUEUE_DB.exists() else "json"
+    if backend == "json":
+        return JsonQueueStore()
+    if backend == "sqlite":
+        return SqliteQueueStore()
+    raise ValueError(
+        f"Unknown queue backend '{backend}'. Choose one of: {', '.join(BACKENDS)}"
+    )
+
+
+def migrate_json_to_sqlite(json_path=QUEUE_FILE, db_path=QUEUE_DB):
+    """Copy every post from the JSON queue into SQLite.
+
+    Existing rows with the same ID are replaced, so the migration can be
+    re-run safely. On success the JSON file is renamed to
+    ``schedule_queue.json.migrated`` so that it is no longer picked up.
+    Returns the number of posts migrated.
+    """
+    source = JsonQueueStore(json_path)
+    if source.exists():
+        source.compact()
+    if not source.path.exists():
+        raise FileNotFoundError(f"Queue file not found: {json_path}")
+
+    posts = source.all_posts()
+    target = SqliteQueueStore(db_path)
+    try:
+        with target.conn:
+            for post in posts:
+                status, scheduled_utc, data, post_id = target._row(post)
+                target.conn.execute(
+                    "INSERT INTO posts (id, status, scheduled_utc, data) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET status = excluded.status, "
+                    "scheduled_utc = excluded.scheduled_utc, data = excluded.data",
+                    (post_id, status, scheduled_utc, data),
+                )
+    finally:
+        target.close()
+
+    Path(json_path).rename(Path(json_path).with_suffix(".json.migrated"))
+    source.journal_path.unlink(missing_ok=True)
+    return len(posts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Inspect or migrate the scheduling queue backend."
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="Move assets/schedule_queue.json into assets/schedule_queue.db.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.migrate:
+        try:
+            count = migrate_json_to_sqlite()
+        except (FileNotFoundError, json.JSONDecodeError, sqlite3.Error) as exc:
+            print(json.dumps({"success": False, "error": str(exc)}))
+            sys.exit(1)
+        print(json.dumps({"success": True, "migrated": count, "backend": "sqlite"}))
+        sys.exit(0)
+
+    store = open_store()
+    print(json.dumps({
+        "backend": store.name,
+        "exists": store.exists(),
+        "posts": len(store.all_posts()) if store.exists() else 0,
+    }))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
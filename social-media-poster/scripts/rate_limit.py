@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Per-platform, per-account API pacing shared across processes (stdlib only).
+
+Every API call made by the posting scripts first calls acquire() for its
+(platform, account) pair. State lives in a small JSON file guarded by an
+flock, so the scheduler's worker threads, --isolate subprocesses, manual
+runs and organic-social-poster all see the same quota picture. The same file
+ships in both skills' scripts/ directories and both default to the same
+state file (RATE_LIMIT_STATE_FILE overrides it).
+
+Facebook and Instagram calls made with one token share the token's Meta
+usage, since that is how Graph reports it; their fallback buckets stay
+separate.
+
+Pacing follows what the platform reports rather than a guessed budget:
+
+- Graph API ``X-App-Usage`` / ``X-Business-Use-Case-Usage`` (and the Threads
+  equivalents) report how much of the rolling quota is used. Below
+  THROTTLE_START_PCT calls go out immediately. Above it, calls for the
+  account are spaced out, up to MAX_THROTTLE_INTERVAL_SECONDS apart as usage
+  approaches 100%. At 100%, or when ``estimated_time_to_regain_access`` is
+  set, the account is blocked.
+- HTTP 429 and Graph rate-limit error codes block the call kind until
+  ``Retry-After`` (or the caller's backoff) has passed.
+- Until an account has reported usage within USAGE_FRESH_SECONDS (and
+  always for TikTok, which sends no usage headers), a fixed token bucket
+  per call kind is used instead. Kinds keep bulk traffic such as upload
+  chunk transfers and status polls out of the budget for publish calls.
+  Only "api" buckets are written to the state file; the others are kept
+  per process, and the file is only rewritten when something changed.
+
+Accounts are identified by a short hash of the access token, so tokens are
+never written to disk.
+
+Usage:
+    import rate_limit
+    account = rate_limit.account_for(url, kwargs)
+    rate_limit.acquire("facebook", account)              # kind="api"
+    rate_limit.acquire("facebook", account, "transfer")  # upload chunks
+    response = requests.request(...)
+    rate_limit.observe("facebook", account, response.headers, response.status_code)
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+STATE_FILE = Path(
+    os.environ.get("RATE_LIMIT_STATE_FILE", CACHE_DIR / "social-posting" / "rate_limit_state.json")
+)
+
+# Fallback token buckets per call kind: (capacity, tokens refilled per
+# second). They apply until an account reports usage, and always for TikTok.
+# "api" matches the documented limits for publish-type calls: about 200 Graph
+# calls per user per hour, and 6 per minute for TikTok's post endpoints.
+# Upload chunk transfers and status polls are cheap and frequent, so they
+# get their own larger budgets; TikTok's status fetch endpoint allows 30
+# requests per minute.
+DEFAULT_LIMITS = {
+    "facebook": {"api": (40, 200 / 3600), "transfer": (100, 2.0)},
+    "instagram": {"api": (40, 200 / 3600), "poll": (30, 0.5)},
+    "threads": {"api": (40, 200 / 3600)},
+    "tiktok": {"api": (6, 6 / 60), "status": (30, 30 / 60)},
+}
+FALLBACK_LIMIT = (10, 1.0)
+
+# Call kinds whose buckets are persisted; the rest stay in memory.
+PERSISTED_KINDS = {"api"}
+
+# Platforms whose calls count against one shared usage figure per token.
+USAGE_GROUPS = {"facebook": "meta", "instagram": "meta"}
+
+# Usage percentage at which calls start being spaced out, and the spacing
+# reached just below 100%.
+THROTTLE_START_PCT = 75
+MAX_THROTTLE_INTERVAL_SECONDS = 60
+
+# How long a usage report is trusted before falling back to the buckets,
+# and how often an unchanged report is re-saved to keep it fresh.
+USAGE_FRESH_SECONDS = 300
+USAGE_REFRESH_SECONDS = 30
+
+# How long to stop calling an account whose usage headers report >= 100%
+# without an explicit time to regain access.
+SATURATED_BLOCK_SECONDS = 60
+
+GRAPH_RATE_LIMIT_CODES = {4, 17, 32, 613, 80001, 80002, 80004}
+USAGE_HEADERS = (
+    "x-app-usage",
+    "x-business-use-case-usage",
+    "x-ad-account-usage",
+)
+
+
+def account_for(url, kwargs=None):
+    """Derive a stable, non-secret account key from a request.
+
+    Looks for the access token in ``params`` / ``data`` / the URL query
+    string, or a bearer token in the ``Authorization`` header.
+    """
+    kwargs = kwargs or {}
+    token = None
+    for field in ("params", "data"):
+        value = kwargs.get(field)
+        if isinstance(value, dict) and value.get("access_token"):
+            token = value["access_token"]
+            break
+    if token is None:
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        if query.get("access_token"):
+            token = query["access_token"][0]
+    if token is None:
+        headers = kwargs.get("headers") or {}
+        auth = headers.get("Authorization") or headers.get("authorization") or ""
+        if auth.lower().startswith("bearer "):
+            token = auth[7:]
+    if not token:
+        return "default"
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def parse_usage(headers):
+    """Return (max usage percent, seconds until access is regained) from headers.
+
+    The usage percent is None when no usage header is present.
+    """
+    usage_pct = None
+    regain_seconds = 0.0
+    lowered = {k.lower(): v for k, v in (headers or {}).items()}
+    for name in USAGE_HEADERS:
+        raw = lowered.get(name)
+        if not raw:
+            continue
+        try:
+            payload = json.loads(raw)
+        except (TypeError, ValueError):
+            continue
+        entries = []
+        if name == "x-business-use-case-usage" and isinstance(payload, dict):
+            for values in payload.values():
+                if isinstance(values, list):
+                    entries.extend(v for v in values if isinstance(v, dict))
+        elif isinstance(payload, dict):
+            entries.append(payload)
+        for entry in entries:
+            for key in ("call_count", "total_time", "total_cputime", "acc_id_util_pct"):
+                try:
+                    usage_pct = max(usage_pct or 0.0, float(entry.get(key) or 0))
+                except (TypeError, ValueError):
+                    pass
+            try:
+                minutes = float(entry.get("estimated_time_to_regain_access") or 0)
+                regain_seconds = max(regain_seconds, minutes * 60)
+            except (TypeError, ValueError):
+                pass
+    return usage_pct, regain_seconds
+
+
+def throttle_interval(usage_pct):
+    """Seconds between calls for an account at *usage_pct* (0 below the threshold)."""
+    if usage_pct < THROTTLE_START_PCT:
+        return 0.0
+    pressure = min(1.0, (usage_pct - THROTTLE_START_PCT) / (100 - THROTTLE_START_PCT))
+    return MAX_THROTTLE_INTERVAL_SECONDS * pressure
+
+
+def is_rate_limited(status_code, body=None):
+    """Return True for HTTP 429 or a Graph/TikTok rate-limit error body."""
+    if status_code == 429:
+        return True
+    if not isinstance(body, dict):
+        return False
+    error = body.get("error")
+    if isinstance(error, dict):
+        if error.get("code") in GRAPH_RATE_LIMIT_CODES:
+            return True
+        if error.get("code") in ("rate_limit_exceeded", "spam_risk_too_many_posts"):
+            return True
+    return False
+
+
+def _refill(bucket, limit, now):
+    capacity, rate = limit
+    elapsed = max(0.0, now - bucket["updated"])
+    bucket["tokens"] = min(capacity, bucket["tokens"] + elapsed * rate)
+    bucket["updated"] = now
+
+
+class RateLimiter:
+    """Usage-driven pacing persisted in *state_path* and shared via flock."""
+
+    def __init__(self, state_path=STATE_FILE, limits=None):
+        self.state_path = Path(state_path)
+        self.lock_path = self.state_path.with_suffix(".lock")
+        self.limits = {platform: dict(kinds) for platform, kinds in DEFAULT_LIMITS.items()}
+        for platform, kinds in (limits or {}).items():
+            self.limits.setdefault(platform, {}).update(kinds)
+        self._local_buckets = {}
+
+    # -- State file --------------------------------------------------------
+
+    def _locked(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        fh = open(self.lock_path, "w")
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        return fh
+
+    def _load(self):
+        try:
+            state = json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("accounts", {})
+        return state
+
+    def _save(self, state):
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, indent=2) + "\n")
+        os.replace(tmp_path, self.state_path)
+
+    def _update(self, platform, account, kind, fn):
+        """Run ``fn(entry, bucket, now, limit)`` under the lock.
+
+        *entry* is the usage record shared by the platform's usage group and
+        *account*; *bucket* is the fallback bucket for *kind* and *limit* its
+        (capacity, rate). Buckets are refilled by the caller (_refill) only
+        when they are used. The state file is rewritten only if it changed.
+        """
+        lock_fh = self._locked()
+        try:
+            state = self._load()
+            before = json.dumps(state, sort_keys=True)
+            now = time.time()
+            group = USAGE_GROUPS.get(platform, platform)
+            entry = state["accounts"].setdefault(f"{group}:{account}", {
+                "usage_pct": None,
+                "usage_at": 0,
+                "blocked_until": 0,
+                "next_call_at": 0,
+                "buckets": {},
+            })
+            limit = self.limits.get(platform, {}).get(kind, FALLBACK_LIMIT)
+            buckets = entry["buckets"]
+            if kind not in PERSISTED_KINDS:
+                buckets = self._local_buckets.setdefault(f"{group}:{account}", {})
+            bucket = buckets.setdefault(f"{platform}:{kind}", {
+                "tokens": limit[0],
+                "updated": now,
+                "blocked_until": 0,
+            })
+            result = fn(entry, bucket, now, limit)
+            if json.dumps(state, sort_keys=True) != before:
+                self._save(state)
+            return result
+        finally:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+            lock_fh.close()
+
+    # -- Public API --------------------------------------------------------
+
+    def acquire(self, platform, account="default", kind="api"):
+        """Block until a *kind* call to *account* may go out.
+
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+
+        def take(entry, bucket, now, limit):
+            blocked_until = max(entry["blocked_until"], bucket["blocked_until"])
+            if blocked_until > now:
+                return blocked_until - now
+            if entry["usage_pct"] is not None and now - entry["usage_at"] <= USAGE_FRESH_SECONDS:
+                if entry["next_call_at"] > now:
+                    return entry["next_call_at"] - now
+                interval = throttle_interval(entry["usage_pct"])
+                if interval:
+                    entry["next_call_at"] = now + interval
+                return 0.0
+            _refill(bucket, limit, now)
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                return 0.0
+            return (1 - bucket["tokens"]) / limit[1]
+
+        while True:
+            delay = self._update(platform, account, kind, take)
+            if delay <= 0:
+                return waited
+            print(
+                f"[rate-limit] {platform}: waiting {delay:.1f}s for quota",
+                file=sys.stderr,
+            )
+            time.sleep(delay)
+            waited += delay
+
+    def observe(self, platform, account, headers=None, status_code=None, body=None, kind="api"):
+        """Update the account from a response's usage headers and status."""
+        usage_pct, regain_seconds = parse_usage(headers)
+        retry_after = _retry_after(headers)
+
+        def adjust(entry, bucket, now, limit):
+            if usage_pct is not None:
+                if (
+                    usage_pct != entry["usage_pct"]
+                    or now - entry["usage_at"] >= USAGE_REFRESH_SECONDS
+                ):
+                    entry["usage_pct"] = usage_pct
+                    entry["usage_at"] = now
+                # Spacing follows the latest report, so it relaxes as usage drops.
+                relaxed = now + throttle_interval(usage_pct)
+                if relaxed < entry["next_call_at"]:
+                    entry["next_call_at"] = relaxed
+                block = regain_seconds
+                if usage_pct >= 100:
+                    block = max(block, SATURATED_BLOCK_SECONDS)
+                if block:
+                    entry["blocked_until"] = max(entry["blocked_until"], now + block)
+            if is_rate_limited(status_code, body):
+                # Once the block ends, let a single probe call through.
+                _refill(bucket, limit, now)
+                bucket["tokens"] = min(bucket["tokens"], 1)
+                if retry_after:
+                    bucket["blocked_until"] = max(bucket["blocked_until"], now + retry_after)
+
+        self._update(platform, account, kind, adjust)
+
+    def penalize(self, platform, account, seconds, kind="api"):
+        """Stop making *kind* calls to *account* for *seconds* (e.g. after a 429)."""
+        def block(entry, bucket, now, limit):
+            _refill(bucket, limit, now)
+            bucket["tokens"] = min(bucket["tokens"], 1)
+            bucket["blocked_until"] = max(bucket["blocked_until"], now + seconds)
+
+        self._update(platform, account, kind, block)
+
+
+def _retry_after(headers):
+    lowered = {k.lower(): v for k, v in (headers or {}).items()}
+    try:
+        return float(lowered.get("retry-after") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+_default = RateLimiter()
+
+
+def acquire(platform, account="default", kind="api"):
+    """Wait for permission to call; see RateLimiter.acquire."""
+    return _default.acquire(platform, account, kind)
+
+
+def observe(platform, account, headers=None, status_code=None, body=None, kind="api"):
+    """Feed a response into the shared limiter; see RateLimiter.observe."""
+    _default.observe(platform, account, headers, status_code, body, kind)
+
+
+def penalize(platform, account, seconds, kind="api"):
+    """Block an account in the shared limiter; see RateLimiter.penalize."""
+    _default.penalize(platform, account, seconds, kind)
@@ -2,35 +2,58 @@
 """
 Process the social-media-poster scheduling queue.
 
-Designed to be executed by cron on a recurring interval (e.g. every 5 minutes).
-Supports four modes of operation:
+Designed to be executed by cron on a recurring interval (e.g. every 5 minutes),
+or to run continuously with --daemon. Supports these modes of operation:
 
     --run       Process all posts whose scheduled time has passed.
+    --daemon    Stay resident and post each entry at its scheduled minute.
     --list      Display pending/posting posts in a human-readable table.
     --cancel    Cancel a specific post by its ID.
     --cleanup   Remove completed/failed/cancelled posts older than 7 days.
+
+The queue itself lives in a pluggable backend (see queue_store.py): the
+original JSON file or an indexed SQLite database. Use --migrate-queue to move
+an existing JSON queue into SQLite.
 """
 
 import argparse
 import fcntl
+import heapq
+import importlib
 import json
 import logging
 import os
-import shutil
+import queue
+import select
+import signal
+import socket
+import sqlite3
 import subprocess
 import sys
-import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from media_store import release_post
+from queue_store import (
+    NOTIFY_SOCKET,
+    migrate_json_to_sqlite,
+    notify_change,
+    open_store,
+    parse_scheduled_at,
+)
+from upload_state import clear_post_state, open_state
+
 # ---------------------------------------------------------------------------
 # Paths
 # ---------------------------------------------------------------------------
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 ASSETS_DIR = PROJECT_ROOT / "assets"
-QUEUE_FILE = ASSETS_DIR / "schedule_queue.json"
 LOCK_FILE = ASSETS_DIR / ".scheduler.lock"
+CLAIMS_DIR = ASSETS_DIR / ".claims"
 SCHEDULED_MEDIA_DIR = ASSETS_DIR / "scheduled_media"
 LOGS_DIR = PROJECT_ROOT / "logs"
 LOG_FILE = LOGS_DIR / "scheduler.log"
@@ -42,9 +65,42 @@ PLATFORM_SCRIPTS = {
     "tiktok": SCRIPT_DIR / "post_tiktok.py",
 }
 
-STALE_LOCK_MINUTES = 30
+# How platform posts are executed: "inprocess" imports the posting scripts
+# and calls their publish() function with configuration loaded once per run;
+# "subprocess" runs each post in a fresh interpreter for full isolation.
+DEFAULT_EXECUTION_MODE = "inprocess"
+SUBPROCESS_TIMEOUT_SECONDS = 300
+# In-process posts get the same deadline. A thread cannot be killed, so a
+# post that overruns it is reported as failed and left to finish (or hang)
+# in the background; only --isolate actually stops it.
+INPROCESS_TIMEOUT_SECONDS = SUBPROCESS_TIMEOUT_SECONDS
+
 CLEANUP_DAYS = 7
 
+# The scheduler lease is an flock on LOCK_FILE held for the whole run; the
+# kernel drops it the moment the process exits. The heartbeat timestamp in
+# the file is informational: it is rewritten every LOCK_HEARTBEAT_SECONDS
+# and reported when another scheduler finds the lease taken.
+LOCK_HEARTBEAT_SECONDS = 30
+
+# Upper bound on how long --daemon sleeps before re-checking the queue for
+# changes that arrived without a socket notification.
+DAEMON_MAX_SLEEP_SECONDS = 60
+
+# When a due post is claimed by another scheduler, --daemon checks it again
+# after this long instead of dropping it, in case that scheduler dies.
+CLAIM_RETRY_SECONDS = 60
+
+# Concurrency limits for --run. The global limit caps the number of
+# (post, platform) jobs in flight; the per-platform limits keep each API
+# within a sensible number of simultaneous uploads.
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_PLATFORM_CONCURRENCY = {
+    "facebook": 2,
+    "instagram": 2,
+    "tiktok": 1,
+}
+
 # ---------------------------------------------------------------------------
 # Logging
 # ---------------------------------------------------------------------------
@@ -68,30 +124,17 @@ def setup_logging():
 # ---------------------------------------------------------------------------
 
 
-def load_queue():
-    """Load schedule_queue.json. Returns dict or None on error."""
-    if not QUEUE_FILE.exists():
-        logging.warning("Queue file does not exist: %s", QUEUE_FILE)
-        return None
+def load_store():
+    """Open the configured queue backend. Returns None if it does not exist."""
     try:
-        with open(QUEUE_FILE, "r") as fh:
-            return json.load(fh)
-    except (json.JSONDecodeError, OSError) as exc:
-        logging.error("Failed to load queue file: %s", exc)
+        store = open_store()
+    except ValueError as exc:
+        logging.error("%s", exc)
         return None
-
-
-def save_queue(queue_data):
-    """Save queue with an exclusive file lock."""
-    ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-    lock_path = QUEUE_FILE.with_suffix(".lock")
-    with open(lock_path, "w") as lock_fh:
-        fcntl.flock(lock_fh, fcntl.LOCK_EX)
-        try:
-            with open(QUEUE_FILE, "w") as fh:
-                fh.write(json.dumps(queue_data, indent=2) + "\n")
-        finally:
-            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+    if not store.exists():
+        logging.warning("Queue does not exist (backend: %s).", store.name)
+        return None
+    return store
 
 
 # ---------------------------------------------------------------------------
@@ -99,49 +142,129 @@ def save_queue(queue_data):
 # ---------------------------------------------------------------------------
 
 
+_lease = {"fh": None, "started_at": None, "stop": None}
+
+
+def _write_lock_info(fh, started_at):
+    now = datetime.now(tz=timezone.utc).isoformat()
+    fh.seek(0)
+    fh.truncate()
+    fh.write(json.dumps({
+        "pid": os.getpid(),
+        "host": socket.gethostname(),
+        "started_at": started_at,
+        "heartbeat_at": now,
+    }))
+    fh.flush()
+
+
+def read_lock_info():
+    """Return the holder details recorded in the lock file, or {}."""
+    try:
+        return json.loads(LOCK_FILE.read_text() or "{}")
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
 def acquire_lock():
-    """Acquire the scheduler lock file.
+    """Take the scheduler lease.
 
-    Returns True if the lock was acquired, False otherwise.
-    Cleans up stale locks older than STALE_LOCK_MINUTES.
+    The lease is an exclusive, non-blocking flock on LOCK_FILE that is held
+    until release_lock() or process exit, so a crashed scheduler never
+    blocks the next one. A background thread rewrites the heartbeat while
+    the lease is held. Returns True if the lease was acquired, False if
+    another live scheduler holds it.
     """
-    if LOCK_FILE.exists():
-        try:
-            lock_age_seconds = time.time() - LOCK_FILE.stat().st_mtime
-            lock_age_minutes = lock_age_seconds / 60
-            if lock_age_minutes < STALE_LOCK_MINUTES:
-                logging.info(
-                    "Scheduler already running (lock is %.1f min old). Skipping.",
-                    lock_age_minutes,
-                )
-                return False
-            # Stale lock — clean it up
-            logging.warning(
-                "Removing stale lock (%.1f min old).", lock_age_minutes
-            )
-            LOCK_FILE.unlink(missing_ok=True)
-        except OSError as exc:
-            logging.error("Error checking lock file: %s", exc)
-            return False
-
     try:
         LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
-        LOCK_FILE.write_text(json.dumps({
-            "pid": os.getpid(),
-            "started_at": datetime.now(tz=timezone.utc).isoformat(),
-        }))
-        return True
+        fh = open(LOCK_FILE, "a+")
     except OSError as exc:
-        logging.error("Failed to create lock file: %s", exc)
+        logging.error("Failed to open lock file: %s", exc)
+        return False
+
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        holder = read_lock_info()
+        age = ""
+        try:
+            beat = datetime.fromisoformat(holder["heartbeat_at"])
+            seconds = (datetime.now(tz=timezone.utc) - beat).total_seconds()
+            age = f", last heartbeat {seconds:.0f}s ago"
+        except (KeyError, TypeError, ValueError):
+            pass
+        logging.info(
+            "Scheduler already running (pid %s on %s%s). Skipping.",
+            holder.get("pid", "?"), holder.get("host", "?"), age,
+        )
         return False
 
+    started_at = datetime.now(tz=timezone.utc).isoformat()
+    _write_lock_info(fh, started_at)
+    stop = threading.Event()
+    _lease.update(fh=fh, started_at=started_at, stop=stop)
+
+    def heartbeat():
+        while not stop.wait(LOCK_HEARTBEAT_SECONDS):
+            refresh_lock()
+
+    threading.Thread(target=heartbeat, name="lock-heartbeat", daemon=True).start()
+    return True
+
+
+def refresh_lock():
+    """Rewrite the heartbeat timestamp in the held lock file."""
+    fh = _lease["fh"]
+    if fh is None:
+        return
+    try:
+        _write_lock_info(fh, _lease["started_at"])
+    except (OSError, ValueError) as exc:
+        logging.warning("Failed to refresh lock heartbeat: %s", exc)
+
 
 def release_lock():
-    """Remove the scheduler lock file."""
+    """Stop the heartbeat and drop the scheduler lease.
+
+    The lock file itself is left in place: unlinking it would let a new
+    scheduler lock a fresh inode while another still waits on the old one.
+    """
+    fh = _lease["fh"]
+    if fh is None:
+        return
+    _lease["stop"].set()
     try:
-        LOCK_FILE.unlink(missing_ok=True)
+        fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
     except OSError as exc:
-        logging.error("Failed to remove lock file: %s", exc)
+        logging.error("Failed to release lock file: %s", exc)
+    _lease.update(fh=None, started_at=None, stop=None)
+
+
+def claim_post(post_id):
+    """Try to claim *post_id* for posting by this process.
+
+    A claim is an exclusive flock on CLAIMS_DIR/<post_id>.lock, held until
+    release_claim() or process exit. Returns the open lock file, or None if
+    another scheduler is posting the same post right now.
+    """
+    CLAIMS_DIR.mkdir(parents=True, exist_ok=True)
+    fh = open(CLAIMS_DIR / f"{post_id}.lock", "w")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        return None
+    return fh
+
+
+def release_claim(fh):
+    """Release a claim taken with claim_post()."""
+    try:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+    finally:
+        fh.close()
 
 
 # ---------------------------------------------------------------------------
@@ -149,7 +272,95 @@ def release_lock():
 # ---------------------------------------------------------------------------
 
 
-def post_to_platform(platform, media_paths, caption):
+_platform_modules = {}
+_platform_lock = threading.Lock()
+
+
+def load_platform(platform):
+    """Import a posting script and load its configuration once.
+
+    Returns ``(module, config)``. Subsequent calls reuse both, so repeated
+    posts skip interpreter startup, imports and .env parsing.
+    """
+    with _platform_lock:
+        if platform not in _platform_modules:
+            module = importlib.import_module(PLATFORM_SCRIPTS[platform].stem)
+            _platform_modules[platform] = (module, module.load_config())
+        return _platform_modules[platform]
+
+
+def summarize_result(output):
+    """Reduce a posting script's result dict to the queue's result schema."""
+    now = datetime.now(tz=timezone.utc).isoformat()
+    if output.get("success"):
+        return {
+            "success": True,
+            "post_id": output.get("post_id", "unknown"),
+            "posted_at": now,
+        }
+    return {
+        "success": False,
+        "error": output.get("error") or "Unknown error",
+        "attempted_at": now,
+    }
+
+
+def post_to_platform(
+    platform, media_paths, caption, mode=DEFAULT_EXECUTION_MODE, post_id=None
+):
+    """Post to one platform, in-process or via the posting script.
+
+    When *post_id* is given, upload progress is checkpointed under
+    assets/upload_state/<post_id>/ so a retry after a crash or failure
+    resumes instead of re-uploading; the checkpoint is dropped on success.
+
+    Returns a result dict with 'success', and either 'post_id'/'posted_at'
+    or 'error'/'attempted_at'.
+    """
+    if mode == "subprocess":
+        return post_to_platform_subprocess(platform, media_paths, caption, post_id)
+
+    if platform not in PLATFORM_SCRIPTS:
+        return {
+            "success": False,
+            "error": f"Posting script not found for {platform}",
+            "attempted_at": datetime.now(tz=timezone.utc).isoformat(),
+        }
+    state = open_state(post_id, platform)
+    outcome = {}
+
+    def run():
+        try:
+            module, config = load_platform(platform)
+            outcome["output"] = module.publish(
+                media_paths, caption, config=config, state=state
+            )
+        except Exception as exc:
+            outcome["error"] = f"{type(exc).__name__}: {exc}"
+
+    # publish() runs on its own daemon thread so a stuck upload cannot hold
+    # this worker, its platform slot and the post's claim forever.
+    worker = threading.Thread(target=run, name=f"publish-{platform}", daemon=True)
+    worker.start()
+    worker.join(INPROCESS_TIMEOUT_SECONDS)
+    if worker.is_alive():
+        outcome["error"] = (
+            f"Posting timed out after {INPROCESS_TIMEOUT_SECONDS} seconds "
+            "(the call was abandoned, not stopped; use --isolate to kill stuck posts)."
+        )
+    if "error" in outcome:
+        return {
+            "success": False,
+            "error": outcome["error"],
+            "attempted_at": datetime.now(tz=timezone.utc).isoformat(),
+        }
+    result = summarize_result(outcome["output"])
+    if result["success"]:
+        state.clear()
+    return result
+
+
+def post_to_platform_subprocess(platform, media_paths, caption, post_id=None):
     """Run the platform posting script as a subprocess.
 
     Returns a result dict with 'success', and either 'post_id'/'posted_at'
@@ -169,11 +380,14 @@ def post_to_platform(platform, media_paths, caption):
         "--media", *media_paths,
         "--caption", caption,
     ]
+    if post_id:
+        cmd += ["--state-key", post_id]
     try:
         result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=300
+            cmd, capture_output=True, text=True, timeout=SUBPROCESS_TIMEOUT_SECONDS
         )
         if result.returncode == 0:
+            open_state(post_id, platform).clear()
             # Try to parse JSON output from the posting script
             try:
                 output = json.loads(result.stdout.strip())
@@ -198,7 +412,9 @@ def post_to_platform(platform, media_paths, caption):
     except subprocess.TimeoutExpired:
         return {
             "success": False,
-            "error": "Posting script timed out after 300 seconds.",
+            "error": (
+                f"Posting script timed out after {SUBPROCESS_TIMEOUT_SECONDS} seconds."
+            ),
             "attempted_at": datetime.now(tz=timezone.utc).isoformat(),
         }
     except OSError as exc:
@@ -209,16 +425,236 @@ def post_to_platform(platform, media_paths, caption):
         }
 
 
-def parse_scheduled_at(post):
-    """Parse a post's scheduled_at field into a UTC-aware datetime."""
-    raw = post.get("scheduled_at", "")
-    try:
-        dt = datetime.fromisoformat(raw)
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone(timezone.utc)
-    except (ValueError, TypeError):
-        return None
+def finalize_post(post, results):
+    """Store per-platform results on *post* and derive its final status."""
+    success_count = sum(1 for r in results.values() if r.get("success"))
+    failure_count = len(results) - success_count
+
+    post["results"] = results
+    post["completed_at"] = datetime.now(tz=timezone.utc).isoformat()
+
+    if failure_count == 0:
+        post["status"] = "completed"
+    elif success_count == 0:
+        post["status"] = "failed"
+    else:
+        post["status"] = "partial"
+
+
+def post_due_posts(
+    store,
+    due_posts,
+    max_workers=DEFAULT_MAX_WORKERS,
+    platform_limits=None,
+    mode=DEFAULT_EXECUTION_MODE,
+):
+    """Post every (post, platform) pair concurrently and finalize each post.
+
+    At most *max_workers* jobs run at once, and at most
+    ``platform_limits[platform]`` of them target the same platform.
+    Each post's status is aggregated exactly as in sequential mode once all
+    of its platforms have reported.
+
+    Every transition is committed to *store* as it happens: the post is
+    marked ``posting`` before any platform call, each platform result is
+    saved as soon as it arrives, and the final status is saved when the
+    last platform reports. Platforms that already succeeded in an earlier,
+    interrupted run are not posted again.
+
+    Each post is claimed (see claim_post) and re-read before it is marked
+    ``posting``, so schedulers running side by side with --partition never
+    post the same entry twice.
+    """
+    limits = dict(DEFAULT_PLATFORM_CONCURRENCY)
+    limits.update(platform_limits or {})
+    slots = {
+        platform: threading.BoundedSemaphore(max(1, n))
+        for platform, n in limits.items()
+    }
+
+    def job(post, platform, media_paths, caption):
+        logging.info("  Posting %s to %s ...", post["id"], platform)
+        return post_to_platform(
+            platform, media_paths, caption, mode, post_id=post["id"]
+        )
+
+    def finish(post):
+        # Keep results in the order the platforms were requested.
+        results = post.get("results") or {}
+        ordered = {p: results[p] for p in post.get("platforms", []) if p in results}
+        finalize_post(post, ordered)
+        store.update([post])
+        release_claim(claims.pop(post["id"]))
+        logging.info(
+            "Post %s finished with status: %s", post["id"], post["status"]
+        )
+
+    def collect(future):
+        post, platform = futures.pop(future)
+        try:
+            result = future.result()
+        except Exception as exc:
+            result = {
+                "success": False,
+                "error": str(exc),
+                "attempted_at": datetime.now(tz=timezone.utc).isoformat(),
+            }
+        post["results"][platform] = result
+        if result.get("success"):
+            logging.info("  %s -> %s: success", post["id"], platform)
+        else:
+            logging.error(
+                "  %s -> %s: failed — %s",
+                post["id"], platform, result.get("error", ""),
+            )
+
+        remaining[post["id"]] -= 1
+        if remaining[post["id"]] == 0:
+            finish(post)
+        else:
+            store.update([post])
+
+    def on_done(slot, future):
+        # Free the platform slot before the main thread hears about the
+        # job, so dispatch() can hand the slot straight to the next one.
+        if slot is not None:
+            slot.release()
+        completed.put(future)
+
+    def dispatch():
+        """Submit queued jobs whose platform has a free slot, up to *workers*."""
+        for platform, jobs in pending.items():
+            slot = slots.get(platform)
+            while jobs and len(futures) < workers:
+                if slot is not None and not slot.acquire(blocking=False):
+                    break
+                post, media_paths, caption = jobs.popleft()
+                future = pool.submit(job, post, platform, media_paths, caption)
+                futures[future] = (post, platform)
+                future.add_done_callback(lambda f, slot=slot: on_done(slot, f))
+
+    def collect_some():
+        collect(completed.get())
+        while True:
+            try:
+                collect(completed.get_nowait())
+            except queue.Empty:
+                break
+        dispatch()
+
+    def queued():
+        return sum(len(jobs) for jobs in pending.values())
+
+    workers = max(1, max_workers)
+    remaining = {}
+    claims = {}
+    futures = {}
+    # Jobs wait here, not in the pool, until their platform has a free
+    # slot, so a busy platform never ties up workers other platforms
+    # could use.
+    pending = {}
+    completed = queue.Queue()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for post in due_posts:
+            # Claim posts only as workers free up, so a scheduler started
+            # with --partition alongside this one can take the rest.
+            while len(futures) >= workers or queued() >= workers:
+                collect_some()
+
+            claim = claim_post(post["id"])
+            if claim is None:
+                logging.info(
+                    "Post %s is being posted by another scheduler; skipping.",
+                    post["id"],
+                )
+                continue
+            # Re-read under the claim: another scheduler may have finished
+            # (or a user cancelled) the post since it was selected.
+            post = store.get(post["id"])
+            if post is None or post["status"] != "pending":
+                release_claim(claim)
+                continue
+            claims[post["id"]] = claim
+
+            logging.info("Processing post %s ...", post["id"])
+            done = {
+                platform: result
+                for platform, result in (post.get("results") or {}).items()
+                if result.get("success")
+            }
+            todo = [p for p in post.get("platforms", []) if p not in done]
+            for platform in done:
+                logging.info(
+                    "  %s -> %s: already posted; skipping", post["id"], platform
+                )
+
+            post["status"] = "posting"
+            post["results"] = done
+            store.update([post])
+
+            remaining[post["id"]] = len(todo)
+            if not todo:
+                finish(post)
+                continue
+
+            media_paths = [m["path"] for m in post.get("media", [])]
+            caption = post.get("caption", "")
+            for platform in todo:
+                pending.setdefault(platform, deque()).append(
+                    (post, media_paths, caption)
+                )
+            dispatch()
+
+        while futures:
+            collect_some()
+
+    # Only reached with claims left over if finishing a post raised.
+    for claim in claims.values():
+        release_claim(claim)
+
+
+def recover_interrupted(store):
+    """Return posts left in ``posting`` by a crashed run to ``pending``.
+
+    Their per-platform results are kept, so the next pass only retries the
+    platforms that had not yet succeeded. A post is only treated as
+    interrupted if its claim is free; one still claimed is being posted by
+    another live scheduler and is left alone.
+    """
+    store.recover()
+    interrupted = []
+    for post in store.active_posts():
+        if post["status"] != "posting":
+            continue
+        claim = claim_post(post["id"])
+        if claim is None:
+            continue
+        release_claim(claim)
+        interrupted.append(post)
+    for post in interrupted:
+        post["status"] = "pending"
+        logging.warning(
+            "Post %s was interrupted mid-post; resuming (already posted: %s).",
+            post["id"],
+            ", ".join(
+                p for p, r in (post.get("results") or {}).items() if r.get("success")
+            ) or "none",
+        )
+    if interrupted:
+        store.update(interrupted)
+    return interrupted
+
+
+def parse_platform_limits(specs):
+    """Parse ``platform=N`` strings into a dict of per-platform limits."""
+    limits = {}
+    for spec in specs or []:
+        platform, sep, value = spec.partition("=")
+        if not sep or platform not in PLATFORM_SCRIPTS:
+            raise ValueError(f"Invalid platform limit '{spec}' (expected platform=N).")
+        limits[platform] = int(value)
+    return limits
 
 
 # ---------------------------------------------------------------------------
@@ -226,31 +662,33 @@ def parse_scheduled_at(post):
 # ---------------------------------------------------------------------------
 
 
-def cmd_run():
-    """Process all due posts in the queue."""
-    if not acquire_lock():
-        return
+def cmd_run(
+    max_workers=DEFAULT_MAX_WORKERS,
+    platform_limits=None,
+    mode=DEFAULT_EXECUTION_MODE,
+    partition=False,
+):
+    """Process all due posts in the queue.
+
+    If another scheduler holds the lease the run is skipped, unless
+    *partition* is set, in which case it goes ahead and posts only the due
+    posts it can claim.
+    """
+    leased = acquire_lock()
+    if not leased:
+        if not partition:
+            return
+        logging.info("Partitioning due posts with the running scheduler.")
 
     try:
-        queue = load_queue()
-        if queue is None:
+        store = load_store()
+        if store is None:
             logging.info("No queue file found. Nothing to do.")
             return
 
+        recover_interrupted(store)
         now = datetime.now(tz=timezone.utc)
-        due_posts = []
-
-        for post in queue["posts"]:
-            if post["status"] != "pending":
-                continue
-            scheduled_utc = parse_scheduled_at(post)
-            if scheduled_utc is None:
-                logging.warning(
-                    "Post %s has invalid scheduled_at; skipping.", post["id"]
-                )
-                continue
-            if scheduled_utc <= now:
-                due_posts.append(post)
+        due_posts = store.due_posts(now)
 
         if not due_posts:
             logging.info("No due posts to process.")
@@ -258,60 +696,22 @@ def cmd_run():
 
         logging.info("Found %d due post(s) to process.", len(due_posts))
 
-        for post in due_posts:
-            post["status"] = "posting"
-            logging.info("Processing post %s ...", post["id"])
-
-            media_paths = [m["path"] for m in post.get("media", [])]
-            caption = post.get("caption", "")
-            results = {}
-            success_count = 0
-            failure_count = 0
-
-            for platform in post.get("platforms", []):
-                logging.info("  Posting to %s ...", platform)
-                result = post_to_platform(platform, media_paths, caption)
-                results[platform] = result
-                if result.get("success"):
-                    success_count += 1
-                    logging.info("  %s: success", platform)
-                else:
-                    failure_count += 1
-                    logging.error(
-                        "  %s: failed — %s", platform, result.get("error", "")
-                    )
-
-            post["results"] = results
-            post["completed_at"] = datetime.now(tz=timezone.utc).isoformat()
-
-            if failure_count == 0:
-                post["status"] = "completed"
-            elif success_count == 0:
-                post["status"] = "failed"
-            else:
-                post["status"] = "partial"
-
-            logging.info(
-                "Post %s finished with status: %s", post["id"], post["status"]
-            )
-
-        save_queue(queue)
+        post_due_posts(store, due_posts, max_workers, platform_limits, mode)
         logging.info("Queue updated successfully.")
 
     finally:
-        release_lock()
+        if leased:
+            release_lock()
 
 
 def cmd_list():
     """Display pending and posting posts in a readable table, plus JSON."""
-    queue = load_queue()
-    if queue is None:
+    store = load_store()
+    if store is None:
         print("No schedule queue found.")
         return
 
-    active = [
-        p for p in queue["posts"] if p["status"] in ("pending", "posting")
-    ]
+    active = store.active_posts()
 
     if not active:
         print("No pending or posting entries in the queue.")
@@ -339,16 +739,12 @@ def cmd_list():
 
 def cmd_cancel(post_id):
     """Cancel a scheduled post by ID and remove its media files."""
-    queue = load_queue()
-    if queue is None:
+    store = load_store()
+    if store is None:
         print(json.dumps({"success": False, "error": "Queue file not found."}))
         sys.exit(1)
 
-    target = None
-    for post in queue["posts"]:
-        if post["id"] == post_id:
-            target = post
-            break
+    target = store.get(post_id)
 
     if target is None:
         print(json.dumps({
@@ -370,41 +766,39 @@ def cmd_cancel(post_id):
     target["status"] = "cancelled"
     target["completed_at"] = datetime.now(tz=timezone.utc).isoformat()
 
-    # Remove copied media directory
-    media_dir = SCHEDULED_MEDIA_DIR / post_id
-    if media_dir.exists():
-        try:
-            shutil.rmtree(str(media_dir))
-            logging.info("Removed media directory: %s", media_dir)
-        except OSError as exc:
-            logging.warning("Failed to remove media directory: %s", exc)
+    # Drop the post's media references; blobs are deleted once unreferenced
+    try:
+        freed = release_post(post_id)
+        logging.info("Released media for %s (%d bytes freed).", post_id, freed)
+    except OSError as exc:
+        logging.warning("Failed to release media for %s: %s", post_id, exc)
+    clear_post_state(post_id)
 
-    save_queue(queue)
+    store.update([target])
+    notify_change(post_id)
     print(json.dumps({"success": True, "post_id": post_id, "status": "cancelled"}))
     logging.info("Post %s cancelled.", post_id)
 
 
 def cmd_cleanup():
     """Remove completed/failed/cancelled posts older than 7 days."""
-    queue = load_queue()
-    if queue is None:
+    store = load_store()
+    if store is None:
         print("No queue file found. Nothing to clean up.")
         return
 
     cutoff = datetime.now(tz=timezone.utc) - timedelta(days=CLEANUP_DAYS)
     removable_statuses = {"completed", "failed", "cancelled"}
-    keep = []
-    removed_count = 0
+    removed_ids = []
+    freed_bytes = 0
 
-    for post in queue["posts"]:
+    for post in store.finished_posts():
         if post["status"] not in removable_statuses:
-            keep.append(post)
             continue
 
         # Determine the completion/creation timestamp for age comparison
         ts_raw = post.get("completed_at") or post.get("created_at")
         if ts_raw is None:
-            keep.append(post)
             continue
 
         try:
@@ -412,29 +806,254 @@ def cmd_cleanup():
             if ts.tzinfo is None:
                 ts = ts.replace(tzinfo=timezone.utc)
         except (ValueError, TypeError):
-            keep.append(post)
             continue
 
         if ts < cutoff:
-            # Remove associated media directory
-            media_dir = SCHEDULED_MEDIA_DIR / post["id"]
-            if media_dir.exists():
-                try:
-                    shutil.rmtree(str(media_dir))
-                    logging.info("Cleaned up media: %s", media_dir)
-                except OSError as exc:
-                    logging.warning(
-                        "Failed to clean up media for %s: %s", post["id"], exc
-                    )
-            removed_count += 1
+            # Release associated media; shared blobs stay until unreferenced
+            try:
+                freed = release_post(post["id"])
+                freed_bytes += freed
+                logging.info("Released media for %s (%d bytes freed).", post["id"], freed)
+            except OSError as exc:
+                logging.warning(
+                    "Failed to clean up media for %s: %s", post["id"], exc
+                )
+            clear_post_state(post["id"])
+            (CLAIMS_DIR / f"{post['id']}.lock").unlink(missing_ok=True)
+            removed_ids.append(post["id"])
             logging.info("Removed old post: %s (status=%s)", post["id"], post["status"])
-        else:
-            keep.append(post)
 
-    queue["posts"] = keep
-    save_queue(queue)
-    print(f"Cleanup complete. Removed {removed_count} old post(s).")
-    logging.info("Cleanup finished. Removed %d post(s).", removed_count)
+    if removed_ids:
+        store.remove(removed_ids)
+    removed_count = len(removed_ids)
+    print(
+        f"Cleanup complete. Removed {removed_count} old post(s), "
+        f"freed {freed_bytes} bytes of media."
+    )
+    logging.info(
+        "Cleanup finished. Removed %d post(s), freed %d bytes.", removed_count, freed_bytes
+    )
+
+
+class PostTimer:
+    """Min-heap of pending posts keyed by their scheduled UTC time.
+
+    Entries are invalidated lazily: ``_when`` holds the current scheduled
+    time for each post, and heap entries that no longer match it (because
+    the post was rescheduled, cancelled or already posted) are discarded
+    when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._when = {}
+
+    def __len__(self):
+        return len(self._when)
+
+    def clear(self):
+        self._heap = []
+        self._when = {}
+
+    def track(self, post):
+        """Add, reschedule or drop *post* depending on its current state."""
+        post_id = post["id"]
+        scheduled_utc = parse_scheduled_at(post)
+        if post["status"] != "pending" or scheduled_utc is None:
+            self._when.pop(post_id, None)
+            return
+        if self._when.get(post_id) != scheduled_utc:
+            self._when[post_id] = scheduled_utc
+            heapq.heappush(self._heap, (scheduled_utc, post_id))
+
+    def forget(self, post_id):
+        self._when.pop(post_id, None)
+
+    def defer(self, post_id, when):
+        """Make *post_id* due again at *when*, whatever its scheduled time."""
+        self._when[post_id] = when
+        heapq.heappush(self._heap, (when, post_id))
+
+    def _prune(self):
+        while self._heap and self._when.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        """Return the earliest scheduled time, or None if nothing is pending."""
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return the IDs of every post due at or before *now*."""
+        due = []
+        while True:
+            self._prune()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, post_id = heapq.heappop(self._heap)
+            self._when.pop(post_id, None)
+            due.append(post_id)
+
+
+def open_notify_socket():
+    """Bind the daemon's wake-up socket. Returns None if unavailable."""
+    try:
+        NOTIFY_SOCKET.unlink(missing_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(NOTIFY_SOCKET))
+        sock.setblocking(False)
+        return sock
+    except OSError as exc:
+        logging.warning(
+            "Notification socket unavailable (%s); polling for changes every "
+            "%d s instead.", exc, DAEMON_MAX_SLEEP_SECONDS,
+        )
+        return None
+
+
+def drain_notifications(sock):
+    """Read all pending datagrams. Returns a set of post IDs ('' = reload all)."""
+    post_ids = set()
+    while True:
+        try:
+            data = sock.recv(1024)
+        except (BlockingIOError, InterruptedError):
+            return post_ids
+        post_ids.add(data.decode(errors="replace").strip())
+
+
+def cmd_daemon(
+    max_workers=DEFAULT_MAX_WORKERS,
+    platform_limits=None,
+    mode=DEFAULT_EXECUTION_MODE,
+):
+    """Run as a long-lived scheduler that posts each entry when it falls due.
+
+    Pending posts are kept in a PostTimer and the daemon sleeps until the
+    earliest one is due. schedule_post.py and --cancel wake it through a
+    local datagram socket carrying the changed post ID, which is reloaded
+    with a point lookup. If a change arrives some other way, the backend's
+    change token is compared after at most DAEMON_MAX_SLEEP_SECONDS and the
+    pending set is reloaded in full.
+    """
+    if not acquire_lock():
+        return
+
+    stopping = []
+
+    def handle_signal(signum, _frame):
+        logging.info("Received signal %d; shutting down after this cycle.", signum)
+        stopping.append(signum)
+
+    # Signals interrupt the sleep below through a self-pipe.
+    wake_r, wake_w = socket.socketpair()
+    wake_r.setblocking(False)
+    wake_w.setblocking(False)
+    signal.set_wakeup_fd(wake_w.fileno())
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    try:
+        store = open_store()
+    except ValueError as exc:
+        logging.error("%s", exc)
+        release_lock()
+        return
+
+    sock = open_notify_socket()
+    timer = PostTimer()
+
+    def reload_all():
+        timer.clear()
+        for post in store.active_posts():
+            timer.track(post)
+        logging.info("Loaded %d pending post(s).", len(timer))
+
+    try:
+        if store.exists():
+            recover_interrupted(store)
+        reload_all()
+        token = store.change_token()
+
+        while not stopping:
+            now = datetime.now(tz=timezone.utc)
+            due_ids = timer.pop_due(now)
+            if due_ids:
+                # Re-read each post so cancellations that raced the timer win.
+                due_posts = [store.get(pid) for pid in due_ids]
+                if any(post and post["status"] == "posting" for post in due_posts):
+                    # A deferred post whose scheduler may have died mid-post.
+                    recover_interrupted(store)
+                    due_posts = [store.get(pid) for pid in due_ids]
+                due_posts = [
+                    post for post in due_posts
+                    if post is not None and post["status"] == "pending"
+                ]
+                if due_posts:
+                    logging.info("Found %d due post(s) to process.", len(due_posts))
+                    post_due_posts(
+                        store, due_posts, max_workers, platform_limits, mode
+                    )
+                    logging.info("Queue updated successfully.")
+                # A post left pending or posting was claimed by another
+                # scheduler. Keep it in the timer so it is retried if that
+                # scheduler never finishes it.
+                retry_at = now + timedelta(seconds=CLAIM_RETRY_SECONDS)
+                for post_id in due_ids:
+                    post = store.get(post_id)
+                    if post is not None and post["status"] in ("pending", "posting"):
+                        timer.defer(post_id, retry_at)
+                token = store.change_token()
+                continue
+
+            next_due = timer.next_due()
+            timeout = DAEMON_MAX_SLEEP_SECONDS
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, (next_due - now).total_seconds()))
+
+            watched = [wake_r] + ([sock] if sock is not None else [])
+            readable, _, _ = select.select(watched, [], [], timeout)
+            if wake_r in readable:
+                drain_notifications(wake_r)
+                continue
+
+            if sock in readable:
+                changed = drain_notifications(sock)
+                if "" in changed:
+                    reload_all()
+                else:
+                    for post_id in changed:
+                        post = store.get(post_id)
+                        if post is None:
+                            timer.forget(post_id)
+                        else:
+                            timer.track(post)
+                token = store.change_token()
+            else:
+                current = store.change_token()
+                if current != token:
+                    reload_all()
+                    token = current
+    finally:
+        signal.set_wakeup_fd(-1)
+        wake_r.close()
+        wake_w.close()
+        if sock is not None:
+            sock.close()
+            NOTIFY_SOCKET.unlink(missing_ok=True)
+        store.close()
+        release_lock()
+
+
+def cmd_migrate_queue():
+    """Move the JSON queue into the SQLite backend."""
+    try:
+        count = migrate_json_to_sqlite()
+    except (FileNotFoundError, ValueError, OSError, sqlite3.Error) as exc:
+        print(json.dumps({"success": False, "error": str(exc)}))
+        sys.exit(1)
+    print(json.dumps({"success": True, "migrated": count, "backend": "sqlite"}))
+    logging.info("Migrated %d post(s) from JSON to SQLite.", count)
 
 
 # ---------------------------------------------------------------------------
@@ -453,6 +1072,11 @@ def parse_args(argv=None):
         action="store_true",
         help="Process all due posts in the queue.",
     )
+    group.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run continuously, posting each entry at its scheduled time.",
+    )
     group.add_argument(
         "--list",
         action="store_true",
@@ -468,6 +1092,48 @@ def parse_args(argv=None):
         action="store_true",
         help="Remove completed/failed/cancelled posts older than 7 days.",
     )
+    group.add_argument(
+        "--migrate-queue",
+        action="store_true",
+        help="One-shot migration of schedule_queue.json into SQLite.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help=(
+            "Maximum number of platform posts in flight during --run/--daemon "
+            f"(default: {DEFAULT_MAX_WORKERS})."
+        ),
+    )
+    parser.add_argument(
+        "--platform-concurrency",
+        nargs="+",
+        metavar="PLATFORM=N",
+        default=[],
+        help=(
+            "Per-platform concurrency limits for --run/--daemon, e.g. tiktok=1 "
+            "facebook=3 (defaults: "
+            + ", ".join(f"{p}={n}" for p, n in DEFAULT_PLATFORM_CONCURRENCY.items())
+            + ")."
+        ),
+    )
+    parser.add_argument(
+        "--isolate",
+        action="store_true",
+        help=(
+            "Run each platform post in its own subprocess instead of calling "
+            "the posting scripts in-process."
+        ),
+    )
+    parser.add_argument(
+        "--partition",
+        action="store_true",
+        help=(
+            "With --run: if another scheduler is already running, post the "
+            "due posts it has not claimed instead of skipping this tick."
+        ),
+    )
     return parser.parse_args(argv)
 
 
@@ -475,14 +1141,25 @@ def main(argv=None):
     setup_logging()
     args = parse_args(argv)
 
-    if args.run:
-        cmd_run()
+    if args.run or args.daemon:
+        try:
+            platform_limits = parse_platform_limits(args.platform_concurrency)
+        except ValueError as exc:
+            logging.error("%s", exc)
+            sys.exit(2)
+        mode = "subprocess" if args.isolate else DEFAULT_EXECUTION_MODE
+        if args.daemon:
+            cmd_daemon(args.workers, platform_limits, mode)
+        else:
+            cmd_run(args.workers, platform_limits, mode, partition=args.partition)
     elif args.list:
         cmd_list()
     elif args.cancel:
         cmd_cancel(args.cancel)
     elif args.cleanup:
         cmd_cleanup()
+    elif args.migrate_queue:
+        cmd_migrate_queue()
 
     sys.exit(0)
 
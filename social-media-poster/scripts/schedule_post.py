@@ -2,28 +2,36 @@
 """
 Schedule a social media post for future publishing.
 
-Validates media, copies files to a staging area, and adds an entry to the
-schedule queue (assets/schedule_queue.json). Designed to be invoked by the
-Claude skill or directly from the command line.
+Validates media, stores files in the content-addressed media store
+(media_store.py), and adds an entry to the schedule queue (see
+queue_store.py for the JSON and SQLite backends).
+Designed to be invoked by the Claude skill or directly from the command line.
 """
 
 import argparse
-import fcntl
 import json
 import mimetypes
 import os
-import shutil
+import sqlite3
 import subprocess
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 from uuid import uuid4
 
+from media_store import add_files, add_many, release_post
+from normalize_media import DEFAULT_JOBS, normalize_many
+from queue_store import notify_change, open_store
+
+try:
+    import validate_media as media_validator
+except ImportError:
+    media_validator = None
+
 # Resolve paths relative to the project root (one level above scripts/)
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 ASSETS_DIR = PROJECT_ROOT / "assets"
-QUEUE_FILE = ASSETS_DIR / "schedule_queue.json"
 SCHEDULED_MEDIA_DIR = ASSETS_DIR / "scheduled_media"
 VALIDATE_SCRIPT = SCRIPT_DIR / "validate_media.py"
 
@@ -102,31 +110,6 @@ def parse_schedule_time(schedule_str, tz_name):
     return aware_dt
 
 
-def load_queue():
-    """Load the schedule queue from disk, creating it if needed."""
-    if not QUEUE_FILE.exists():
-        ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-        initial = {"version": 1, "posts": []}
-        QUEUE_FILE.write_text(json.dumps(initial, indent=2) + "\n")
-        return initial
-
-    with open(QUEUE_FILE, "r") as fh:
-        return json.load(fh)
-
-
-def save_queue(queue_data):
-    """Atomically save the queue file with an exclusive file lock."""
-    ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-    lock_path = QUEUE_FILE.with_suffix(".lock")
-    with open(lock_path, "w") as lock_fh:
-        fcntl.flock(lock_fh, fcntl.LOCK_EX)
-        try:
-            with open(QUEUE_FILE, "w") as fh:
-                fh.write(json.dumps(queue_data, indent=2) + "\n")
-        finally:
-            fcntl.flock(lock_fh, fcntl.LOCK_UN)
-
-
 def validate_media(media_files, platforms):
     """Run validate_media.py as a subprocess. Return (success, output)."""
     if not VALIDATE_SCRIPT.exists():
@@ -146,29 +129,97 @@ def validate_media(media_files, platforms):
     return True, output
 
 
-def copy_media(media_files, post_id):
-    """Copy media files into assets/scheduled_media/<post_id>/."""
-    dest_dir = SCHEDULED_MEDIA_DIR / post_id
-    dest_dir.mkdir(parents=True, exist_ok=True)
-
-    copied = []
-    for filepath in media_files:
-        src = Path(filepath).resolve()
-        if not src.exists():
-            raise FileNotFoundError(f"Media file not found: {src}")
-        dest = dest_dir / src.name
-        # Handle name collisions by appending a counter
-        counter = 1
-        while dest.exists():
-            dest = dest_dir / f"{src.stem}_{counter}{src.suffix}"
-            counter += 1
-        shutil.copy2(str(src), str(dest))
-        copied.append({
-            "path": str(dest),
-            "original_path": str(src),
-            "type": detect_media_type(str(src)),
-        })
-    return copied
+def validate_media_once(jobs):
+    """Validate in-process, checking each unique file once.
+
+    *jobs* is a list of ``(media_files, platforms)``. A file used by several
+    jobs is validated once against the union of their platforms, and each
+    job only sees the issues for its own platforms. Returns one list of
+    issue strings per job (empty when valid).
+    """
+    if media_validator is None:
+        return [[] for _ in jobs]
+
+    platforms_by_file = {}
+    for media_files, platforms in jobs:
+        for f in media_files:
+            platforms_by_file.setdefault(str(Path(f).resolve()), set()).update(platforms)
+    reports = {
+        path: media_validator.validate_file(path, sorted(platforms))
+        for path, platforms in platforms_by_file.items()
+    }
+
+    job_issues = []
+    for media_files, platforms in jobs:
+        issues = []
+        for f in media_files:
+            for issue in reports[str(Path(f).resolve())]["issues"]:
+                # Platform-specific issues are prefixed with "[platform]".
+                tag = issue[1:].split("]", 1)[0] if issue.startswith("[") else None
+                if tag is None or tag in platforms:
+                    issues.append(f"{Path(f).name}: {issue}")
+        job_issues.append(issues)
+    return job_issues
+
+
+def normalize_jobs(jobs, workers=DEFAULT_JOBS):
+    """Swap media that fails validation for compliant derivatives.
+
+    Only jobs with a true ``normalize`` key are touched. Every unique
+    (file, platforms) pair across the jobs is normalized once, all of them
+    on one worker pool (see normalize_media.py). Each job's ``media`` is
+    replaced in place and the outcomes that produced a derivative are
+    stored under ``normalized`` so they can be recorded on the post.
+    """
+    keys = []
+    for job in jobs:
+        if job.get("normalize"):
+            platforms = tuple(sorted(job["platforms"]))
+            keys.extend((str(Path(f).resolve()), platforms) for f in job["media"])
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    outcomes = dict(zip(keys, normalize_many(keys, workers)))
+
+    for job in jobs:
+        if not job.get("normalize"):
+            continue
+        platforms = tuple(sorted(job["platforms"]))
+        results = [outcomes[(str(Path(f).resolve()), platforms)] for f in job["media"]]
+        job["media"] = [r["path"] for r in results]
+        job["normalized"] = [r for r in results if r["path"] != r["source"] or r["error"]]
+
+
+def _media_entries(stored, normalized=()):
+    by_path = {
+        str(Path(n["path"]).resolve()): n for n in normalized if n["path"] != n["source"]
+    }
+    entries = []
+    for item in stored:
+        entry = {
+            "path": item["path"],
+            "original_path": item["original_path"],
+            "type": detect_media_type(item["original_path"]),
+            "sha256": item["sha256"],
+        }
+        derived = by_path.get(item["original_path"])
+        if derived is not None:
+            entry["original_path"] = derived["source"]
+            entry["normalized_profile"] = derived["profile"]
+        entries.append(entry)
+    return entries
+
+
+def copy_media(media_files, post_id, normalized=()):
+    """Store media in the content-addressed store, linked under assets/scheduled_media/<post_id>/.
+
+    Returns ``(entries, bytes_saved)``; identical files already in the store
+    (e.g. the same video queued for several slots) are linked, not copied.
+    *normalized* lists normalize_media outcomes for derivatives among
+    *media_files*, so their entries keep the user's original path.
+    """
+    stored, bytes_saved = add_files(media_files, post_id)
+    return _media_entries(stored, normalized), bytes_saved
 
 
 def build_post_entry(post_id, scheduled_at, tz_name, platforms, caption, media_entries):
@@ -188,6 +239,101 @@ def build_post_entry(post_id, scheduled_at, tz_name, platforms, caption, media_e
     }
 
 
+def schedule_many(jobs):
+    """Schedule several posts in one pass, without a subprocess per post.
+
+    Each job is a dict with ``media``, ``caption``, ``platforms``,
+    ``schedule`` and optionally ``timezone`` and ``normalize``, meaning the
+    same as the CLI flags. Media to normalize is processed on one worker
+    pool, every unique media file is validated once, media for all posts is
+    stored under one media-store lock, and all entries are appended to the
+    queue in a single store transaction. Returns one result per job, in
+    order, shaped like the CLI's JSON output.
+    """
+    results = [None] * len(jobs)
+
+    # --- Parse times and check files exist ---
+    accepted = []
+    for idx, job in enumerate(jobs):
+        tz_name = job.get("timezone") or get_local_timezone_name()
+        try:
+            scheduled_at = parse_schedule_time(job["schedule"], tz_name)
+        except ValueError as exc:
+            results[idx] = {"success": False, "error": str(exc)}
+            continue
+        missing = [f for f in job["media"] if not Path(f).exists()]
+        if missing:
+            results[idx] = {"success": False, "error": f"File not found: {missing[0]}"}
+            continue
+        accepted.append((idx, job, scheduled_at, tz_name))
+
+    # --- Replace failing media with compliant derivatives if asked ---
+    normalize_jobs([job for _, job, _, _ in accepted])
+
+    # --- Validate each unique media file once ---
+    job_issues = validate_media_once(
+        [(job["media"], job["platforms"]) for _, job, _, _ in accepted]
+    )
+    valid = []
+    for item, issues in zip(accepted, job_issues):
+        if issues:
+            results[item[0]] = {
+                "success": False,
+                "error": f"Media validation failed: {'; '.join(issues)}",
+            }
+        else:
+            valid.append(item)
+
+    # --- Store media for every post under one lock ---
+    post_ids = [f"post_{uuid4().hex[:12]}" for _ in valid]
+    stored = add_many([
+        (post_id, job["media"]) for post_id, (_, job, _, _) in zip(post_ids, valid)
+    ])
+    entries = []
+    queued = []
+    for post_id, item, outcome in zip(post_ids, valid, stored):
+        idx, job, scheduled_at, tz_name = item
+        if isinstance(outcome, OSError):
+            release_post(post_id)
+            results[idx] = {"success": False, "error": str(outcome)}
+            continue
+        stored_files, bytes_saved = outcome
+        entries.append(build_post_entry(
+            post_id=post_id,
+            scheduled_at=scheduled_at,
+            tz_name=tz_name,
+            platforms=job["platforms"],
+            caption=job["caption"],
+            media_entries=_media_entries(stored_files, job.get("normalized", ())),
+        ))
+        queued.append((idx, post_id, scheduled_at, job["platforms"], bytes_saved))
+
+    if not entries:
+        return results
+
+    # --- Append everything in one transaction ---
+    try:
+        store = open_store()
+        store.add_many(entries)
+        store.close()
+    except (ValueError, OSError, sqlite3.Error) as exc:
+        for idx, post_id, _, _, _ in queued:
+            release_post(post_id)
+            results[idx] = {"success": False, "error": f"Failed to queue post: {exc}"}
+        return results
+    notify_change()
+
+    for idx, post_id, scheduled_at, platforms, bytes_saved in queued:
+        results[idx] = {
+            "success": True,
+            "post_id": post_id,
+            "scheduled_at": scheduled_at.isoformat(),
+            "platforms": platforms,
+            "media_bytes_saved": bytes_saved,
+        }
+    return results
+
+
 def parse_args(argv=None):
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(
@@ -221,6 +367,20 @@ def parse_args(argv=None):
         default=None,
         help="IANA timezone name (default: local system timezone).",
     )
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help=(
+            "Replace media that fails validation with a platform-compliant "
+            "derivative (JPEG / H.264+AAC MP4) made with Pillow or ffmpeg."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Files to normalize in parallel with --normalize (default: {DEFAULT_JOBS}).",
+    )
     return parser.parse_args(argv)
 
 
@@ -242,9 +402,18 @@ def main(argv=None):
             print(json.dumps({"success": False, "error": f"File not found: {f}"}))
             sys.exit(1)
 
+    # --- Optionally replace failing media with compliant derivatives ---
+    job = {"media": args.media, "platforms": args.platforms, "normalize": args.normalize}
+    normalize_jobs([job], args.jobs)
+    media_files = job["media"]
+    normalized = job.get("normalized", [])
+
     # --- Validate media against platform requirements ---
-    valid, validation_msg = validate_media(args.media, args.platforms)
+    valid, validation_msg = validate_media(media_files, args.platforms)
     if not valid:
+        errors = [f"{n['source']}: {n['error']}" for n in normalized if n["error"]]
+        if errors:
+            validation_msg += f" (normalization failed: {'; '.join(errors)})"
         print(json.dumps({
             "success": False,
             "error": f"Media validation failed: {validation_msg}",
@@ -254,8 +423,9 @@ def main(argv=None):
     # --- Generate post ID and copy media ---
     post_id = f"post_{uuid4().hex[:12]}"
     try:
-        media_entries = copy_media(args.media, post_id)
+        media_entries, bytes_saved = copy_media(media_files, post_id, normalized)
     except (FileNotFoundError, OSError) as exc:
+        release_post(post_id)
         print(json.dumps({"success": False, "error": str(exc)}))
         sys.exit(1)
 
@@ -269,10 +439,16 @@ def main(argv=None):
         media_entries=media_entries,
     )
 
-    # --- Load queue, append, and save with lock ---
-    queue = load_queue()
-    queue["posts"].append(entry)
-    save_queue(queue)
+    # --- Append to the queue (single-row insert on SQLite) ---
+    try:
+        store = open_store()
+        store.add(entry)
+        store.close()
+    except (ValueError, OSError, sqlite3.Error) as exc:
+        release_post(post_id)
+        print(json.dumps({"success": False, "error": f"Failed to queue post: {exc}"}))
+        sys.exit(1)
+    notify_change(post_id)
 
     # --- Print success result ---
     result = {
@@ -280,6 +456,7 @@ def main(argv=None):
         "post_id": post_id,
         "scheduled_at": scheduled_at.isoformat(),
         "platforms": args.platforms,
+        "media_bytes_saved": bytes_saved,
     }
     print(json.dumps(result, indent=2))
     sys.exit(0)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Persistent checkpoints for in-progress platform uploads.
+
+Each (post id, platform) attempt gets a small JSON file under
+assets/upload_state/<post_id>/<platform>.json recording upload session IDs,
+acknowledged byte offsets and container/publish IDs as they are obtained.
+The posting scripts consult it on retry so that an interrupted upload
+resumes at the last acknowledged offset and steps that already completed
+(uploads, container creation, publishing) are not repeated.
+
+Posting scripts accept ``state=None``; ``UploadState(None)`` is an in-memory
+checkpoint that is never written to disk.
+"""
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+ASSETS_DIR = PROJECT_ROOT / "assets"
+UPLOAD_STATE_DIR = ASSETS_DIR / "upload_state"
+
+
+class UploadState:
+    """Dict-like checkpoint persisted atomically on every change."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        self._data = {}
+        if self.path is not None and self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text())
+            except (json.JSONDecodeError, OSError):
+                self._data = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def section(self, key):
+        """Return a copy of the nested dict stored under *key*."""
+        with self._lock:
+            return dict(self._data.get(key) or {})
+
+    def set(self, **fields):
+        """Merge *fields* into the checkpoint and persist it."""
+        with self._lock:
+            self._data.update(fields)
+            self._save()
+
+    def set_in(self, key, subkey, value):
+        """Set ``state[key][subkey] = value`` and persist it."""
+        with self._lock:
+            self._data.setdefault(key, {})[subkey] = value
+            self._save()
+
+    def discard(self, key, subkey=None):
+        """Remove *key* (or one *subkey* inside it) and persist."""
+        with self._lock:
+            if subkey is None:
+                self._data.pop(key, None)
+            else:
+                (self._data.get(key) or {}).pop(subkey, None)
+            self._save()
+
+    def clear(self):
+        """Forget everything and delete the checkpoint file."""
+        with self._lock:
+            self._data = {}
+            if self.path is not None:
+                self.path.unlink(missing_ok=True)
+
+    def _save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as fh:
+            fh.write(json.dumps(self._data, indent=2) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def open_state(post_id, platform):
+    """Return the checkpoint for one (post id, platform) attempt."""
+    if not post_id:
+        return UploadState(None)
+    return UploadState(UPLOAD_STATE_DIR / post_id / f"{platform}.json")
+
+
+def clear_post_state(post_id):
+    """Delete every platform checkpoint belonging to *post_id*."""
+    shutil.rmtree(UPLOAD_STATE_DIR / post_id, ignore_errors=True)
@@ -2,16 +2,21 @@
 """Validate media files against social media platform requirements before posting."""
 
 import argparse
+import glob
+import importlib.util
 import json
 import os
+import shutil
+import struct
+import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    from PIL import Image
+from probe_cache import ProbeCache
 
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+# Pillow is only a fallback for images the header parser below cannot read,
+# so it is imported on first use rather than at startup.
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
 
 # ---------------------------------------------------------------------------
 # Platform requirement definitions
@@ -43,25 +48,51 @@ PLATFORM_IMAGE_REQUIREMENTS = {
 }
 
 # Per-platform video constraints
-# duration_max_seconds == None means no duration limit enforced here
+# duration_max_seconds == None means no duration limit enforced here.
+# Stream rules (checked from the same ffprobe pass): codec names as reported
+# by ffprobe, fps_range (min, max), max_bitrate in bits/s, min/max_dimension
+# in pixels for the short/long side, and aspect_range as (min, max)
+# width/height. A rule that is absent or None is not enforced; a mismatch
+# with recommended_aspect is only a warning.
 PLATFORM_VIDEO_REQUIREMENTS = {
     "facebook": {
         "extensions": {".mp4", ".mov"},
         "max_size_bytes": 10 * 1024 * 1024 * 1024,  # 10 GB
         "duration_max_seconds": 240 * 60,  # 240 min
+        "codecs": {"h264", "hevc", "vp8", "vp9", "mpeg4"},
+        "fps_range": (1, 60),
     },
     "instagram": {
         "extensions": {".mp4", ".mov"},
         "max_size_bytes": 1 * 1024 * 1024 * 1024,  # 1 GB
         "duration_max_seconds": 15 * 60,  # 15 min (Reels)
+        "codecs": {"h264", "hevc"},
+        "audio_codecs": {"aac"},
+        "fps_range": (23, 60),
+        "max_bitrate": 25 * 1000 * 1000,  # 25 Mbps
+        "max_dimension": 1920,
+        "aspect_range": (0.01, 10.0),
+        "recommended_aspect": (9, 16),
     },
     "tiktok": {
         "extensions": {".mp4", ".mov", ".webm"},
         "max_size_bytes": 4 * 1024 * 1024 * 1024,  # 4 GB
         "duration_max_seconds": 10 * 60,  # 10 min
+        "codecs": {"h264", "hevc", "vp8", "vp9"},
+        "fps_range": (23, 60),
+        "min_dimension": 360,
+        "max_dimension": 4096,
+        "recommended_aspect": (9, 16),
     },
 }
 
+# How far (as a fraction) an aspect ratio may be from recommended_aspect
+# before a warning is raised.
+ASPECT_TOLERANCE = 0.02
+
+
+_cache = ProbeCache()
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -83,19 +114,115 @@ def get_file_size_mb(filepath):
     return round(os.path.getsize(filepath) / (1024 * 1024), 2)
 
 
+# JPEG start-of-frame markers (SOF0-SOF15 except DHT, JPG and DAC).
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_dimensions(fh):
+    """Walk JPEG segment headers (skipping their bodies) to the SOF segment."""
+    fh.seek(2)
+    while True:
+        byte = fh.read(1)
+        while byte and byte != b"\xff":
+            byte = fh.read(1)
+        while byte == b"\xff":
+            byte = fh.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue  # standalone markers carry no length
+        if marker in (0xD9, 0xDA):
+            return None  # end of image / start of scan before any SOF
+        header = fh.read(2)
+        if len(header) < 2:
+            return None
+        (length,) = struct.unpack(">H", header)
+        if marker in JPEG_SOF_MARKERS:
+            frame = fh.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        fh.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_header(filepath):
+    """Return (width, height) from the JPEG/PNG/WebP header, or None.
+
+    Only the first few bytes are read (for JPEG, just the segment headers up
+    to the frame header), so this is cheap even for very large images and
+    needs no third-party packages.
+    """
+    try:
+        with open(filepath, "rb") as fh:
+            head = fh.read(30)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+                    width, height = struct.unpack("<HH", head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                if chunk == b"VP8L" and head[20] == 0x2F:
+                    (bits,) = struct.unpack("<I", head[21:25])
+                    return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+                if chunk == b"VP8X":
+                    width = int.from_bytes(head[24:27], "little") + 1
+                    height = int.from_bytes(head[27:30], "little") + 1
+                    return width, height
+                return None
+            if head[:2] == b"\xff\xd8":
+                return _jpeg_dimensions(fh)
+    except (OSError, struct.error, IndexError):
+        pass
+    return None
+
+
 def get_image_dimensions(filepath):
-    """Return (width, height) using PIL. Returns None if PIL is unavailable."""
-    if not PIL_AVAILABLE:
-        return None
+    """Return (width, height), or None if the image cannot be read.
+
+    Tries the header parser first and falls back to PIL (when installed)
+    for anything it does not understand.
+    """
+    dims = read_image_header(filepath)
+    if dims is not None or not PIL_AVAILABLE:
+        return dims
     try:
+        from PIL import Image
+
         with Image.open(filepath) as img:
             return img.size  # (width, height)
     except Exception:
         return None
 
 
-def get_video_duration(filepath):
-    """Return video duration in seconds via ffprobe, or None if unavailable."""
+def _parse_rate(raw):
+    """Parse an ffprobe frame rate such as '30000/1001' into a float."""
+    try:
+        num, _, den = str(raw).partition("/")
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value or None
+
+
+def _to_number(raw, cast=float):
+    try:
+        return cast(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_video(filepath):
+    """Return stream metadata for a video via a single ffprobe call.
+
+    The dict has duration (s), width, height, codec, audio_codec, bitrate
+    (bits/s) and fps; fields ffprobe could not report are None. Width and
+    height are as displayed, i.e. swapped for videos with a 90/270 degree
+    rotation (as phones record portrait video). Returns None if ffprobe is
+    unavailable or fails.
+    """
     if not shutil.which("ffprobe"):
         return None
     try:
@@ -105,20 +232,73 @@ def get_video_duration(filepath):
                 "-v",
                 "error",
                 "-show_entries",
-                "format=duration",
+                "format=duration,bit_rate:"
+                "stream=codec_type,codec_name,width,height,avg_frame_rate,r_frame_rate:"
+                "stream_tags=rotate:stream_side_data=rotation",
                 "-of",
-                "default=noprint_wrappers=1:nokey=1",
+                "json",
                 filepath,
             ],
             capture_output=True,
             text=True,
             timeout=30,
         )
-        if result.returncode == 0 and result.stdout.strip():
-            return float(result.stdout.strip())
+        if result.returncode != 0:
+            return None
+        data = json.loads(result.stdout or "{}")
     except Exception:
-        pass
-    return None
+        return None
+
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    video = next((st for st in streams if st.get("codec_type") == "video"), {})
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), {})
+    width = _to_number(video.get("width"), int)
+    height = _to_number(video.get("height"), int)
+    rotation = (video.get("tags") or {}).get("rotate")
+    for side_data in video.get("side_data_list") or []:
+        rotation = side_data.get("rotation", rotation)
+    if int(_to_number(rotation) or 0) % 180:
+        width, height = height, width
+    return {
+        "duration": _to_number(fmt.get("duration")),
+        "bitrate": _to_number(fmt.get("bit_rate"), int),
+        "width": width,
+        "height": height,
+        "codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name"),
+        "fps": _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")),
+    }
+
+
+def probe_image(filepath):
+    """Return {"width", "height"} for an image, or None if it cannot be read."""
+    dims = get_image_dimensions(filepath)
+    if dims is None:
+        return None
+    return {"width": dims[0], "height": dims[1]}
+
+
+def probe_media(filepath, media_type, use_cache=True):
+    """Probe *filepath* once, consulting the persistent probe cache first.
+
+    Only successful probes are cached, so installing ffprobe or Pillow later
+    takes effect immediately.
+    """
+    if use_cache:
+        cached = _cache.get(filepath)
+        if cached is not None:
+            return cached
+    probe = probe_image(filepath) if media_type == "image" else probe_video(filepath)
+    if use_cache and probe is not None:
+        _cache.put(filepath, probe)
+    return probe
+
+
+def get_video_duration(filepath):
+    """Return video duration in seconds via ffprobe, or None if unavailable."""
+    probe = probe_media(filepath, "video")
+    return probe["duration"] if probe else None
 
 
 def fmt_bytes(num_bytes):
@@ -137,10 +317,12 @@ def fmt_bytes(num_bytes):
 # ---------------------------------------------------------------------------
 
 
-def validate_file(filepath, platforms):
+def validate_file(filepath, platforms, use_cache=True):
     """Validate a single file against the given platforms.
 
-    Returns a dict with keys: file, type, size_mb, issues, warnings.
+    The file is probed once (see probe_media) and the result is checked
+    against every platform. Returns a dict with keys: file, type, size_mb,
+    issues, warnings.
     """
     result = {
         "file": filepath,
@@ -174,19 +356,21 @@ def validate_file(filepath, platforms):
     result["size_mb"] = round(file_size / (1024 * 1024), 2)
     ext = os.path.splitext(filepath)[1].lower()
 
+    probe = probe_media(filepath, media_type, use_cache)
+
     # --- Per-platform checks ---
     for platform in platforms:
         if media_type == "image":
             reqs = PLATFORM_IMAGE_REQUIREMENTS[platform]
-            _validate_image(filepath, ext, file_size, reqs, platform, result)
+            _validate_image(probe, ext, file_size, reqs, platform, result)
         else:
             reqs = PLATFORM_VIDEO_REQUIREMENTS[platform]
-            _validate_video(filepath, ext, file_size, reqs, platform, result)
+            _validate_video(probe, ext, file_size, reqs, platform, result)
 
     return result
 
 
-def _validate_image(filepath, ext, file_size, reqs, platform, result):
+def _validate_image(probe, ext, file_size, reqs, platform, result):
     """Check image-specific constraints for a single platform."""
     # Extension
     if ext not in reqs["extensions"]:
@@ -203,28 +387,23 @@ def _validate_image(filepath, ext, file_size, reqs, platform, result):
         )
 
     # Dimensions
-    if not PIL_AVAILABLE:
+    if probe is None:
         result["warnings"].append(
-            f"[{platform}] PIL/Pillow not installed — skipping dimension check"
+            f"[{platform}] Could not read image dimensions"
+            + ("" if PIL_AVAILABLE else " (install Pillow for unusual formats)")
         )
     else:
-        dims = get_image_dimensions(filepath)
-        if dims is None:
-            result["warnings"].append(
-                f"[{platform}] Could not read image dimensions"
+        width, height = probe["width"], probe["height"]
+        min_w = reqs["min_width"]
+        min_h = reqs["min_height"]
+        if width < min_w or height < min_h:
+            result["issues"].append(
+                f"[{platform}] Image dimensions {width}x{height} below "
+                f"minimum {min_w}x{min_h}"
             )
-        else:
-            width, height = dims
-            min_w = reqs["min_width"]
-            min_h = reqs["min_height"]
-            if width < min_w or height < min_h:
-                result["issues"].append(
-                    f"[{platform}] Image dimensions {width}x{height} below "
-                    f"minimum {min_w}x{min_h}"
-                )
 
 
-def _validate_video(filepath, ext, file_size, reqs, platform, result):
+def _validate_video(probe, ext, file_size, reqs, platform, result):
     """Check video-specific constraints for a single platform."""
     # Extension
     if ext not in reqs["extensions"]:
@@ -243,10 +422,10 @@ def _validate_video(filepath, ext, file_size, reqs, platform, result):
     # Duration
     max_dur = reqs.get("duration_max_seconds")
     if max_dur is not None:
-        duration = get_video_duration(filepath)
+        duration = probe["duration"] if probe else None
         if duration is None:
             result["warnings"].append(
-                f"[{platform}] ffprobe not available — skipping duration check"
+                f"[{platform}] ffprobe not available — skipping duration and stream checks"
             )
         elif duration > max_dur:
             dur_min = duration / 60
@@ -256,6 +435,78 @@ def _validate_video(filepath, ext, file_size, reqs, platform, result):
                 f"maximum ({limit_min:.1f} min)"
             )
 
+    if probe:
+        _validate_video_streams(probe, reqs, platform, result)
+
+
+def _validate_video_streams(probe, reqs, platform, result):
+    """Check codec, frame rate, bitrate, resolution and aspect ratio."""
+    issues = result["issues"]
+
+    codec = probe.get("codec")
+    if codec is None:
+        issues.append(f"[{platform}] No video stream found")
+        return
+    if reqs.get("codecs") and codec not in reqs["codecs"]:
+        issues.append(
+            f"[{platform}] Video codec '{codec}' not supported. "
+            f"Allowed: {', '.join(sorted(reqs['codecs']))}"
+        )
+
+    audio_codec = probe.get("audio_codec")
+    if audio_codec and reqs.get("audio_codecs") and audio_codec not in reqs["audio_codecs"]:
+        issues.append(
+            f"[{platform}] Audio codec '{audio_codec}' not supported. "
+            f"Allowed: {', '.join(sorted(reqs['audio_codecs']))}"
+        )
+
+    fps = probe.get("fps")
+    if fps and reqs.get("fps_range"):
+        low, high = reqs["fps_range"]
+        # Allow NTSC rates such as 23.976 against a 23-60 range.
+        if not (low - 0.01 <= fps <= high + 0.01):
+            issues.append(
+                f"[{platform}] Frame rate {fps:.2f} fps outside {low}-{high} fps"
+            )
+
+    bitrate = probe.get("bitrate")
+    if bitrate and reqs.get("max_bitrate") and bitrate > reqs["max_bitrate"]:
+        issues.append(
+            f"[{platform}] Bitrate {bitrate / 1e6:.1f} Mbps exceeds "
+            f"maximum {reqs['max_bitrate'] / 1e6:.0f} Mbps"
+        )
+
+    width, height = probe.get("width"), probe.get("height")
+    if not width or not height:
+        return
+    short_side, long_side = sorted((width, height))
+    if reqs.get("min_dimension") and short_side < reqs["min_dimension"]:
+        issues.append(
+            f"[{platform}] Resolution {width}x{height} below minimum "
+            f"{reqs['min_dimension']} px on the short side"
+        )
+    if reqs.get("max_dimension") and long_side > reqs["max_dimension"]:
+        issues.append(
+            f"[{platform}] Resolution {width}x{height} exceeds maximum "
+            f"{reqs['max_dimension']} px on the long side"
+        )
+
+    aspect = width / height
+    if reqs.get("aspect_range"):
+        low, high = reqs["aspect_range"]
+        if not (low <= aspect <= high):
+            issues.append(
+                f"[{platform}] Aspect ratio {aspect:.2f} outside allowed "
+                f"range {low}-{high}"
+            )
+    if reqs.get("recommended_aspect"):
+        rec_w, rec_h = reqs["recommended_aspect"]
+        if abs(aspect / (rec_w / rec_h) - 1) > ASPECT_TOLERANCE:
+            result["warnings"].append(
+                f"[{platform}] Aspect ratio {width}x{height} is not the "
+                f"recommended {rec_w}:{rec_h}"
+            )
+
 
 # ---------------------------------------------------------------------------
 # CLI
@@ -264,6 +515,32 @@ def _validate_video(filepath, ext, file_size, reqs, platform, result):
 PLATFORM_CHOICES = ["facebook", "instagram", "tiktok"]
 
 
+def expand_inputs(inputs):
+    """Expand directories and glob patterns into an ordered list of files.
+
+    Directories contribute every supported media file beneath them and glob
+    patterns every matching file (or directory, expanded the same way),
+    each in sorted order; plain paths are kept as given so missing files
+    are still reported. Duplicates are dropped, keeping the first occurrence.
+    """
+    files = []
+    for item in inputs:
+        paths = [item]
+        if glob.has_magic(item):
+            paths = sorted(glob.glob(item, recursive=True)) or [item]
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(sorted(
+                    os.path.join(root, name)
+                    for root, _dirs, names in os.walk(path)
+                    for name in names
+                    if classify_media(name) is not None
+                ))
+            else:
+                files.append(path)
+    return list(dict.fromkeys(files))
+
+
 def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Validate media files against social media platform requirements."
@@ -272,7 +549,10 @@ def parse_args(argv=None):
         "--files",
         nargs="+",
         required=True,
-        help="One or more media file paths to validate.",
+        help=(
+            "Media files to validate. Directories (searched recursively) and "
+            "glob patterns such as 'Brands/*/ad-outputs/*.mp4' are expanded."
+        ),
     )
     parser.add_argument(
         "--platforms",
@@ -281,15 +561,38 @@ def parse_args(argv=None):
         choices=PLATFORM_CHOICES,
         help="Target platforms to validate against.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Probe every file afresh instead of using the persistent probe cache.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to probe concurrently (default: 1).",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv=None):
     args = parse_args(argv)
 
-    file_results = []
-    for filepath in args.files:
-        file_results.append(validate_file(filepath, args.platforms))
+    files = expand_inputs(args.files)
+    if not files:
+        print(json.dumps({"valid": False, "error": "No media files matched the given inputs."}))
+        sys.exit(1)
+
+    def validate(filepath):
+        return validate_file(filepath, args.platforms, not args.no_cache)
+
+    # Probing is dominated by ffprobe subprocesses and file I/O, so threads
+    # overlap well; map() keeps results in input order.
+    if args.jobs > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            file_results = list(pool.map(validate, files))
+    else:
+        file_results = [validate(filepath) for filepath in files]
 
     valid_count = sum(1 for r in file_results if not r["issues"])
     invalid_count = len(file_results) - valid_count